@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Benchmark - Powtarzalny benchmark skanowania i czyszczenia
+Generuje deterministyczne syntetyczne drzewo plików i mierzy operacje silnika
+
+Każda operacja działa w osobnym procesie, więc szczytowe RSS i liczniki
+wywołań systemowych dotyczą tylko jej. Wyniki zapisywane są jako JSON
+i mogą być porównane z wcześniejszym wynikiem bazowym (--baseline).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Parametry generatora drzewa
+PRESETS = {
+    'small': {
+        'depth': 3, 'fanout': 4, 'files_per_dir': 20,
+        'session_dirs': 20, 'session_depth': 8,
+        'huge_files': 2, 'huge_file_mb': 512,
+        'hardlinks': 50, 'max_age_days': 60
+    },
+    'medium': {
+        'depth': 4, 'fanout': 6, 'files_per_dir': 50,
+        'session_dirs': 200, 'session_depth': 12,
+        'huge_files': 4, 'huge_file_mb': 2048,
+        'hardlinks': 1000, 'max_age_days': 90
+    },
+    'large': {
+        'depth': 5, 'fanout': 8, 'files_per_dir': 30,
+        'session_dirs': 2000, 'session_depth': 16,
+        'huge_files': 8, 'huge_file_mb': 16384,
+        'hardlinks': 20000, 'max_age_days': 365
+    }
+}
+
+# Operacje w kolejności wykonania; niszczące wymagają świeżego drzewa
+OPERATIONS = [
+    'get_directory_size',
+    'find_old_files',
+    'find_large_files',
+    'perform_cleanup_test',
+    'perform_cleanup',
+    'daemon_cycle'
+]
+DESTRUCTIVE_OPERATIONS = {'perform_cleanup', 'daemon_cycle'}
+
+# Funkcje os zliczane przez shim (przybliżenie liczby wywołań systemowych)
+COUNTED_CALLS = ['stat', 'lstat', 'scandir', 'listdir', 'open', 'remove', 'unlink', 'rename', 'utime']
+
+# Próg regresji względem wyniku bazowego (10%)
+REGRESSION_THRESHOLD = 0.10
+
+DAYS_OLD = 7
+LARGE_FILE_MB = 200
+
+class SyscallCounter:
+    """Shim zliczający wywołania funkcji os wykonujących syscalle"""
+    
+    def __init__(self):
+        self.counts = {name: 0 for name in COUNTED_CALLS}
+        self.originals = {}
+    
+    def _wrap(self, name, func):
+        counts = self.counts
+        
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+    
+    def install(self):
+        """Podmienia funkcje modułu os na zliczające"""
+        for name in COUNTED_CALLS:
+            func = getattr(os, name)
+            self.originals[name] = func
+            setattr(os, name, self._wrap(name, func))
+    
+    def uninstall(self):
+        """Przywraca oryginalne funkcje modułu os"""
+        for name, func in self.originals.items():
+            setattr(os, name, func)
+        self.originals = {}
+    
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+def _write_file(path: str, size: int, mtime: float):
+    """Tworzy plik o zadanym rozmiarze i czasie modyfikacji"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if size:
+            os.write(fd, b'x' * size)
+        os.utime(fd, (mtime, mtime))
+    finally:
+        os.close(fd)
+
+def _random_mtime(rng: random.Random, now: float, max_age_days: int) -> float:
+    """Losowy czas modyfikacji z zakresu [now - max_age_days, now]"""
+    return now - rng.uniform(0, max_age_days) * 86400
+
+def generate_tree(root: str, params: dict, seed: int = 42) -> dict:
+    """Generuje deterministyczne drzewo testowe i zwraca jego opis
+    
+    Układ:
+      var/log  - drzewo o głębokości depth i rozgałęzieniu fanout z logami
+      tmp      - głębokie katalogi sesji i duże pliki rzadkie (sparse)
+      var/tmp  - twarde dowiązania do losowych plików z var/log
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    max_age = params['max_age_days']
+    manifest = {'files': 0, 'dirs': 0, 'hardlinks': 0, 'apparent_bytes': 0, 'sparse_bytes': 0}
+    hardlink_sample = []
+    
+    # Drzewo logów (iteracyjnie, bez rekurencji)
+    log_root = os.path.join(root, 'var', 'log')
+    stack = [(log_root, 0)]
+    while stack:
+        directory, level = stack.pop()
+        os.makedirs(directory, exist_ok=True)
+        manifest['dirs'] += 1
+        
+        for i in range(params['files_per_dir']):
+            roll = rng.random()
+            if roll < 0.05:
+                name = f"service-{i}.conf"  # Chronione przez preserve_files
+            elif roll < 0.20:
+                name = f"app-{i}.log.{rng.randint(1, 9)}.gz"
+            else:
+                name = f"app-{i}.log"
+            size = rng.randint(0, 4096)
+            path = os.path.join(directory, name)
+            _write_file(path, size, _random_mtime(rng, now, max_age))
+            manifest['files'] += 1
+            manifest['apparent_bytes'] += size
+            
+            # Próbkowanie rezerwuarowe kandydatów na twarde dowiązania
+            if len(hardlink_sample) < params['hardlinks']:
+                hardlink_sample.append(path)
+            else:
+                j = rng.randint(0, manifest['files'] - 1)
+                if j < params['hardlinks']:
+                    hardlink_sample[j] = path
+        
+        if level < params['depth']:
+            for j in range(params['fanout']):
+                stack.append((os.path.join(directory, f"d{j}"), level + 1))
+    
+    # Głębokie katalogi sesji w stylu /tmp
+    tmp_root = os.path.join(root, 'tmp')
+    for n in range(params['session_dirs']):
+        directory = os.path.join(tmp_root, f"session-{n:05d}")
+        for level in range(params['session_depth']):
+            directory = os.path.join(directory, f"s{level}")
+        os.makedirs(directory, exist_ok=True)
+        manifest['dirs'] += params['session_depth'] + 1
+        
+        mtime = _random_mtime(rng, now, max_age)
+        for i in range(2):
+            size = rng.randint(0, 1024)
+            _write_file(os.path.join(directory, f"state-{i}.tmp"), size, mtime)
+            manifest['files'] += 1
+            manifest['apparent_bytes'] += size
+    
+    # Duże pliki rzadkie - bez zapisu danych
+    os.makedirs(tmp_root, exist_ok=True)
+    for n in range(params['huge_files']):
+        path = os.path.join(tmp_root, f"huge-{n}.img")
+        size = params['huge_file_mb'] * 1024 * 1024
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        mtime = _random_mtime(rng, now, max_age)
+        os.utime(path, (mtime, mtime))
+        manifest['files'] += 1
+        manifest['apparent_bytes'] += size
+        manifest['sparse_bytes'] += size
+    
+    # Twarde dowiązania
+    link_root = os.path.join(root, 'var', 'tmp', 'hardlinks')
+    os.makedirs(link_root, exist_ok=True)
+    manifest['dirs'] += 2
+    for n, target in enumerate(hardlink_sample):
+        os.link(target, os.path.join(link_root, f"hl-{n}"))
+        manifest['files'] += 1
+        manifest['hardlinks'] += 1
+    
+    return manifest
+
+def _benchmark_config(root: str) -> dict:
+    """Konfiguracja silnika wskazująca na drzewo testowe"""
+    tmp_dirs = [os.path.join(root, 'tmp'), os.path.join(root, 'var', 'tmp')]
+    return {
+        'cleaning_enabled': True,
+        'notifications_enabled': False,
+        'days_old': DAYS_OLD,
+        'large_file_mb': LARGE_FILE_MB,
+        'directories_to_clean': [os.path.join(root, 'var', 'log')] + tmp_dirs,
+        'large_file_directories': tmp_dirs,
+        'directories_to_scan': [root],
+        'preserve_files': ["*.conf", "*.cfg", "*.config"]
+    }
+
+def run_operation(operation: str, root: str, workdir: str) -> dict:
+    """Wykonuje jedną operację silnika (w procesie potomnym) i zwraca pomiary"""
+    from core import DiskAnalyzer, DiskCleaner, Instrumentation
+    
+    config = _benchmark_config(root)
+    log_file = os.path.join(workdir, f"{operation}.log")
+    analyzer = DiskAnalyzer()
+    cleaner = DiskCleaner(log_file, config)
+    daemon = None
+    instrumentation = Instrumentation()
+    
+    if operation == 'perform_cleanup_test':
+        cleaner.set_test_mode(True, lambda message: None)
+    elif operation == 'daemon_cycle':
+        from daemon import CzyscicielDaemon
+        config_file = os.path.join(workdir, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+        daemon = CzyscicielDaemon(
+            config_file=config_file,
+            log_file=log_file,
+            pid_file=os.path.join(workdir, 'czysciciel.pid'),
+            stats_file=os.path.join(workdir, 'stats.json'),
+            log_to_console=False
+        )
+    
+    counter = SyscallCounter()
+    counter.install()
+    start = time.perf_counter()
+    try:
+        if operation == 'get_directory_size':
+            result = {'bytes': analyzer.get_directory_size(root, instrumentation=instrumentation)}
+        elif operation == 'find_old_files':
+            result = {'matches': len(cleaner.find_old_files(root, DAYS_OLD))}
+        elif operation == 'find_large_files':
+            result = {'matches': len(cleaner.find_large_files(root, LARGE_FILE_MB))}
+        elif operation.startswith('perform_cleanup'):
+            cleanup = cleaner.perform_cleanup()
+            result = {'bytes': cleanup['total_cleaned'], 'matches': cleanup['files_cleaned']}
+            instrumentation = cleaner.instrumentation
+        elif daemon is not None:
+            daemon.scheduled_task()
+            result = {}
+            instrumentation.merge(daemon.analyzer.instrumentation)
+            instrumentation.merge(daemon.cleaner.instrumentation)
+        elif operation == 'noop':
+            result = {}
+        else:
+            raise ValueError(f"Nieznana operacja: {operation}")
+    finally:
+        wall_time = time.perf_counter() - start
+        counter.uninstall()
+        if daemon is not None:
+            daemon.remove_pid_file()
+        if operation.startswith('find_'):
+            instrumentation = cleaner.instrumentation
+    
+    # DirEntry.stat() omija moduł os, więc shim bierze je z liczników silnika
+    counter.counts['direntry_stat'] = instrumentation.counters.get('entries_stat', 0)
+    
+    return {
+        'wall_time': wall_time,
+        'calls': dict(counter.counts),
+        'calls_total': counter.total,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'result': result,
+        'instrumentation': instrumentation.as_dict()
+    }
+
+def _parse_strace_total(path: str) -> int:
+    """Odczytuje łączną liczbę wywołań z podsumowania `strace -c`"""
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if fields and fields[-1] == 'total':
+                return int(fields[3])
+    return 0
+
+def _run_child(operation: str, root: str, workdir: str, use_strace: bool) -> dict:
+    """Uruchamia operację w osobnym procesie (opcjonalnie pod strace)"""
+    command = [sys.executable, os.path.abspath(__file__), '_run', operation, '--root', root, '--workdir', workdir]
+    strace_file = os.path.join(workdir, f"{operation}.strace")
+    if use_strace:
+        command = ['strace', '-f', '-c', '-o', strace_file] + command
+    
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{operation}: {completed.stderr.strip()[-500:]}")
+    
+    measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+    if use_strace:
+        measurement['strace_calls'] = _parse_strace_total(strace_file)
+    return measurement
+
+def _drop_caches():
+    """Opróżnia page cache (tylko root), żeby mierzyć zimny odczyt metadanych"""
+    os.sync()
+    with open('/proc/sys/vm/drop_caches', 'w') as f:
+        f.write('3\n')
+
+def compare_results(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Porównuje wyniki z wynikiem bazowym; zwraca listę regresji"""
+    regressions = []
+    print(f"\n{'Operacja':<24}{'metryka':<18}{'bazowy':>14}{'obecny':>14}{'zmiana':>10}")
+    for operation, measurement in current['operations'].items():
+        base = baseline.get('operations', {}).get(operation)
+        if not base:
+            continue
+        for metric in ('wall_time', 'syscalls_per_file', 'peak_rss_kb'):
+            old, new = base.get(metric), measurement.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change > threshold:
+                flag = " ⚠"
+                regressions.append({'operation': operation, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': change})
+            print(f"{operation:<24}{metric:<18}{old:>14.4g}{new:>14.4g}{change:>+9.1%}{flag}")
+    return regressions
+
+def run_suite(args) -> int:
+    """Generuje drzewo, mierzy operacje i zapisuje wyniki"""
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        value = getattr(args, key, None)
+        if value is not None:
+            params[key] = value
+    
+    operations = args.operations or OPERATIONS
+    root = args.root or tempfile.mkdtemp(prefix='czysciciel-bench-')
+    workdir = tempfile.mkdtemp(prefix='czysciciel-bench-work-')
+    use_strace = args.syscalls == 'strace'
+    if use_strace and not shutil.which('strace'):
+        print("✗ strace nie jest dostępny - użyj --syscalls shim", file=sys.stderr)
+        return 2
+    
+    def regenerate():
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root, exist_ok=True)
+        start = time.perf_counter()
+        manifest = generate_tree(root, params, args.seed)
+        manifest['generation_time'] = time.perf_counter() - start
+        return manifest
+    
+    print(f"📁 Generowanie drzewa ({args.preset}, seed={args.seed}) w {root}...")
+    manifest = regenerate()
+    print(f"   {manifest['files']} plików, {manifest['dirs']} katalogów, "
+          f"{manifest['generation_time']:.1f}s")
+    
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'preset': args.preset,
+        'seed': args.seed,
+        'params': params,
+        'manifest': manifest,
+        'syscall_source': args.syscalls,
+        'cache': 'cold' if args.drop_caches else 'warm',
+        'host': {
+            'hostname': os.uname().nodename,
+            'kernel': os.uname().release,
+            'python': sys.version.split()[0],
+            'cpus': os.cpu_count()
+        },
+        'operations': {}
+    }
+    
+    startup_calls = 0
+    if use_strace:
+        # Wywołania samego startu interpretera i importów - odejmowane od wyników
+        startup_calls = _run_child('noop', root, workdir, True)['strace_calls']
+    
+    dirty = False
+    try:
+        for operation in operations:
+            if operation in DESTRUCTIVE_OPERATIONS and dirty:
+                regenerate()
+            if args.drop_caches:
+                _drop_caches()
+            
+            measurement = _run_child(operation, root, workdir, use_strace)
+            files = manifest['files']
+            calls = measurement['strace_calls'] - startup_calls if use_strace else measurement['calls_total']
+            measurement['files_per_s'] = files / measurement['wall_time'] if measurement['wall_time'] else 0.0
+            measurement['syscalls_per_file'] = calls / files if files else 0.0
+            results['operations'][operation] = measurement
+            
+            if operation in DESTRUCTIVE_OPERATIONS:
+                dirty = True
+            
+            print(f"⏱️  {operation:<22} {measurement['wall_time']:8.3f}s "
+                  f"{measurement['files_per_s']:>12.0f} plików/s "
+                  f"{measurement['syscalls_per_file']:6.2f} syscall/plik "
+                  f"{measurement['peak_rss_kb'] / 1024:8.1f} MB RSS")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Wyniki zapisane w {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"⚠️  Regresje: {len(regressions)}")
+            if args.fail_on_regression:
+                return 1
+    
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Buduje parser argumentów"""
+    parser = argparse.ArgumentParser(description='Benchmark skanowania i czyszczenia Czysciciela')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help='rozmiar drzewa testowego')
+    parser.add_argument('--seed', type=int, default=42, help='ziarno generatora')
+    parser.add_argument('--root', help='katalog drzewa testowego (domyślnie tymczasowy)')
+    parser.add_argument('--keep', action='store_true', help='nie usuwaj drzewa po zakończeniu')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, help='wybrane operacje')
+    parser.add_argument('--syscalls', choices=['shim', 'strace'], default='shim',
+                        help='źródło liczby wywołań systemowych')
+    parser.add_argument('--drop-caches', action='store_true', help='opróżniaj page cache przed operacją (root)')
+    parser.add_argument('--output', default='benchmark-results.json', help='plik wyników JSON')
+    parser.add_argument('--baseline', help='plik wyników bazowych do porównania')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='próg regresji (ułamek)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='kod wyjścia 1 przy regresji')
+    for key in PRESETS['small']:
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=int, help='nadpisuje wartość z presetu')
+    return parser
+
+def main(argv=None) -> int:
+    """Główna funkcja benchmarku"""
+    argv = sys.argv[1:] if argv is None else argv
+    
+    # Tryb procesu potomnego: jedna operacja, wynik JSON na stdout
+    if argv and argv[0] == '_run':
+        child = argparse.ArgumentParser()
+        child.add_argument('operation')
+        child.add_argument('--root', required=True)
+        child.add_argument('--workdir', required=True)
+        child_args = child.parse_args(argv[1:])
+        print(json.dumps(run_operation(child_args.operation, child_args.root, child_args.workdir)))
+        return 0
+    
+    return run_suite(build_parser().parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
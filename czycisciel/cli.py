@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel CLI - Interfejs wiersza poleceń bez GUI
+Skanowanie, plan i czyszczenie z wynikiem JSON/NDJSON dla automatyzacji (cron, Ansible, itp.)
+
+Kody wyjścia:
+  0   - sukces
+  1   - błąd wykonania
+  2   - błędne wywołanie lub konfiguracja
+  3   - zakończono, ale części plików nie udało się usunąć
+  4   - czyszczenie trwa w innym procesie (--lock-policy skip lub --lock-timeout)
+  130 - przerwano (SIGINT/SIGTERM)
+"""
+
+import os
+import sys
+import json
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from core import (
+    DEFAULT_CONFIG_FILE, DEFAULT_QUARANTINE_TTL_HOURS, STATS_FILE, CLEANUP_LOCK_FILE, LOCK_POLICIES, PROFILE_MODES,
+    SCAN_SNAPSHOT_DIR,
+    TaskCancelled, LockBusy, CleanupLock, DiskAnalyzer, DiskCleaner, RootExpander, UsageTop,
+    compile_rules, load_config_file, get_filesystem_usage, profile_run
+)
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+EXIT_LOCKED = 4
+EXIT_INTERRUPTED = 130
+
+def _json_default(value):
+    """Serializuje typy spoza JSON (daty, czasy trwania)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return str(value)
+
+def emit(payload: dict, records: list, output_format: str):
+    """Wypisuje wynik jako jeden dokument JSON lub strumień NDJSON"""
+    if output_format == 'ndjson':
+        for record in records:
+            sys.stdout.write(json.dumps(record, default=_json_default) + '\n')
+    else:
+        json.dump(payload, sys.stdout, indent=2, default=_json_default)
+        sys.stdout.write('\n')
+    sys.stdout.flush()
+
+def _snapshot_dir(args, config) -> str:
+    return args.snapshot_dir or config.get('snapshot_settings', {}).get('directory') or SCAN_SNAPSHOT_DIR
+
+def cmd_scan(args, config, cancel_event):
+    """Rozmiary katalogów (z --save także migawka binarna skanu)"""
+    directories = args.paths or config.get('directories_to_scan') or None
+    analyzer = DiskAnalyzer()
+    writer = None
+    if args.save:
+        from snapshot import ScanWriter
+        directory = _snapshot_dir(args, config)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        writer = ScanWriter(directory)
+    try:
+        results = analyzer.analyze_disk_usage(cancel_event=cancel_event, directories=directories, snapshot=writer)
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
+    
+    instrumentation = analyzer.instrumentation.as_dict()
+    records = [dict(type='directory', path=path, **data) for path, data in results.items()]
+    payload = {'command': 'scan', 'directories': results, 'instrumentation': instrumentation}
+    if writer:
+        payload['snapshot'] = writer.close()
+        records.append({'type': 'snapshot', 'path': payload['snapshot'], 'files': writer.count})
+    records.append(dict(type='instrumentation', **instrumentation))
+    return payload, records, EXIT_OK
+
+def cmd_snapshots(args, config, cancel_event):
+    """Zapisane migawki skanów (poziom full demona, scan --save)"""
+    from snapshot import StoredScan, list_scans
+    
+    snapshots = []
+    for path in list_scans(_snapshot_dir(args, config)):
+        try:
+            scan = StoredScan(path)
+        except (OSError, ValueError) as e:
+            snapshots.append({'path': path, 'error': str(e)})
+            continue
+        snapshots.append({'path': path, 'created': datetime.fromtimestamp(scan.created), 'files': len(scan),
+                          'bytes': sum(root['size'] for root in scan.roots),
+                          'roots': [root['path'] for root in scan.roots]})
+    records = [dict(type='snapshot', **snapshot) for snapshot in snapshots]
+    return {'command': 'snapshots', 'snapshots': snapshots}, records, EXIT_OK
+
+def cmd_diff(args, config, cancel_event):
+    """Co urosło między dwiema migawkami skanów (domyślnie dwiema ostatnimi)"""
+    from snapshot import StoredScan, diff_scans, list_scans
+    
+    paths = args.snapshots or list_scans(_snapshot_dir(args, config))[-2:]
+    if len(paths) != 2:
+        payload = {'command': 'diff', 'skipped': 'need_two_snapshots', 'snapshots': paths}
+        return payload, [dict(type='summary', **payload)], EXIT_USAGE if args.snapshots else EXIT_FAILURE
+    
+    old, new = StoredScan(paths[0]), StoredScan(paths[1])
+    if old.created > new.created:
+        old, new = new, old
+    diff = diff_scans(old, new, args.top, int(args.min_size * 1024 * 1024))
+    
+    records = [dict(type='root', **root) for root in diff['roots']]
+    records += [dict(type='subtree', **entry) for entry in diff['subtrees']]
+    records += [dict(type='directory', **entry) for entry in diff['growing_directories'] + diff['shrinking_directories']]
+    records += [dict(type='new_large_file', **entry) for entry in diff['new_large_files']]
+    records += [dict(type='removed_large_file', **entry) for entry in diff['removed_large_files']]
+    records.append(dict(type='summary', old=diff['old'], new=diff['new'], elapsed_seconds=diff['elapsed_seconds'],
+                        **diff['totals']))
+    return dict(command='diff', **diff), records, EXIT_OK
+
+def cmd_plan(args, config, cancel_event):
+    """Lista plików do usunięcia według konfiguracji (bez usuwania)"""
+    cleaner = DiskCleaner(args.log_file, config)
+    candidates = cleaner.plan_cleanup(cancel_event)
+    total = sum(c['size'] for c in candidates)
+    
+    instrumentation = cleaner.instrumentation.as_dict()
+    records = [dict(type='candidate', **c) for c in candidates]
+    records.append(dict(type='instrumentation', **instrumentation))
+    payload = {
+        'command': 'plan',
+        'files': len(candidates),
+        'total_bytes': total,
+        'candidates': candidates,
+        'instrumentation': instrumentation
+    }
+    return payload, records, EXIT_OK
+
+def cmd_simulate(args, config, cancel_event):
+    """Ile zwolniłyby inne days_old/large_file_mb - jedno przejście do migawki, potem same obliczenia
+    
+    Z --snapshot bez przejścia: katalogi reguł domyślnych z zapisanego skanu.
+    """
+    cleaner = DiskCleaner(args.log_file, config)
+    if args.snapshot:
+        from snapshot import StoredScan
+        with cleaner.instrumentation.phase('snapshot'):
+            snapshot = cleaner.load_snapshot(StoredScan(args.snapshot))
+    else:
+        snapshot = cleaner.take_snapshot(cancel_event)
+    days_values = args.days_old or [cleaner.config['days_old']]
+    large_values = args.large_file_mb or [cleaner.config['large_file_mb']]
+    
+    records = []
+    simulations = []
+    with cleaner.instrumentation.phase('simulate'):
+        for days_old in days_values:
+            for large_file_mb in large_values:
+                directories = snapshot.simulate(days_old, large_file_mb)
+                records += [dict(type='simulation', days_old=days_old, large_file_mb=large_file_mb, directory=root,
+                                 **result) for root, result in directories.items()]
+                simulations.append({'days_old': days_old, 'large_file_mb': large_file_mb, 'directories': directories,
+                                    'total_bytes': sum(result['bytes'] for result in directories.values())})
+    
+    instrumentation = cleaner.instrumentation.as_dict()
+    summary = {'snapshot_files': len(snapshot), 'snapshot_directories': len(snapshot.roots)}
+    records.append(dict(type='summary', **summary))
+    records.append(dict(type='instrumentation', **instrumentation))
+    payload = dict(command='simulate', simulations=simulations, instrumentation=instrumentation, **summary)
+    return payload, records, EXIT_OK
+
+def cmd_clean(args, config, cancel_event):
+    """Czyszczenie według konfiguracji"""
+    if not config.get('cleaning_enabled', True):
+        payload = {'command': 'clean', 'skipped': 'cleaning_disabled'}
+        return payload, [dict(type='summary', **payload)], EXIT_OK
+    
+    cleaner = DiskCleaner(args.log_file, config)
+    lock = CleanupLock(config.get('cleanup_lock', CLEANUP_LOCK_FILE), 'czysciciel-cli')
+    try:
+        result = lock.run(lambda: cleaner.perform_cleanup(cancel_event), args.lock_policy,
+                          args.lock_timeout, cancel_event)
+    except LockBusy as e:
+        payload = {'command': 'clean', 'skipped': 'locked', 'lock_owner': e.owner}
+        return payload, [dict(type='summary', **payload)], EXIT_LOCKED
+    result['duration'] = result['end_time'] - result['start_time']
+    
+    records = [{'type': 'removed', 'path': path} for path in cleaner.cleaned_files]
+    summary = dict(result)
+    records.append(dict(type='summary', **summary))
+    payload = dict(command='clean', cleaned_files=list(cleaner.cleaned_files), **summary)
+    return payload, records, EXIT_PARTIAL if result['errors'] else EXIT_OK
+
+def cmd_report(args, config, cancel_event):
+    """Zajętość systemów plików i rozmiary katalogów"""
+    from openfiles import deleted_open_files
+    
+    directories = args.paths or config.get('directories_to_scan') or None
+    analyzer = DiskAnalyzer()
+    top = UsageTop(args.top) if args.top else None
+    results = analyzer.analyze_disk_usage(cancel_event=cancel_event, directories=directories, top=top)
+    
+    filesystems = {}
+    for path, data in results.items():
+        try:
+            usage = get_filesystem_usage(path)
+        except OSError:
+            continue
+        fs = filesystems.setdefault(usage['mount_point'], dict(usage, directories={}))
+        fs['directories'][path] = data['size']
+    
+    # Usunięte, ale otwarte pliki - zajęte miejsce, którego nie ma w żadnym katalogu
+    hidden = deleted_open_files()
+    for mount, fs in filesystems.items():
+        fs['hidden_usage'] = hidden['filesystems'].get(mount, 0)
+    
+    instrumentation = analyzer.instrumentation.as_dict()
+    records = [dict(type='filesystem', **fs) for fs in filesystems.values()]
+    largest = top.as_dict() if top else None
+    if largest:
+        for kind, record_type in (('files', 'top_file'), ('directories', 'top_directory'), ('extensions', 'top_extension')):
+            records += [dict(type=record_type, **entry) for entry in largest[kind]]
+    records.append(dict(type='instrumentation', **instrumentation))
+    payload = {
+        'command': 'report',
+        'hostname': os.uname().nodename,
+        'timestamp': datetime.now(),
+        'filesystems': filesystems,
+        'hidden_usage': hidden['total_bytes'],
+        'top': largest,
+        'instrumentation': instrumentation
+    }
+    return payload, records, EXIT_OK
+
+def cmd_hidden(args, config, cancel_event):
+    """Miejsce zajęte przez usunięte, ale wciąż otwarte pliki; opcjonalnie ich przycięcie"""
+    from openfiles import DEFAULT_TRUNCATE_PATTERNS, deleted_open_files, truncate_deleted
+    
+    hidden = deleted_open_files()
+    truncated = None
+    if args.truncate:
+        patterns = (config.get('advanced_settings') or {}).get('truncate_deleted_patterns', DEFAULT_TRUNCATE_PATTERNS)
+        truncated = truncate_deleted(hidden['files'], patterns)
+    
+    records = [dict(type='hidden_file', **entry) for entry in hidden['files']]
+    records += [dict(type='hidden_process', **process) for process in hidden['processes']]
+    records += [dict(type='truncate', **result) for result in truncated or []]
+    summary = {'hidden_usage': hidden['total_bytes'], 'filesystems': hidden['filesystems']}
+    records.append(dict(type='summary', **summary))
+    payload = dict(command='hidden', files=hidden['files'], processes=hidden['processes'], truncated=truncated,
+                   **summary)
+    failed = truncated and any(result['status'] == 'error' for result in truncated)
+    return payload, records, EXIT_PARTIAL if failed else EXIT_OK
+
+def cmd_duplicates(args, config, cancel_event):
+    """Grupy identycznych plików i opcjonalna deduplikacja"""
+    from duplicates import DuplicateFinder, dedupe
+    
+    directories = RootExpander().expand_all(args.paths or config.get('directories_to_scan') or [])
+    finder = DuplicateFinder(int(args.min_size * 1024 * 1024), compile_rules(config).scan_threads)
+    groups = finder.find(directories, cancel_event)
+    
+    dedupe_result = None
+    if args.dedupe:
+        dedupe_result = dedupe(groups, args.dedupe, args.dry_run, finder.instrumentation, cancel_event)
+    
+    instrumentation = finder.instrumentation.as_dict()
+    records = [dict(type='duplicate_group', **group.as_dict()) for group in groups]
+    summary = {
+        'groups': len(groups),
+        'duplicate_files': sum(len(group.files) - 1 for group in groups),
+        'reclaimable_bytes': sum(group.reclaimable for group in groups),
+        'dedupe': dedupe_result
+    }
+    records.append(dict(type='summary', **summary))
+    records.append(dict(type='instrumentation', **instrumentation))
+    payload = dict(command='duplicates', duplicate_groups=[group.as_dict() for group in groups],
+                   instrumentation=instrumentation, **summary)
+    return payload, records, EXIT_PARTIAL if dedupe_result and dedupe_result['errors'] else EXIT_OK
+
+def cmd_quarantine(args, config, cancel_event):
+    """Zawartość kwarantanny i usuwanie wygasłych plików"""
+    from quarantine import list_entries, purge
+    
+    purged = None
+    if args.purge or args.purge_all:
+        ttl = compile_rules(config).quarantine_ttl_seconds
+        purged = purge(DEFAULT_QUARANTINE_TTL_HOURS * 3600 if ttl is None else ttl, everything=args.purge_all)
+    
+    entries = list_entries()
+    records = [dict(type='quarantined', **entry) for entry in entries]
+    summary = {'files': len(entries), 'bytes': sum(entry['size'] for entry in entries), 'purged': purged}
+    records.append(dict(type='summary', **summary))
+    payload = dict(command='quarantine', entries=entries, **summary)
+    return payload, records, EXIT_PARTIAL if purged and purged['errors'] else EXIT_OK
+
+def cmd_restore(args, config, cancel_event):
+    """Przywraca pliki z kwarantanny według manifestu"""
+    from quarantine import list_entries, restore
+    
+    paths = [os.path.abspath(path) for path in args.paths]
+    selected = {}
+    for entry in list_entries():
+        # Plik usunięty kilka razy - przywracana jest najnowsza wersja
+        if entry['id'] in args.id or any(entry['path'] == path or entry['path'].startswith(path.rstrip('/') + '/')
+                                         for path in paths):
+            selected[entry['path']] = entry
+    
+    results = restore(selected.values(), args.overwrite)
+    failed = sum(result['status'] != 'restored' for result in results)
+    records = [dict(type='restore', **result) for result in results]
+    summary = {'restored': len(results) - failed, 'failed': failed}
+    records.append(dict(type='summary', **summary))
+    payload = dict(command='restore', results=results, **summary)
+    if not results:
+        return payload, records, EXIT_FAILURE
+    return payload, records, EXIT_PARTIAL if failed else EXIT_OK
+
+def cmd_stats(args, config, cancel_event):
+    """Historia statystyk demona"""
+    history = []
+    invalid = 0
+    try:
+        with open(args.stats_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    invalid += 1  # Uszkodzone wpisy ze starszych wersji demona
+    except FileNotFoundError:
+        pass
+    
+    if args.last:
+        history = history[-args.last:]
+    
+    records = [dict(type='stats', **entry) for entry in history]
+    payload = {'command': 'stats', 'entries': len(history), 'invalid_lines': invalid, 'history': history}
+    return payload, records, EXIT_OK
+
+def build_parser() -> argparse.ArgumentParser:
+    """Buduje parser argumentów"""
+    parser = argparse.ArgumentParser(
+        prog='czysciciel',
+        description='Czysciciel Dysku - skanowanie i czyszczenie bez GUI'
+    )
+    parser.add_argument('--config', default=DEFAULT_CONFIG_FILE, help='plik konfiguracji JSON')
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json', help='format wyjścia')
+    parser.add_argument('--log-file', default=None, help='dopisuj log operacji do pliku (domyślnie stderr)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='szczegółowy log na stderr')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None,
+                        help='profiluj polecenie (cProfile lub tracemalloc)')
+    parser.add_argument('--profile-dir', default=os.path.dirname(STATS_FILE),
+                        help='katalog na wynik profilowania (domyślnie obok pliku statystyk)')
+    
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+    
+    scan = subparsers.add_parser('scan', help='rozmiary katalogów')
+    scan.add_argument('paths', nargs='*', help='katalogi (domyślnie directories_to_scan)')
+    scan.add_argument('--save', action='store_true', help='zapisz migawkę binarną skanu (do simulate --snapshot)')
+    scan.add_argument('--snapshot-dir', default=None, help='katalog migawek (domyślnie snapshot_settings.directory)')
+    scan.set_defaults(func=cmd_scan)
+    
+    snapshots = subparsers.add_parser('snapshots', help='zapisane migawki skanów')
+    snapshots.add_argument('--snapshot-dir', default=None, help='katalog migawek (domyślnie snapshot_settings.directory)')
+    snapshots.set_defaults(func=cmd_snapshots)
+    
+    diff = subparsers.add_parser('diff', help='co urosło między dwiema migawkami skanów')
+    diff.add_argument('snapshots', nargs='*', metavar='SNAPSHOT', help='dwie migawki (domyślnie dwie ostatnie)')
+    diff.add_argument('--snapshot-dir', default=None, help='katalog migawek (domyślnie snapshot_settings.directory)')
+    diff.add_argument('--top', type=int, default=20, metavar='K', help='ile poddrzew, katalogów i plików pokazać')
+    diff.add_argument('--min-size', type=float, default=100.0,
+                      help='nowe i usunięte pliki od N MB (domyślnie 100)')
+    diff.set_defaults(func=cmd_diff)
+    
+    plan = subparsers.add_parser('plan', help='pliki, które zostałyby usunięte')
+    plan.set_defaults(func=cmd_plan)
+    
+    simulate = subparsers.add_parser('simulate', help='ile zwolniłyby inne days_old i large_file_mb (bez usuwania)')
+    simulate.add_argument('--days-old', type=float, nargs='+', default=None, metavar='N',
+                          help='wartości days_old do porównania (domyślnie z konfiguracji)')
+    simulate.add_argument('--large-file-mb', type=float, nargs='+', default=None, metavar='M',
+                          help='wartości large_file_mb do porównania (domyślnie z konfiguracji)')
+    simulate.add_argument('--snapshot', default=None, metavar='PATH',
+                          help='użyj zapisanej migawki skanu zamiast przechodzić katalogi')
+    simulate.set_defaults(func=cmd_simulate)
+    
+    clean = subparsers.add_parser('clean', help='usuń pliki według konfiguracji')
+    clean.add_argument('--lock-policy', choices=LOCK_POLICIES, default='wait',
+                       help='gdy czyszczenie już trwa: czekaj, pomiń lub użyj jego wyniku')
+    clean.add_argument('--lock-timeout', type=float, default=None,
+                       help='maksymalny czas oczekiwania na blokadę (s)')
+    clean.set_defaults(func=cmd_clean)
+    
+    report = subparsers.add_parser('report', help='zajętość systemów plików')
+    report.add_argument('paths', nargs='*', help='katalogi (domyślnie directories_to_scan)')
+    report.add_argument('--top', type=int, default=0, metavar='K',
+                        help='także K największych plików, katalogów i rozszerzeń (w tym samym przejściu)')
+    report.set_defaults(func=cmd_report)
+    
+    hidden = subparsers.add_parser('hidden', help='miejsce zajęte przez usunięte, ale otwarte pliki')
+    hidden.add_argument('--truncate', action='store_true',
+                        help='przytnij pliki pasujące do advanced_settings.truncate_deleted_patterns (domyślnie /var/log/*)')
+    hidden.set_defaults(func=cmd_hidden)
+    
+    duplicates = subparsers.add_parser('duplicates', help='zduplikowane pliki i miejsce do odzyskania')
+    duplicates.add_argument('paths', nargs='*', help='katalogi (domyślnie directories_to_scan)')
+    duplicates.add_argument('--min-size', type=float, default=1.0,
+                            help='pomijaj pliki mniejsze niż N MB (domyślnie 1)')
+    duplicates.add_argument('--dedupe', choices=('hardlink', 'reflink'), default=None,
+                            help='zastąp duplikaty dowiązaniem twardym lub kopią reflink pierwszego pliku')
+    duplicates.add_argument('--dry-run', action='store_true', help='z --dedupe: tylko policz, co zostałoby zastąpione')
+    duplicates.set_defaults(func=cmd_duplicates)
+    
+    quarantine = subparsers.add_parser('quarantine', help='pliki w kwarantannie (advanced_settings.backup_before_delete)')
+    quarantine.add_argument('--purge', action='store_true', help='usuń pliki starsze niż quarantine_ttl_hours')
+    quarantine.add_argument('--purge-all', action='store_true', help='opróżnij kwarantannę')
+    quarantine.set_defaults(func=cmd_quarantine)
+    
+    restore = subparsers.add_parser('restore', help='przywróć pliki z kwarantanny')
+    restore.add_argument('paths', nargs='*', help='pierwotne ścieżki plików lub katalogów')
+    restore.add_argument('--id', action='append', default=[], help='identyfikator z polecenia quarantine')
+    restore.add_argument('--overwrite', action='store_true', help='nadpisz istniejące pliki')
+    restore.set_defaults(func=cmd_restore)
+    
+    stats = subparsers.add_parser('stats', help='historia statystyk demona')
+    stats.add_argument('--stats-file', default=STATS_FILE, help='plik statystyk JSONL')
+    stats.add_argument('--last', type=int, default=0, help='tylko N ostatnich wpisów')
+    stats.set_defaults(func=cmd_stats)
+    
+    return parser
+
+def setup_logging(args):
+    """Kieruje log silnika na stderr, żeby stdout zawierał tylko JSON"""
+    handler = logging.FileHandler(args.log_file) if args.log_file else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO if args.verbose or args.log_file else logging.WARNING)
+
+def main(argv=None) -> int:
+    """Główna funkcja CLI"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    setup_logging(args)
+    
+    try:
+        config = load_config_file(args.config)
+        compile_rules(config)
+    except (OSError, ValueError) as e:
+        print(f"Błąd konfiguracji {args.config}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    
+    # SIGINT/SIGTERM przerywają przejście drzewa kooperacyjnie
+    cancel_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: cancel_event.set())
+    
+    try:
+        with profile_run(args.profile, args.profile_dir, args.command) as profile_path:
+            payload, records, exit_code = args.func(args, config, cancel_event)
+        if profile_path:
+            print(f"Profil zapisany: {profile_path}", file=sys.stderr)
+    except TaskCancelled:
+        print("Przerwano", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(f"Błąd: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    
+    emit(payload, records, args.format)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Compress - Kompresja plików w miejscu zamiast usuwania
+Strumieniowo (gzip/xz) porcjami stałej wielkości; importowany przez procesy puli, więc bez ciężkich zależności
+"""
+
+import os
+import re
+import errno
+import tempfile
+from typing import Dict
+
+COMPRESSION_METHODS = {'gzip': '.gz', 'xz': '.xz'}
+
+# Pliki już skompresowane - po nazwie (przy skanowaniu) i po sygnaturze (przed kompresją)
+COMPRESSED_SUFFIXES = ('.gz', '.tgz', '.xz', '.txz', '.bz2', '.zst', '.lz4', '.lzma', '.lz', '.z', '.zip', '.7z')
+COMPRESSED_NAME = re.compile('.*(' + '|'.join(re.escape(s) for s in COMPRESSED_SUFFIXES) + ')$', re.IGNORECASE)
+COMPRESSED_MAGIC = (b'\x1f\x8b', b'\xfd7zXZ\x00', b'BZh', b'\x28\xb5\x2f\xfd', b'\x04\x22\x4d\x18', b'PK\x03\x04')
+
+# Porcja odczytu - pamięć procesu nie zależy od rozmiaru pliku
+CHUNK_SIZE = 1024 * 1024
+
+class _NoGain(Exception):
+    """Skompresowany plik nie jest mniejszy od oryginału"""
+
+def _compressor(method: str):
+    if method == 'gzip':
+        import zlib
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 - nagłówek gzip
+    if method == 'xz':
+        import lzma
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=6)
+    raise ValueError(f"Nieznana metoda kompresji: {method}")
+
+def _write_all(fd: int, data: bytes) -> int:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    return len(data)
+
+def compress_file(path: str, method: str = 'gzip') -> Dict:
+    """Kompresuje plik do path + .gz/.xz i usuwa oryginał
+    
+    Wynik trafia do pliku tymczasowego w tym samym katalogu, dostaje
+    właściciela, uprawnienia i czasy oryginału i jest publikowany atomowo
+    dowiązaniem (cel powstały w trakcie nie jest nadpisywany); oryginał
+    jest usuwany dopiero potem. Plik już skompresowany, z istniejącym celem
+    lub niedający się zmniejszyć zostaje bez zmian;
+    zmieniony w trakcie daje OSError (EBUSY).
+    Zwraca {'status': 'compressed'|'skipped', 'original', 'compressed', 'target'}.
+    """
+    target = path + COMPRESSION_METHODS[method]
+    result = {'status': 'skipped', 'original': 0, 'compressed': 0, 'target': target}
+    src = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+    try:
+        st = os.fstat(src)
+        result['original'] = st.st_size
+        if os.pread(src, 6, 0).startswith(COMPRESSED_MAGIC) or os.path.lexists(target):
+            return result
+        
+        directory, name = os.path.split(path)
+        # Unikalna nazwa - pozostałość przerwanego procesu o tym samym PID nie blokuje kompresji
+        # (skan usuwa takie pliki po STALE_TEMP_SECONDS, core.TEMP_NAME)
+        dst, tmp = tempfile.mkstemp(suffix='.tmp', prefix=f".{name}.czysciciel-", dir=directory)
+        try:
+            compressor = _compressor(method)
+            written = 0
+            while True:
+                chunk = os.read(src, CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += _write_all(dst, compressor.compress(chunk))
+            written += _write_all(dst, compressor.flush())
+            
+            after = os.fstat(src)
+            if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise OSError(errno.EBUSY, "Plik zmienił się w trakcie kompresji", path)
+            if written >= st.st_size:
+                raise _NoGain
+            os.fchown(dst, st.st_uid, st.st_gid)
+            os.fchmod(dst, st.st_mode & 0o7777)
+            os.fsync(dst)
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except BaseException as e:
+            os.close(dst)
+            os.unlink(tmp)
+            if isinstance(e, _NoGain):
+                return result
+            raise
+        os.close(dst)
+        # link nie nadpisuje - cel mógł powstać w trakcie kompresji (rename zastąpiłby go po cichu)
+        try:
+            os.link(tmp, target)
+        except FileExistsError:
+            return result
+        finally:
+            os.unlink(tmp)
+        os.unlink(path)
+    finally:
+        os.close(src)
+    
+    result.update(status='compressed', compressed=written)
+    return result
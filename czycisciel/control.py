@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Control - Gniazdo sterujące demona (Unix socket, JSON)
+Jedno żądanie JSON na linię, jedna odpowiedź JSON na linię; polecenia
+strumieniowe zwracają kolejne zdarzenia aż do zdarzenia "done".
+
+Polecenia: status, analysis, subtree {path}, scan, cleanup, progress, stats {last}
+Opcja "wait": true przy scan/cleanup strumieniuje postęp uruchomionego poziomu.
+Uprawnienia sprawdza demon według UID klienta (analysis, subtree, scan - root
+lub grupa control_group; cleanup, reload - root).
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+DEFAULT_CONTROL_SOCKET = "/run/czysciciel/control.sock"
+
+# Maksymalny rozmiar jednej linii żądania
+MAX_REQUEST_BYTES = 64 * 1024
+
+# Co ile sekund wysyłać heartbeat w strumieniu bez zdarzeń
+HEARTBEAT_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+class ControlError(Exception):
+    """Demon niedostępny lub zwrócił błąd"""
+    pass
+
+def _encode(message: Dict) -> bytes:
+    return (json.dumps(message, default=str) + '\n').encode('utf-8')
+
+def peer_uid(sock: socket.socket) -> Optional[int]:
+    """UID procesu po drugiej stronie gniazda Unix (SO_PEERCRED)"""
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    except (OSError, AttributeError):
+        return None
+    _, uid, _ = struct.unpack('3i', creds)
+    return uid
+
+class ProgressBroadcaster:
+    """Rozsyła zdarzenia postępu demona do subskrybentów gniazda sterującego"""
+    
+    INTERVAL = 0.2  # Minimalny odstęp między zdarzeniami postępu (s)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self._last_progress = 0.0
+    
+    def subscribe(self) -> queue.Queue:
+        events = queue.Queue(maxsize=1000)
+        with self.lock:
+            self.subscribers.add(events)
+        return events
+    
+    def unsubscribe(self, events: queue.Queue):
+        with self.lock:
+            self.subscribers.discard(events)
+    
+    def publish(self, event: Dict):
+        """Przekazuje zdarzenie wszystkim subskrybentom (bez blokowania)"""
+        if not self.subscribers:
+            return
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass  # Wolny klient traci zdarzenia, demon nie czeka
+    
+    def progress(self, tier: str, path: str, count: int):
+        """Callback postępu dla silnika (z ograniczeniem częstotliwości)"""
+        if not self.subscribers:
+            return
+        now = time.monotonic()
+        if now - self._last_progress < self.INTERVAL:
+            return
+        self._last_progress = now
+        self.publish({'type': 'progress', 'tier': tier, 'path': path, 'files': count})
+
+class ControlServer:
+    """Serwer gniazda sterującego w wątku w tle
+    
+    commands: nazwa -> funkcja(request, uid) zwracająca słownik odpowiedzi.
+    Jeśli odpowiedź zawiera "tier", a żądanie "wait": true, połączenie
+    strumieniuje zdarzenia tego poziomu aż do zdarzenia "done".
+    """
+    
+    def __init__(self, path: str, commands: Dict[str, Callable[[Dict, Optional[int]], Dict]],
+                 progress: ProgressBroadcaster):
+        self.path = path
+        self.commands = commands
+        self.progress = progress
+        self.server = None
+        self.thread = None
+    
+    def handle_connection(self, sock: socket.socket, rfile, wfile):
+        """Obsługuje kolejne żądania jednego klienta"""
+        uid = peer_uid(sock)
+        while True:
+            line = rfile.readline(MAX_REQUEST_BYTES)
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                command = request['command']
+            except (ValueError, KeyError, TypeError):
+                wfile.write(_encode({'ok': False, 'error': 'niepoprawne żądanie'}))
+                continue
+            
+            if command == 'progress':
+                self.stream(wfile, None)
+                return
+            
+            handler = self.commands.get(command)
+            if handler is None:
+                wfile.write(_encode({'ok': False, 'error': f'nieznane polecenie: {command}'}))
+                continue
+            
+            # Subskrypcja przed wykonaniem, żeby nie zgubić zdarzenia startu
+            events = self.progress.subscribe() if request.get('wait') else None
+            try:
+                response = dict({'ok': True}, **handler(request, uid))
+            except ControlError as e:
+                response = {'ok': False, 'error': str(e)}
+            except Exception as e:
+                logger.error(f"Błąd polecenia {command}: {e}")
+                response = {'ok': False, 'error': str(e)}
+            
+            wfile.write(_encode(response))
+            if events is not None:
+                if response['ok'] and response.get('tier'):
+                    self.stream(wfile, response['tier'], events)
+                    return
+                self.progress.unsubscribe(events)
+    
+    def stream(self, wfile, tier: Optional[str], events: Optional[queue.Queue] = None):
+        """Wysyła zdarzenia postępu; dla tier kończy na jego zdarzeniu "done" """
+        if events is None:
+            events = self.progress.subscribe()
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    event = {'type': 'heartbeat'}
+                wfile.write(_encode(event))
+                if tier and event.get('type') == 'done' and event.get('tier') == tier:
+                    return
+        finally:
+            self.progress.unsubscribe(events)
+    
+    def start(self):
+        """Tworzy gniazdo i uruchamia serwer w wątku w tle"""
+        import socketserver
+        control = self
+        
+        class ControlHandler(socketserver.StreamRequestHandler):
+            wbufsize = 0
+            
+            def handle(self):
+                try:
+                    control.handle_connection(self.request, self.rfile, self.wfile)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+        
+        class UnixControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = UnixControlServer(self.path, ControlHandler)
+        # Połączenie dla wszystkich; polecenia same sprawdzają UID klienta (SO_PEERCRED)
+        os.chmod(self.path, 0o666)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='control', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Zatrzymuje serwer i usuwa gniazdo"""
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self.server = None
+
+class ControlClient:
+    """Klient gniazda sterującego (GUI, skrypty)"""
+    
+    def __init__(self, path: str = DEFAULT_CONTROL_SOCKET, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+    
+    def available(self) -> bool:
+        """Szybkie sprawdzenie, czy gniazdo demona istnieje"""
+        return os.path.exists(self.path)
+    
+    def _connect(self, timeout: Optional[float]) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise ControlError(f"Demon niedostępny ({self.path}): {e}")
+        return sock
+    
+    @staticmethod
+    def _read_message(rfile) -> Dict:
+        line = rfile.readline()
+        if not line:
+            raise ControlError("Demon zamknął połączenie")
+        return json.loads(line)
+    
+    def request(self, command: str, **params) -> Dict:
+        """Wysyła polecenie i zwraca odpowiedź (ControlError przy błędzie)"""
+        sock = self._connect(self.timeout)
+        try:
+            sock.sendall(_encode(dict(params, command=command)))
+            with sock.makefile('rb') as rfile:
+                response = self._read_message(rfile)
+        except (OSError, ValueError) as e:
+            raise ControlError(f"Błąd komunikacji z demonem: {e}")
+        finally:
+            sock.close()
+        
+        if not response.get('ok'):
+            raise ControlError(response.get('error', 'nieznany błąd'))
+        return response
+    
+    def stream(self, command: str, **params):
+        """Generator: odpowiedź na polecenie, a potem zdarzenia postępu
+        
+        Dla scan/cleanup z wait=True kończy się po zdarzeniu "done".
+        """
+        # Heartbeat co HEARTBEAT_INTERVAL, więc brak danych przez 3 interwały = zerwane połączenie
+        sock = self._connect(HEARTBEAT_INTERVAL * 3)
+        try:
+            sock.sendall(_encode(dict(params, command=command)))
+            with sock.makefile('rb') as rfile:
+                while True:
+                    message = self._read_message(rfile)
+                    if message.get('ok') is False:
+                        raise ControlError(message.get('error', 'nieznany błąd'))
+                    if message.get('type') != 'heartbeat':
+                        yield message
+                    if message.get('type') == 'done':
+                        return
+        except (OSError, ValueError) as e:
+            raise ControlError(f"Błąd komunikacji z demonem: {e}")
+        finally:
+            sock.close()
@@ -0,0 +1,1641 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Core - Silnik analizy i czyszczenia dysku
+Moduł bez zależności od GUI, współdzielony przez aplikację, demona i testy
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import errno
+import fcntl
+import heapq
+import fnmatch
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from notify import NotificationDispatcher, desktop_notify
+
+# Domyślne ścieżki współdzielone przez demona i CLI
+DEFAULT_CONFIG_FILE = "/etc/czysciciel/config.json"
+STATS_FILE = "/var/log/czysciciel-stats.json"
+# Migawki binarne skanów poziomu full (snapshot_settings) - kilka ostatnich do porównań
+SCAN_SNAPSHOT_DIR = "/var/lib/czysciciel/scans"
+DEFAULT_SCAN_SNAPSHOTS_KEEP = 3
+CLEANUP_LOCK_FILE = "/run/czysciciel/cleanup.lock"
+
+# Zachowanie przy zajętej blokadzie czyszczenia (CleanupLock.run)
+LOCK_POLICIES = ('wait', 'skip', 'piggyback')
+
+# Domyślne reguły czyszczenia (nadpisywane przez konfigurację demona)
+DEFAULT_CLEAN_CONFIG = {
+    "directories_to_clean": ["/var/log", "/tmp", "/var/tmp"],
+    "days_old": 7,
+    "large_file_mb": 200,
+    "large_file_directories": ["/tmp", "/var/tmp"],
+    "preserve_files": ["*.conf", "*.cfg", "*.config"]
+}
+
+# Pola wpisu "policies" i źródła wieku pliku ("ctime" zmienia się przy
+# przeniesieniu do kosza, więc w koszu odpowiada dacie usunięcia)
+POLICY_KEYS = ('path', 'age', 'max_age_days', 'min_size_mb', 'include',
+               'keep_newest', 'max_count', 'max_total_mb', 'action', 'compression', 'open_files')
+AGE_FIELDS = ('mtime', 'atime', 'ctime')
+
+# Co zrobić z wybranym plikiem: usunąć albo skompresować w miejscu (compress.py)
+POLICY_ACTIONS = ('delete', 'compress')
+
+# Co zrobić z plikiem otwartym przez proces (openfiles.py) - usunięcie nie zwolni miejsca,
+# dopóki proces go nie zamknie
+OPEN_FILE_ACTIONS = ('skip', 'truncate', 'delete')
+
+# Dopiski w logu usunięcia według powodu decyzji polityki
+REASON_LABELS = {'old': "", 'large': " duży plik", 'count': " (limit liczby plików)", 'total_size': " (limit rozmiaru)"}
+
+# Pliki tymczasowe kompresji (.nazwa.czysciciel-XXXX.tmp) i deduplikacji (.czysciciel-dedupe-XXXX.tmp) -
+# nigdy nie są kandydatami, a pozostawione przez przerwany proces są usuwane przy skanie po tym czasie
+# (ctime - zapis i link odświeżają go, póki trwa operacja)
+TEMP_NAME = re.compile(r'\..*czysciciel-[\w-]+\.tmp$')
+STALE_TEMP_SECONDS = 3600
+
+# Równoległe skanowanie katalogów polityk (advanced_settings.max_threads)
+DEFAULT_SCAN_THREADS = 4
+
+# Czas przechowywania plików w kwarantannie (advanced_settings.backup_before_delete)
+DEFAULT_QUARANTINE_TTL_HOURS = 72
+
+# Tryby profilowania (--profile / advanced_settings.profile)
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+# Katalogi analizowane domyślnie przez GUI
+IMPORTANT_DIRECTORIES = [
+    "/var/log", "/tmp", "/var/tmp", "/home", "/usr",
+    "/var", "/opt", "/boot", "/etc"
+]
+
+class TaskCancelled(Exception):
+    """Zadanie zostało anulowane przez użytkownika"""
+
+class ConfigError(ValueError):
+    """Konfiguracja reguł czyszczenia nie przeszła walidacji"""
+
+class LockBusy(Exception):
+    """Blokada czyszczenia jest zajęta przez inny proces"""
+    
+    def __init__(self, owner: Optional[Dict] = None):
+        self.owner = owner or {}
+        who = f"{self.owner.get('program', '?')} (PID {self.owner.get('pid', '?')})" if owner else "inny proces"
+        super().__init__(f"Czyszczenie trwa w: {who}")
+
+def check_cancelled(cancel_event: Optional[threading.Event]):
+    """Przerywa bieżącą operację, jeśli zażądano anulowania"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise TaskCancelled()
+
+def _json_value(value):
+    """Serializuje daty i czasy trwania do JSON"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return str(value)
+
+def format_size(size: int) -> str:
+    """Formatuje rozmiar do logów (bajty lub MB)"""
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f} MB"
+    return f"{size} bajtów"
+
+def load_config_file(config_file: str = DEFAULT_CONFIG_FILE) -> Dict:
+    """Wczytuje konfigurację JSON (bez zapisu), nakładając ją na wartości domyślne"""
+    config = dict(DEFAULT_CLEAN_CONFIG)
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+def find_mount_point(path: str) -> str:
+    """Znajduje punkt montowania systemu plików zawierającego ścieżkę"""
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+def get_filesystem_usage(path: str) -> Dict:
+    """Zwraca zajętość systemu plików zawierającego ścieżkę (statvfs)"""
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    free = st.f_bavail * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    return {
+        'mount_point': find_mount_point(path),
+        'total': total,
+        'used': used,
+        'free': free,
+        'percent_used': used / total * 100 if total else 0.0
+    }
+
+class Policy(NamedTuple):
+    """Skompilowana polityka jednego katalogu lub wzorca - wiersz tablicy decyzji"""
+    root: str
+    age_attr: str
+    max_age_seconds: Optional[float]
+    min_size_bytes: Optional[int]
+    include_regex: Optional[re.Pattern]
+    keep_newest: int
+    max_count: Optional[int]
+    max_total_bytes: Optional[int]
+    action: str = 'delete'
+    compression: str = 'gzip'
+    open_files: str = 'skip'
+    default_rules: bool = False  # Z directories_to_clean (days_old, large_file_mb), nie z policies
+    
+    @property
+    def ranked(self) -> bool:
+        """Czy decyzja zależy od pozycji pliku w katalogu (limity, keep_newest)"""
+        return bool(self.keep_newest) or self.max_count is not None or self.max_total_bytes is not None
+
+class CleanupGoal(NamedTuple):
+    """Czyszczenie celowane: tylko katalogi na tych systemach plików, do zwolnienia co najmniej bytes"""
+    mount_points: Tuple[str, ...]
+    bytes: int
+
+class RuleSet(NamedTuple):
+    """Skompilowane reguły czyszczenia - niezmienne, podmieniane w całości przy przeładowaniu"""
+    policies: Tuple[Policy, ...]
+    scan_roots: Tuple[str, ...]
+    preserve_patterns: Tuple[str, ...]
+    preserve_regex: Optional[re.Pattern]
+    scan_threads: int
+    io_limit_bytes: Optional[int] = None
+    quarantine_ttl_seconds: Optional[float] = None
+    
+    @property
+    def clean_roots(self) -> Tuple[str, ...]:
+        return tuple(policy.root for policy in self.policies)
+    
+    def is_preserved(self, filename: str) -> bool:
+        """Czy nazwa pliku pasuje do któregoś wzorca preserve_files"""
+        return self.preserve_regex is not None and self.preserve_regex.match(filename) is not None
+
+def _check_number(config: Dict, key: str, prefix: str = '', integer: bool = False) -> float:
+    value = config.get(key)
+    kinds = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or value < 0:
+        expected = "liczby całkowitej nieujemnej" if integer else "liczby nieujemnej"
+        raise ConfigError(f"{prefix}{key}: oczekiwano {expected}, jest {value!r}")
+    return value
+
+def _check_list(config: Dict, key: str, paths: bool = False, prefix: str = '') -> List[str]:
+    value = config.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+        raise ConfigError(f"{prefix}{key}: oczekiwano listy napisów")
+    if paths:
+        relative = [item for item in value if not os.path.isabs(item)]
+        if relative:
+            raise ConfigError(f"{prefix}{key}: ścieżki muszą być bezwzględne: {', '.join(relative)}")
+    return value
+
+def _compile_patterns(patterns) -> Optional[re.Pattern]:
+    """Jedno wyrażenie dla wszystkich wzorców zamiast fnmatch w pętli dla każdego pliku"""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns))
+
+def pattern_base(pattern: str) -> str:
+    """Stała część wzorca katalogu przed pierwszym symbolem wieloznacznym (/home/*/.cache -> /home)"""
+    parts = pattern.split('/')
+    for index, part in enumerate(parts):
+        if glob.has_magic(part):
+            return '/'.join(parts[:index]) or '/'
+    return pattern
+
+class RootExpander:
+    """Rozwija wzorce katalogów (np. /home/*/.cache/thumbnails) jednym listingiem rodzica
+    
+    Listing rodzica jest zapamiętywany i używany ponownie, dopóki nie zmieni się
+    mtime rodzica (dodanie lub usunięcie wpisu), więc przy tysiącach katalogów
+    domowych kolejny cykl kosztuje jeden stat zamiast scandir. Istnienie części
+    po symbolu wieloznacznym nie jest sprawdzane - robi to zadanie skanowania.
+    """
+    
+    def __init__(self):
+        self.cache: Dict[Tuple[str, str], Tuple[int, List[str]]] = {}
+        self.lock = threading.Lock()
+        self.listings = 0
+    
+    def expand(self, pattern: str) -> List[str]:
+        """Katalogi pasujące do wzorca (wzorzec bez symboli wieloznacznych bez zmian)"""
+        if not glob.has_magic(pattern):
+            return [pattern]
+        return sorted(self._expand('/', pattern.strip('/').split('/')))
+    
+    def expand_all(self, patterns) -> List[str]:
+        """Rozwija listę wzorców z zachowaniem kolejności i bez duplikatów"""
+        roots = {}
+        for pattern in patterns:
+            for root in self.expand(pattern):
+                roots.setdefault(root, None)
+        return list(roots)
+    
+    def _expand(self, base: str, parts: List[str]) -> List[str]:
+        index = 0
+        while index < len(parts) and not glob.has_magic(parts[index]):
+            index += 1
+        if index == len(parts):
+            return [os.path.join(base, *parts)]
+        
+        parent = os.path.join(base, *parts[:index])
+        names = self._list(parent, parts[index])
+        rest = parts[index + 1:]
+        prefix = parent.rstrip('/') + '/'
+        if not any(glob.has_magic(part) for part in rest):
+            suffix = ''.join('/' + part for part in rest)
+            return [prefix + name + suffix for name in names]
+        
+        results = []
+        for name in names:
+            results.extend(self._expand(prefix + name, rest))
+        return results
+    
+    def _list(self, parent: str, component: str) -> List[str]:
+        """Podkatalogi rodzica pasujące do składnika wzorca (z pamięci, jeśli mtime bez zmian)"""
+        key = (parent, component)
+        try:
+            mtime = os.stat(parent).st_mtime_ns
+        except OSError:
+            with self.lock:
+                self.cache.pop(key, None)
+            return []
+        
+        with self.lock:
+            cached = self.cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        # Jak glob: * nie pasuje do ukrytych wpisów, chyba że wzorzec zaczyna się od kropki
+        match = re.compile(fnmatch.translate(component)).match
+        hidden = component.startswith('.')
+        names = []
+        try:
+            with os.scandir(parent) as iterator:
+                for entry in iterator:
+                    if (hidden or entry.name[0] != '.') and match(entry.name) and entry.is_dir():
+                        names.append(entry.name)
+        except OSError:
+            return []
+        
+        with self.lock:
+            self.cache[key] = (mtime, names)
+            self.listings += 1
+        return names
+
+def _check_choice(config: Dict, key: str, choices: Tuple[str, ...], default: str, prefix: str = '') -> str:
+    value = config.get(key, default)
+    if value not in choices:
+        raise ConfigError(f"{prefix}{key}: oczekiwano jednego z {', '.join(choices)}, jest {value!r}")
+    return value
+
+def _compile_policy(entry: Dict, index: int, open_files: str = 'skip') -> Tuple[str, Dict]:
+    """Waliduje wpis policies[index]; zwraca wzorzec katalogu i pola Policy bez root"""
+    prefix = f"policies[{index}]."
+    if not isinstance(entry, dict):
+        raise ConfigError(f"policies[{index}]: oczekiwano obiektu")
+    unknown = set(entry) - set(POLICY_KEYS)
+    if unknown:
+        raise ConfigError(f"policies[{index}]: nieznane pola {', '.join(sorted(unknown))}")
+    path = entry.get('path')
+    if not isinstance(path, str) or not os.path.isabs(path):
+        raise ConfigError(f"{prefix}path: oczekiwano ścieżki bezwzględnej, jest {path!r}")
+    age = _check_choice(entry, 'age', AGE_FIELDS, 'mtime', prefix)
+    action = _check_choice(entry, 'action', POLICY_ACTIONS, 'delete', prefix)
+    compression = entry.get('compression', 'gzip')
+    if compression not in ('gzip', 'xz'):
+        raise ConfigError(f"{prefix}compression: oczekiwano gzip lub xz, jest {compression!r}")
+    
+    def optional(key, integer=False):
+        return None if entry.get(key) is None else _check_number(entry, key, prefix, integer)
+    
+    max_age_days = optional('max_age_days')
+    min_size_mb = optional('min_size_mb')
+    max_total_mb = optional('max_total_mb')
+    fields = {
+        'age_attr': 'st_' + age,
+        'max_age_seconds': None if max_age_days is None else max_age_days * 86400,
+        'min_size_bytes': None if min_size_mb is None else int(min_size_mb * 1024 * 1024),
+        'include_regex': _compile_patterns(_check_list(entry, 'include', prefix=prefix)),
+        'keep_newest': optional('keep_newest', integer=True) or 0,
+        'max_count': optional('max_count', integer=True),
+        'max_total_bytes': None if max_total_mb is None else int(max_total_mb * 1024 * 1024),
+        'action': action,
+        'compression': compression,
+        'open_files': _check_choice(entry, 'open_files', OPEN_FILE_ACTIONS, open_files, prefix)
+    }
+    if all(fields[key] is None for key in ('max_age_seconds', 'min_size_bytes', 'max_count', 'max_total_bytes')):
+        raise ConfigError(f"policies[{index}]: polityka wymaga max_age_days, min_size_mb, max_count lub max_total_mb")
+    return path, fields
+
+def compile_rules(config: Dict) -> RuleSet:
+    """Waliduje konfigurację czyszczenia i kompiluje ją do RuleSet (ConfigError przy błędzie)
+    
+    directories_to_clean z days_old/large_file_mb/large_file_directories daje
+    polityki domyślne; wpisy policies dla tego samego katalogu je zastępują.
+    """
+    if not isinstance(config, dict):
+        raise ConfigError("konfiguracja musi być obiektem JSON")
+    config = dict(DEFAULT_CLEAN_CONFIG, **config)
+    
+    days_old = _check_number(config, 'days_old')
+    large_file_mb = _check_number(config, 'large_file_mb')
+    large_patterns = set(_check_list(config, 'large_file_directories', paths=True))
+    preserve = tuple(_check_list(config, 'preserve_files'))
+    entries = config.get('policies', [])
+    if not isinstance(entries, list):
+        raise ConfigError("policies: oczekiwano listy obiektów")
+    
+    advanced = config.get('advanced_settings') or {}
+    if not isinstance(advanced, dict):
+        raise ConfigError("advanced_settings: oczekiwano obiektu")
+    scan_threads = 1
+    if advanced.get('parallel_processing', True):
+        scan_threads = advanced.get('max_threads', DEFAULT_SCAN_THREADS)
+        if isinstance(scan_threads, bool) or not isinstance(scan_threads, int) or scan_threads < 1:
+            raise ConfigError(f"advanced_settings.max_threads: oczekiwano liczby całkowitej >= 1, jest {scan_threads!r}")
+    io_limit_mb = None
+    if advanced.get('io_limit_mb_per_second'):
+        io_limit_mb = _check_number(advanced, 'io_limit_mb_per_second', 'advanced_settings.')
+    open_files = _check_choice(advanced, 'open_files', OPEN_FILE_ACTIONS, 'skip', 'advanced_settings.')
+    quarantine_ttl = None
+    if advanced.get('backup_before_delete'):
+        quarantine_ttl = DEFAULT_QUARANTINE_TTL_HOURS * 3600
+        if 'quarantine_ttl_hours' in advanced:
+            quarantine_ttl = _check_number(advanced, 'quarantine_ttl_hours', 'advanced_settings.') * 3600
+    
+    # Wzorce katalogów są rozwijane dopiero przy skanowaniu (RootExpander)
+    policies = {}
+    for pattern in _check_list(config, 'directories_to_clean', paths=True):
+        policies.setdefault(pattern, Policy(
+            root=pattern, age_attr='st_mtime', max_age_seconds=days_old * 86400,
+            min_size_bytes=int(large_file_mb * 1024 * 1024) if pattern in large_patterns else None,
+            include_regex=None, keep_newest=0, max_count=None, max_total_bytes=None, open_files=open_files,
+            default_rules=True
+        ))
+    for index, entry in enumerate(entries):
+        pattern, fields = _compile_policy(entry, index, open_files)
+        policies[pattern] = Policy(root=pattern, **fields)
+    
+    scan_roots = {pattern: None for pattern in _check_list(config, 'directories_to_scan', paths=True)}
+    
+    return RuleSet(
+        policies=tuple(policies.values()),
+        scan_roots=tuple(scan_roots),
+        preserve_patterns=preserve,
+        preserve_regex=_compile_patterns(preserve),
+        scan_threads=scan_threads,
+        io_limit_bytes=int(io_limit_mb * 1024 * 1024) if io_limit_mb else None,
+        quarantine_ttl_seconds=quarantine_ttl
+    )
+
+class Instrumentation:
+    """Liczniki i czasy faz jednego przebiegu skanowania lub czyszczenia"""
+    
+    def __init__(self):
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.errors = defaultdict(int)
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Mierzy czas bloku kodu (dla faz, nie dla pojedynczych plików)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+    
+    def record_error(self, error: OSError):
+        """Zlicza błąd według kodu errno"""
+        self.errors[errno.errorcode.get(error.errno, 'UNKNOWN')] += 1
+    
+    def merge(self, other: 'Instrumentation'):
+        """Dodaje liczniki innego przebiegu"""
+        for name, value in other.timers.items():
+            self.timers[name] += value
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        for name, value in other.errors.items():
+            self.errors[name] += value
+    
+    def as_dict(self) -> Dict:
+        """Zwraca liczniki w postaci nadającej się do JSON"""
+        return {
+            'timers': {name: round(value, 6) for name, value in self.timers.items()},
+            'counters': dict(self.counters),
+            'errors': dict(self.errors)
+        }
+    
+    def summary(self) -> str:
+        """Jednolinijkowe podsumowanie do logu"""
+        parts = [f"{name}={value:.3f}s" for name, value in self.timers.items()]
+        parts += [f"{name}={value}" for name, value in self.counters.items()]
+        if self.errors:
+            parts.append("errors=" + ",".join(f"{name}:{count}" for name, count in self.errors.items()))
+        return " ".join(parts)
+
+# Najdłuższe czekanie bez wywołania heartbeat/progress_callback (limit I/O, pula kompresji) -
+# keepalive watchdoga demona idzie z postępu, a WatchdogSec to kilka minut
+HEARTBEAT_SLICE = 5.0
+
+class IOThrottle:
+    """Ogranicza tempo operacji czyszczenia do bytes_per_second (usuwanie i kompresja razem)
+    
+    Kubełek z zapasem na jedną sekundę: consume() odejmuje rozmiar pliku i
+    usypia wątek, dopóki dług nie zostanie spłacony. None - bez limitu.
+    """
+    
+    def __init__(self, bytes_per_second: Optional[float] = None):
+        self.rate = bytes_per_second
+        self.available = bytes_per_second or 0.0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+    
+    def consume(self, nbytes: int, cancel_event: Optional[threading.Event] = None,
+                heartbeat: Optional[Callable[[], None]] = None):
+        """Rezerwuje nbytes; czeka (z możliwością przerwania), jeśli limit jest wyczerpany
+        
+        Duży plik przy niskim limicie to długie czekanie - idzie odcinkami
+        HEARTBEAT_SLICE z wywołaniem heartbeat między nimi.
+        """
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.rate, self.available + (now - self.last) * self.rate) - nbytes
+            self.last = now
+            delay = -self.available / self.rate if self.available < 0 else 0.0
+        if delay:
+            self.waited += delay
+            deadline = time.monotonic() + delay
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if cancel_event is not None:
+                    cancel_event.wait(min(remaining, HEARTBEAT_SLICE))
+                else:
+                    time.sleep(min(remaining, HEARTBEAT_SLICE))
+                check_cancelled(cancel_event)
+                if heartbeat and deadline > time.monotonic():
+                    heartbeat()
+
+def walk_files(directory: str, cancel_event: Optional[threading.Event] = None,
+               instrumentation: Optional[Instrumentation] = None,
+               progress_callback: Optional[Callable[[str, int], None]] = None,
+               skip_dirs: frozenset = frozenset(), follow_symlinks: bool = True, sort: bool = False):
+    """Przechodzi drzewo katalogów i zwraca pary (ścieżka, stat) dla plików
+    
+    Jeden os.scandir na katalog i jeden stat na plik. Dowiązania do katalogów
+    nie są przechodzone, a plików są rozwiązywane - tak jak w os.walk
+    (follow_symlinks=False pomija je bez dodatkowego wywołania systemowego).
+    Podkatalogi z skip_dirs są pomijane (np. katalogi z własną polityką).
+    sort=True zwraca pliki w porządku leksykograficznym pełnych ścieżek
+    (migawki binarne): wpisy katalogu są sortowane, a reszta katalogu czeka
+    na stosie, aż przejście skończy poddrzewo.
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    timers = instrumentation.timers
+    counters = instrumentation.counters
+    perf_counter = time.perf_counter
+    files_seen = 0
+    stack = [directory]
+    
+    while stack:
+        check_cancelled(cancel_event)
+        current = stack.pop()
+        
+        if isinstance(current, tuple):
+            # Dokończenie katalogu po poddrzewie (sort=True)
+            current, entries = current
+        else:
+            start = perf_counter()
+            try:
+                with os.scandir(current) as iterator:
+                    entries = list(iterator)
+            except OSError as e:
+                instrumentation.record_error(e)
+                continue
+            finally:
+                timers['list'] += perf_counter() - start
+            counters['dirs_listed'] += 1
+            if sort:
+                # Katalog "a" to w ścieżkach prefiks "a/", więc jego poddrzewo leży między "a." i "a0"
+                entries.sort(key=lambda entry: entry.name + '/' if entry.is_dir() else entry.name)
+            entries = iter(entries)
+        
+        for entry in entries:
+            start = perf_counter()
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink() and entry.path not in skip_dirs:
+                        if sort:
+                            stack.append((current, entries))
+                            stack.append(entry.path)
+                            break
+                        stack.append(entry.path)
+                    continue
+                if not follow_symlinks and entry.is_symlink():
+                    continue
+                st = entry.stat()
+                counters['entries_stat'] += 1
+            except OSError as e:
+                instrumentation.record_error(e)
+                continue
+            finally:
+                timers['stat'] += perf_counter() - start
+            files_seen += 1
+            yield entry.path, st
+        else:
+            if progress_callback:
+                progress_callback(current, files_seen)
+
+def profile_run(mode: Optional[str], output_dir: str, name: str):
+    """Opcjonalnie profiluje blok kodu i zapisuje wynik w output_dir
+    
+    mode: None (bez profilowania), "cprofile" (plik .prof) lub "tracemalloc"
+    (najwięksi alokujący i szczyt pamięci w pliku tekstowym).
+    """
+    if mode and mode not in PROFILE_MODES:
+        raise ValueError(f"Nieznany tryb profilowania: {mode}")
+    return _profile_run(mode, output_dir, name)
+
+@contextmanager
+def _profile_run(mode: Optional[str], output_dir: str, name: str):
+    if not mode:
+        yield None
+        return
+    
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    base_path = os.path.join(output_dir, f"czysciciel-profile-{name}-{stamp}")
+    
+    if mode == 'cprofile':
+        import cProfile
+        output_path = base_path + '.prof'
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield output_path
+        finally:
+            profiler.disable()
+            try:
+                profiler.dump_stats(output_path)
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Nie można zapisać profilu {output_path}: {e}")
+    else:
+        import tracemalloc
+        output_path = base_path + '.tracemalloc.txt'
+        tracemalloc.start(25)
+        try:
+            yield output_path
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            try:
+                with open(output_path, 'w') as f:
+                    f.write(f"current={current} peak={peak}\n")
+                    for stat in snapshot.statistics('lineno')[:50]:
+                        f.write(f"{stat}\n")
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Nie można zapisać profilu {output_path}: {e}")
+
+class CleanupLock:
+    """Blokada czyszczenia współdzielona przez demona, GUI i CLI (flock)
+    
+    Plik blokady zawiera metadane właściciela (PID, program, UID, start),
+    a obok niego zapisywany jest wynik ostatniego czyszczenia, z którego
+    mogą skorzystać procesy czekające w trybie "piggyback".
+    """
+    
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, path: str = CLEANUP_LOCK_FILE, program: str = "czysciciel"):
+        self.path = path
+        self.result_path = path + '.result'
+        self.program = program
+        self.fd = None
+    
+    @staticmethod
+    def _open_path(path: str) -> int:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        except OSError:
+            pass
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        except PermissionError:
+            # Plik utworzony przez innego użytkownika - flock działa też na deskryptorze tylko do odczytu
+            return os.open(path, os.O_RDONLY)
+        try:
+            # Umask twórcy nie może odciąć GUI użytkownika od blokady demona
+            os.fchmod(fd, 0o666)
+        except OSError:
+            pass
+        return fd
+    
+    @staticmethod
+    def _fallback_path() -> Optional[str]:
+        """Blokada tego użytkownika: w XDG_RUNTIME_DIR albo we własnym katalogu 0700 w /tmp"""
+        runtime = os.environ.get('XDG_RUNTIME_DIR')
+        if runtime and os.path.isdir(runtime):
+            return os.path.join(runtime, 'czysciciel-cleanup.lock')
+        import stat
+        import tempfile
+        directory = os.path.join(tempfile.gettempdir(), f'czysciciel-{os.getuid()}')
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+        st = os.lstat(directory)
+        # Katalog podstawiony przez innego użytkownika (lub dowiązanie) nie może przejąć blokady
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+            return None
+        return os.path.join(directory, 'cleanup.lock')
+    
+    def _open(self) -> Optional[int]:
+        """Deskryptor pliku blokady; None - blokady nie da się założyć (czyszczenie bez niej)
+        
+        Bez katalogu wspólnej blokady (np. /run/czysciciel, gdy demon nie działa,
+        a użytkownik nie może go utworzyć) GUI i CLI używają blokady per użytkownik.
+        """
+        logger = logging.getLogger(__name__)
+        try:
+            return self._open_path(self.path)
+        except OSError as e:
+            fallback = self._fallback_path()
+            if fallback is None:
+                logger.warning(f"Blokada {self.path} niedostępna ({e}) - czyszczenie bez blokady")
+                return None
+            logger.warning(f"Blokada {self.path} niedostępna ({e}) - używam {fallback}")
+        try:
+            fd = self._open_path(fallback)
+        except OSError as e:
+            logger.warning(f"Blokada {fallback} niedostępna ({e}) - czyszczenie bez blokady")
+            return None
+        self.path = fallback
+        self.result_path = fallback + '.result'
+        return fd
+    
+    def owner(self) -> Optional[Dict]:
+        """Metadane procesu trzymającego blokadę (None jeśli brak)"""
+        try:
+            with open(self.path, 'r') as f:
+                data = f.read()
+            return json.loads(data) if data else None
+        except (OSError, ValueError):
+            return None
+    
+    def acquire(self, policy: str = 'wait', timeout: Optional[float] = None,
+                cancel_event: Optional[threading.Event] = None,
+                heartbeat: Optional[Callable[[], None]] = None) -> bool:
+        """Zakłada blokadę; przy "skip" zwraca False, gdy jest zajęta (heartbeat co próbę)"""
+        fd = self._open()
+        if fd is None:
+            return True  # Bez blokady - release() nie ma czego zwalniać
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if policy == 'skip' or (deadline is not None and time.monotonic() >= deadline):
+                    os.close(fd)
+                    return False
+                try:
+                    check_cancelled(cancel_event)
+                except TaskCancelled:
+                    os.close(fd)
+                    raise
+                if heartbeat:
+                    heartbeat()
+                time.sleep(self.POLL_INTERVAL)
+        
+        self.fd = fd
+        metadata = {
+            'pid': os.getpid(),
+            'program': self.program,
+            'uid': os.getuid(),
+            'started': datetime.now().isoformat()
+        }
+        try:
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, json.dumps(metadata).encode('utf-8'), 0)
+        except OSError:
+            pass  # Deskryptor tylko do odczytu - blokada działa bez metadanych
+        return True
+    
+    def release(self):
+        """Zwalnia blokadę"""
+        if self.fd is None:
+            return
+        try:
+            os.ftruncate(self.fd, 0)
+        except OSError:
+            pass
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+    
+    def _save_result(self, result: Dict):
+        shared = {key: value for key, value in result.items() if key != 'cleaned_files'}
+        shared['owner'] = self.owner()
+        shared['finished'] = time.time()
+        tmp_path = f"{self.result_path}.{os.getpid()}"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(shared, f, default=_json_value)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.result_path)
+        except OSError:
+            pass  # Brak prawa zapisu w katalogu blokady - wynik nie jest współdzielony
+    
+    def _load_result(self, since: float) -> Optional[Dict]:
+        try:
+            with open(self.result_path, 'r') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if result.get('finished', 0) < since:
+            return None
+        for key in ('start_time', 'end_time'):
+            if isinstance(result.get(key), str):
+                result[key] = datetime.fromisoformat(result[key])
+        result['piggyback'] = True
+        return result
+    
+    def run(self, func: Callable[[], Dict], policy: str = 'wait', timeout: Optional[float] = None,
+            cancel_event: Optional[threading.Event] = None,
+            heartbeat: Optional[Callable[[], None]] = None) -> Dict:
+        """Wykonuje czyszczenie pod blokadą zgodnie z polityką
+        
+        wait - czeka na zwolnienie blokady i czyści samodzielnie,
+        skip - zgłasza LockBusy, jeśli blokada jest zajęta,
+        piggyback - czeka i zwraca wynik czyszczenia, które zakończyło się w tym czasie.
+        """
+        if policy not in LOCK_POLICIES:
+            raise ValueError(f"Nieznana polityka blokady: {policy}")
+        
+        requested = time.time()
+        if not self.acquire(policy, timeout, cancel_event, heartbeat):
+            raise LockBusy(self.owner())
+        
+        try:
+            if policy == 'piggyback':
+                result = self._load_result(requested)
+                if result is not None:
+                    return result
+            result = func()
+            self._save_result(result)
+            return result
+        finally:
+            self.release()
+
+class TranslationManager:
+    """Klasa do zarządzania tłumaczeniami"""
+    
+    def __init__(self):
+        self.current_lang = "pl"  # Default Polish
+        self.translations = {}
+        self.load_translations()
+    
+    def load_translations(self):
+        """Ładuje tłumaczenia z pliku"""
+        try:
+            # Try different possible paths
+            translation_paths = [
+                "translations.json",
+                "assets/translations.json", 
+                "/opt/inv-cleaner/translations.json",
+                "/snap/inv-cleaner/current/translations.json"
+            ]
+            
+            for path in translation_paths:
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self.translations = json.load(f)
+                    break
+            else:
+                # Fallback translations if file not found
+                self.translations = {
+                    "pl": {"app_title": "Inv Cleaner - Zaawansowane Narzędzie"},
+                    "en": {"app_title": "Inv Cleaner - Advanced Tool"}
+                }
+        except Exception as e:
+            print(f"Error loading translations: {e}")
+            self.translations = {"pl": {}, "en": {}}
+    
+    def get(self, key: str, *args) -> str:
+        """Pobiera tłumaczenie dla klucza"""
+        try:
+            text = self.translations.get(self.current_lang, {}).get(key, key)
+            if args:
+                return text.format(*args)
+            return text
+        except Exception:
+            return key
+    
+    def set_language(self, lang: str):
+        """Ustawia język aplikacji"""
+        if lang in self.translations:
+            self.current_lang = lang
+
+class TopK:
+    """K największych elementów strumienia - kopiec minimalny, O(log K) na element i O(K) pamięci"""
+    
+    def __init__(self, k: int):
+        self.k = k
+        self.heap = []
+    
+    def push(self, size: int, item):
+        heap = self.heap
+        if len(heap) < self.k:
+            heapq.heappush(heap, (size, item))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, item))
+    
+    def largest(self) -> List[Tuple[int, object]]:
+        return sorted(self.heap, reverse=True)
+
+class UsageTop:
+    """Największe pliki, katalogi (z podkatalogami) i rozszerzenia zbierane w tym samym przejściu co rozmiary
+    
+    walk_files przechodzi drzewo w głąb, więc rozmiar katalogu jest znany, gdy
+    przejście opuszcza jego poddrzewo - wystarczy łańcuch katalogów od korzenia
+    do bieżącego (pamięć O(głębokość)). Rozszerzeń jest niewiele, więc są
+    sumowane w słowniku, a K największych wybierane na końcu.
+    """
+    
+    # Dłuższe "rozszerzenia" to zwykle fragmenty nazw (skróty, znaczniki czasu) - liczone jako brak
+    MAX_EXTENSION = 8
+    
+    def __init__(self, k: int):
+        self.k = k
+        self.files = TopK(k)
+        self.directories = TopK(k)
+        self.extensions = defaultdict(lambda: [0, 0])
+        self.chain = []
+    
+    def begin(self, root: str):
+        """Rozpoczyna katalog analizy (root zostaje korzeniem łańcucha)"""
+        self.end()
+        self.chain.append([root.rstrip('/') or '/', 0])
+    
+    def end(self):
+        """Zamyka wszystkie otwarte katalogi łańcucha"""
+        while self.chain:
+            self._close()
+    
+    def _close(self):
+        path, size = self.chain.pop()
+        self.directories.push(size, path)
+        if self.chain:
+            self.chain[-1][1] += size
+    
+    def _enter(self, directory: str):
+        chain = self.chain
+        while chain:
+            top = chain[-1][0]
+            prefix = top if top.endswith('/') else top + '/'
+            if directory == top or directory.startswith(prefix):
+                break
+            self._close()
+        if not chain:
+            chain.append([directory, 0])
+            return
+        # Katalogi pośrednie bez własnych plików też są węzłami łańcucha
+        top = chain[-1][0]
+        if directory != top:
+            path = top.rstrip('/')
+            for part in directory[len(path) + 1:].split('/'):
+                path = f"{path}/{part}"
+                chain.append([path, 0])
+    
+    def add(self, path: str, size: int):
+        directory, _, name = path.rpartition('/')
+        directory = directory or '/'
+        if not self.chain or self.chain[-1][0] != directory:
+            self._enter(directory)
+        self.chain[-1][1] += size
+        self.files.push(size, path)
+        dot = name.rfind('.')
+        extension = name[dot:].lower() if 0 < dot and len(name) - dot <= self.MAX_EXTENSION + 1 else ''
+        group = self.extensions[extension]
+        group[0] += size
+        group[1] += 1
+    
+    def as_dict(self) -> Dict:
+        self.end()
+        extensions = heapq.nlargest(self.k, self.extensions.items(), key=lambda item: item[1][0])
+        return {
+            'files': [{'path': path, 'size': size} for size, path in self.files.largest()],
+            'directories': [{'path': path, 'size': size} for size, path in self.directories.largest()],
+            'extensions': [{'extension': extension, 'size': size, 'files': count}
+                           for extension, (size, count) in extensions]
+        }
+
+class DiskAnalyzer:
+    """Klasa do analizy wykorzystania dysku"""
+    
+    def __init__(self):
+        self.scan_results = {}
+        self.instrumentation = Instrumentation()
+    
+    def get_directory_size(self, path: str, cancel_event: Optional[threading.Event] = None,
+                           progress_callback: Optional[Callable[[str, int], None]] = None,
+                           instrumentation: Optional[Instrumentation] = None,
+                           top: Optional[UsageTop] = None, snapshot=None) -> int:
+        """Pobiera rozmiar katalogu w bajtach
+        
+        Z top zbiera też największe pliki i katalogi, a ze snapshot (ScanWriter)
+        zapisuje pliki do migawki binarnej - w porządku ścieżek, w tym samym przejściu.
+        """
+        total_size = 0
+        if top is None and snapshot is None:
+            for file_path, st in walk_files(path, cancel_event, instrumentation, progress_callback):
+                total_size += st.st_size
+            return total_size
+        
+        add = top.add if top else None
+        record = snapshot.add if snapshot else None
+        if top:
+            top.begin(path)
+        if snapshot:
+            snapshot.begin_root(path)
+        for file_path, st in walk_files(path, cancel_event, instrumentation, progress_callback,
+                                        sort=snapshot is not None):
+            total_size += st.st_size
+            if add:
+                add(file_path, st.st_size)
+            if record:
+                record(file_path, st)
+        if top:
+            top.end()
+        if snapshot:
+            snapshot.end_root(total_size)
+        return total_size
+    
+    def analyze_disk_usage(self, root_path: str = "/", cancel_event: Optional[threading.Event] = None,
+                           progress_callback: Optional[Callable[[str, int], None]] = None,
+                           directories: Optional[List[str]] = None, top: Optional[UsageTop] = None,
+                           snapshot=None) -> Dict:
+        """Analizuje wykorzystanie dysku
+        
+        Z top - także K największych plików, katalogów i rozszerzeń; ze snapshot
+        (ScanWriter) każdy katalog trafia do migawki binarnej, którą zapisuje wywołujący.
+        """
+        results = {}
+        important_dirs = directories if directories is not None else IMPORTANT_DIRECTORIES
+        self.instrumentation = Instrumentation()
+        
+        for dir_path in important_dirs:
+            check_cancelled(cancel_event)
+            if os.path.exists(dir_path):
+                start = time.perf_counter()
+                files_before = self.instrumentation.counters['entries_stat']
+                errors_before = sum(self.instrumentation.errors.values())
+                size = self.get_directory_size(dir_path, cancel_event, progress_callback, self.instrumentation, top,
+                                               snapshot)
+                results[dir_path] = {
+                    'size': size,
+                    'size_mb': size / (1024 * 1024),
+                    'size_gb': size / (1024 * 1024 * 1024),
+                    'files': self.instrumentation.counters['entries_stat'] - files_before,
+                    'errors': sum(self.instrumentation.errors.values()) - errors_before,
+                    'scan_time': time.perf_counter() - start
+                }
+        
+        self.scan_results = results
+        return results
+
+class DiskCleaner:
+    """Klasa do czyszczenia dysku"""
+    
+    def __init__(self, log_file: str = "/var/log/czysciciel.log", config: Optional[Dict] = None):
+        self.log_file = log_file
+        self.config = dict(DEFAULT_CLEAN_CONFIG)
+        if config:
+            self.config.update(config)
+        self.rules = compile_rules(self.config)
+        self.expander = RootExpander()
+        self.setup_logging()
+        self.cleaned_files = []
+        self.compressed_files = []
+        self.total_cleaned = 0
+        self.errors = 0
+        self.instrumentation = Instrumentation()
+        self.test_mode = False
+        self.test_callback = None
+        self.collect_snapshot = False
+        self.snapshot = None
+    
+    def set_test_mode(self, enabled: bool, callback=None):
+        """Ustawia tryb testowy"""
+        self.test_mode = enabled
+        self.test_callback = callback
+    
+    def set_rules(self, rules: RuleSet, config: Dict):
+        """Podmienia skompilowane reguły (jedno przypisanie - bieżący przebieg używa poprzednich)"""
+        self.config = dict(DEFAULT_CLEAN_CONFIG, **config)
+        self.rules = rules
+    
+    def update_config(self, config: Dict):
+        """Kompiluje i ustawia nową konfigurację (ConfigError, jeśli błędna)"""
+        self.set_rules(compile_rules(config), config)
+    
+    def _log_or_callback(self, message: str, level: str = "info"):
+        """Loguje wiadomość lub wywołuje callback w trybie testowym"""
+        with self.instrumentation.phase('log'):
+            if self.test_mode and self.test_callback:
+                self.test_callback(message)
+            else:
+                if level == "info":
+                    self.logger.info(message)
+                elif level == "error":
+                    self.logger.error(message)
+    
+    def setup_logging(self):
+        """Konfiguruje system logowania"""
+        logging.basicConfig(
+            filename=self.log_file,
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        self.logger = logging.getLogger(__name__)
+    
+    def _match_files(self, directory: str, predicate, cancel_event: Optional[threading.Event] = None):
+        """Zwraca (ścieżka, rozmiar) plików spełniających warunek, pomijając chronione"""
+        timers = self.instrumentation.timers
+        counters = self.instrumentation.counters
+        perf_counter = time.perf_counter
+        
+        for file_path, st in walk_files(directory, cancel_event, self.instrumentation):
+            start = perf_counter()
+            matched = predicate(st) and not self.should_preserve_file(file_path)
+            timers['match'] += perf_counter() - start
+            if matched:
+                counters['matcher_hits'] += 1
+                yield file_path, st.st_size
+    
+    def _iter_old_files(self, directory: str, days_old: int,
+                        cancel_event: Optional[threading.Event] = None):
+        """Zwraca (ścieżka, rozmiar) plików starszych niż określona liczba dni"""
+        cutoff = time.time() - days_old * 86400
+        return self._match_files(directory, lambda st: st.st_mtime < cutoff, cancel_event)
+    
+    def _iter_large_files(self, directory: str, size_mb: int,
+                          cancel_event: Optional[threading.Event] = None):
+        """Zwraca (ścieżka, rozmiar) plików większych niż określony rozmiar"""
+        size_bytes = size_mb * 1024 * 1024
+        return self._match_files(directory, lambda st: st.st_size > size_bytes, cancel_event)
+    
+    def find_old_files(self, directory: str, days_old: int = 7,
+                       cancel_event: Optional[threading.Event] = None) -> List[str]:
+        """Znajduje pliki starsze niż określona liczba dni"""
+        return [file_path for file_path, _ in self._iter_old_files(directory, days_old, cancel_event)]
+    
+    def find_large_files(self, directory: str, size_mb: int = 200,
+                         cancel_event: Optional[threading.Event] = None) -> List[Tuple[str, int]]:
+        """Znajduje pliki większe niż określony rozmiar"""
+        return list(self._iter_large_files(directory, size_mb, cancel_event))
+    
+    def should_preserve_file(self, file_path: str) -> bool:
+        """Sprawdza czy plik powinien być zachowany"""
+        return self.rules.is_preserved(os.path.basename(file_path))
+    
+    def policy_table(self, rules: Optional[RuleSet] = None) -> Dict[str, Policy]:
+        """Rozwinięte katalogi i ich polityki (przy kilku pasujących wygrywa późniejsza)"""
+        rules = rules or self.rules
+        table = {}
+        for policy in rules.policies:
+            for root in self.expander.expand(policy.root):
+                table[root] = policy
+        return table
+    
+    def _scan_roots(self, rules: RuleSet, cancel_event: Optional[threading.Event] = None,
+                    progress_callback: Optional[Callable[[str, int], None]] = None, snapshot=None,
+                    default_only: bool = False, mount_points: Optional[Tuple[str, ...]] = None,
+                    reap_temps: bool = False):
+        """Skanuje katalogi polityk; zwraca (katalog, polityka, wybrane pliki) w kolejności polityk
+        
+        Każdy rozwinięty katalog to osobne zadanie kolejki. Przy scan_threads > 1
+        zadania wykonuje pula wątków (scandir i stat zwalniają GIL), każde z
+        własną instrumentacją, scalaną w wątku wywołującym. progress_callback
+        jest wtedy wywoływany z wątków puli. snapshot (SnapshotBuilder) dostaje
+        w tym samym przejściu pliki katalogów z regułami domyślnymi; default_only
+        pomija pozostałe katalogi (ale nadal nie wchodzi do nich z nadrzędnych),
+        a mount_points - katalogi na innych systemach plików. reap_temps usuwa
+        przy okazji stare pliki tymczasowe - tylko prawdziwe czyszczenie, nie plan
+        ani migawka.
+        """
+        from quarantine import quarantine_dirs
+        
+        table = self.policy_table(rules)
+        # Kwarantanna leży w punkcie montowania, który sam może być katalogiem polityki (np. /tmp)
+        skip_dirs = frozenset(table).union(quarantine_dirs())
+        now = snapshot.taken_at if snapshot else time.time()
+        
+        def scan(item):
+            root, policy, segment = item
+            instrumentation = Instrumentation()
+            if not os.path.isdir(root):
+                return root, policy, None, instrumentation
+            selected = self._scan_policy(policy, root, rules, now, skip_dirs, instrumentation,
+                                         cancel_event, progress_callback, segment, reap_temps)
+            return root, policy, selected, instrumentation
+        
+        # Segmenty migawki powstają tutaj, w kolejności polityk - wątki puli tylko je wypełniają
+        items = [(root, policy, snapshot.segment(root, policy.min_size_bytes is not None)
+                  if snapshot and policy.default_rules else None)
+                 for root, policy in table.items() if (policy.default_rules or not default_only)
+                 and (mount_points is None or find_mount_point(root) in mount_points)]
+        executor = None
+        if rules.scan_threads > 1 and len(items) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(min(rules.scan_threads, len(items)), thread_name_prefix='czysciciel-scan')
+            results = executor.map(scan, items)
+        else:
+            results = map(scan, items)
+        
+        try:
+            for root, policy, selected, instrumentation in results:
+                self.instrumentation.merge(instrumentation)
+                if selected is not None:
+                    yield root, policy, selected
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _scan_policy(self, policy: Policy, root: str, rules: RuleSet, now: float, skip_dirs: frozenset,
+                     instrumentation: Instrumentation, cancel_event: Optional[threading.Event] = None,
+                     progress_callback: Optional[Callable[[str, int], None]] = None,
+                     segment=None, reap_temps: bool = False) -> List[Tuple[str, int, str]]:
+        """Jedno przejście katalogu polityki; zwraca (ścieżka, rozmiar, powód) plików do usunięcia
+        
+        Decyzja dla pliku to stała liczba porównań (wiek, rozmiar, jedno wyrażenie
+        include i jedno preserve), niezależnie od liczby polityk i wzorców.
+        Limity liczby/rozmiaru i keep_newest porządkują pliki po przejściu.
+        Pliki niechronione trafiają też do segmentu migawki, jeśli jest podany.
+        Pliki tymczasowe (TEMP_NAME) są pomijane, a z reap_temps starsze niż
+        STALE_TEMP_SECONDS - usuwane.
+        """
+        timers = instrumentation.timers
+        counters = instrumentation.counters
+        perf_counter = time.perf_counter
+        age_attr = policy.age_attr
+        cutoff = now - policy.max_age_seconds if policy.max_age_seconds is not None else float('-inf')
+        min_size = policy.min_size_bytes if policy.min_size_bytes is not None else float('inf')
+        include = policy.include_regex.match if policy.include_regex else None
+        preserve = rules.preserve_regex.match if rules.preserve_regex else None
+        if policy.action == 'compress':
+            # Pliki już skompresowane (także wyniki poprzednich przebiegów) nie są kandydatami
+            from compress import COMPRESSED_NAME
+            skip_compressed, skip_preserved = COMPRESSED_NAME.match, preserve
+            preserve = (lambda name: skip_compressed(name) or skip_preserved(name)) if skip_preserved else skip_compressed
+        is_temp = TEMP_NAME.match
+        stale_cutoff = now - STALE_TEMP_SECONDS
+        ranked = policy.ranked
+        selected = []
+        entries = []
+        
+        for file_path, st in walk_files(root, cancel_event, instrumentation, progress_callback, skip_dirs):
+            start = perf_counter()
+            name = os.path.basename(file_path)
+            if name[0] == '.' and is_temp(name):
+                timers['match'] += perf_counter() - start
+                if reap_temps and st.st_ctime < stale_cutoff:
+                    self._remove_stale_temp(file_path, instrumentation)
+                continue
+            if (include and not include(name)) or (preserve and preserve(name)):
+                timers['match'] += perf_counter() - start
+                continue
+            if segment is not None:
+                segment.add(name, st)
+            age = getattr(st, age_attr)
+            reason = 'old' if age < cutoff else 'large' if st.st_size > min_size else None
+            timers['match'] += perf_counter() - start
+            if ranked:
+                entries.append((age, file_path, st.st_size, reason))
+            elif reason:
+                selected.append((file_path, st.st_size, reason))
+        
+        if ranked:
+            with instrumentation.phase('rank'):
+                selected = self._apply_limits(policy, entries)
+        counters['matcher_hits'] += len(selected)
+        return selected
+    
+    def _remove_stale_temp(self, file_path: str, instrumentation: Instrumentation):
+        """Usuwa plik tymczasowy przerwanej kompresji lub deduplikacji (wątek puli skanu - logger, nie callback)"""
+        try:
+            os.unlink(file_path)
+        except OSError as e:
+            instrumentation.record_error(e)
+            self.logger.error(f"❌ Błąd usuwania pliku tymczasowego: {file_path}: {e}")
+            return
+        instrumentation.counters['stale_temp_removed'] += 1
+        self.logger.info(f"🧹 Usunięto pozostawiony plik tymczasowy: {file_path}")
+    
+    @staticmethod
+    def _apply_limits(policy: Policy, entries: List[Tuple[float, str, int, Optional[str]]]) -> List[Tuple[str, int, str]]:
+        """keep_newest, max_count i max_total_bytes: od najnowszych, nadmiar najstarszych do usunięcia"""
+        entries.sort(reverse=True)
+        selected = []
+        kept_count = kept_bytes = 0
+        limit_reason = None
+        
+        for _, file_path, size, reason in entries:
+            if kept_count >= policy.keep_newest:
+                if reason:
+                    selected.append((file_path, size, reason))
+                    continue
+                if limit_reason is None:
+                    if policy.max_count is not None and kept_count >= policy.max_count:
+                        limit_reason = 'count'
+                    elif policy.max_total_bytes is not None and kept_bytes + size > policy.max_total_bytes:
+                        limit_reason = 'total_size'
+                if limit_reason:
+                    selected.append((file_path, size, limit_reason))
+                    continue
+            kept_count += 1
+            kept_bytes += size
+        
+        return selected
+    
+    @staticmethod
+    def _goal_files(files: List[Tuple[str, int, str]], remaining: int) -> List[Tuple[str, int, str]]:
+        """Najmniej plików (od największych), które pokrywają brakujące bajty celu"""
+        files = sorted(files, key=lambda item: item[1], reverse=True)
+        total = 0
+        for count, (_, size, _) in enumerate(files, 1):
+            total += size
+            if total >= remaining:
+                return files[:count]
+        return files
+    
+    def _remove_files(self, files: List[Tuple[str, int, str]], directory: str,
+                      cancel_event: Optional[threading.Event] = None,
+                      progress_callback: Optional[Callable[[str, int], None]] = None,
+                      throttle: Optional[IOThrottle] = None, quarantine=None,
+                      open_index=None, open_action: str = 'delete') -> Dict[str, int]:
+        """Usuwa (lub w trybie testowym symuluje usunięcie) listę plików; zwraca bajty według powodu
+        
+        Z quarantine pliki są przenoszone do kwarantanny zamiast usuwania.
+        Pliki otwarte według open_index są pomijane, przycinane do zera
+        albo usuwane zgodnie z open_action.
+        """
+        cleaned = defaultdict(int)
+        timers = self.instrumentation.timers
+        counters = self.instrumentation.counters
+        perf_counter = time.perf_counter
+        
+        for index, (file_path, file_size, reason) in enumerate(files, 1):
+            check_cancelled(cancel_event)
+            if progress_callback:
+                progress_callback(directory, index)
+            label = REASON_LABELS.get(reason, "")
+            
+            key, holders = open_index.lookup(file_path) if open_index and open_action != 'delete' else (None, None)
+            truncate = False
+            if holders:
+                pids = ', '.join(str(pid) for pid in sorted(holders))
+                if open_action == 'skip':
+                    counters['open_skipped'] += 1
+                    self._log_or_callback(f"⏸️  Pominięto otwarty plik{label}: {file_path} (PID {pids})")
+                    continue
+                truncate = open_action == 'truncate'
+            
+            if throttle and not self.test_mode:
+                throttle.consume(file_size, cancel_event,
+                                 (lambda: progress_callback(directory, index)) if progress_callback else None)
+            if self.test_mode:
+                if truncate:
+                    self._log_or_callback(f"✂️  SYMULACJA przycięcia: {file_path} ({format_size(file_size)}, PID {pids})")
+                else:
+                    self._log_or_callback(f"🗑️  SYMULACJA: {file_path} ({format_size(file_size)})")
+                cleaned[reason] += file_size  # Count for simulation
+                continue
+            
+            start = perf_counter()
+            try:
+                if truncate:
+                    from openfiles import truncate_held
+                    truncate_held(file_path, key)
+                elif quarantine:
+                    quarantine.move(file_path, file_size, reason)
+                else:
+                    os.remove(file_path)
+            except (OSError, IOError) as e:
+                self.errors += 1
+                self.instrumentation.record_error(e)
+                self._log_or_callback(f"❌ Błąd: {file_path}: {e}", "error")
+                continue
+            finally:
+                timers['quarantine' if quarantine and not truncate else 'unlink'] += perf_counter() - start
+            
+            cleaned[reason] += file_size
+            self.cleaned_files.append(file_path)
+            if truncate:
+                # Proces pisze dalej do tego samego i-węzła - miejsce zwalnia się od razu
+                counters['truncations'] += 1
+                counters['bytes_freed'] += file_size
+                self._log_or_callback(f"✂️  Przycięto otwarty plik{label}: {file_path} "
+                                      f"({format_size(file_size)}, PID {pids})")
+                continue
+            if quarantine:
+                counters['quarantined'] += 1
+                counters['bytes_quarantined'] += file_size
+                self._log_or_callback(f"📦 Do kwarantanny{label}: {file_path} ({format_size(file_size)})")
+                continue
+            counters['unlinks'] += 1
+            counters['bytes_freed'] += file_size
+            self._log_or_callback(f"✅ Usunięto{label}: {file_path} ({format_size(file_size)})")
+        
+        return cleaned
+    
+    def _skip_open(self, files: List[Tuple[str, int, str]], open_index) -> List[Tuple[str, int, str]]:
+        """Odrzuca pliki otwarte przez procesy - kompresja usuwa oryginał, więc dopisane dane by przepadły"""
+        kept = []
+        for item in files:
+            holders = open_index.holders(item[0])
+            if holders:
+                self.instrumentation.counters['open_skipped'] += 1
+                pids = ', '.join(str(pid) for pid in sorted(holders))
+                self._log_or_callback(f"⏸️  Pominięto otwarty plik: {item[0]} (PID {pids})")
+                continue
+            kept.append(item)
+        return kept
+    
+    def _compress_files(self, files: List[Tuple[str, int, str]], directory: str, method: str, workers: int,
+                        cancel_event: Optional[threading.Event] = None,
+                        progress_callback: Optional[Callable[[str, int], None]] = None,
+                        throttle: Optional[IOThrottle] = None) -> Dict[str, int]:
+        """Kompresuje pliki w miejscu w puli procesów; zwraca zaoszczędzone bajty według powodu
+        
+        W puli jest najwyżej workers plików naraz, a każdy przechodzi przez ten
+        sam limit I/O co usuwanie, zanim zostanie zlecony.
+        """
+        from compress import COMPRESSION_METHODS, compress_file
+        
+        saved = defaultdict(int)
+        if self.test_mode:
+            for file_path, file_size, reason in files:
+                self._log_or_callback(f"🗜️  SYMULACJA kompresji: {file_path} ({format_size(file_size)})")
+            return saved
+        
+        def finish(item, outcome: Callable[[], Dict]):
+            file_path, _, reason = item
+            try:
+                result = outcome()
+            except OSError as e:
+                self.errors += 1
+                self.instrumentation.record_error(e)
+                self._log_or_callback(f"❌ Błąd kompresji: {file_path}: {e}", "error")
+                return
+            if result['status'] != 'compressed':
+                self.instrumentation.counters['compress_skipped'] += 1
+                return
+            gain = result['original'] - result['compressed']
+            self.instrumentation.counters['compressions'] += 1
+            self.instrumentation.counters['bytes_saved'] += gain
+            saved[reason] += gain
+            self.compressed_files.append(file_path)
+            self._log_or_callback(f"🗜️  Skompresowano: {result['target']} "
+                                  f"({format_size(result['original'])} -> {format_size(result['compressed'])})")
+        
+        executor = None
+        if workers > 1 and len(files) > 1:
+            # forkserver - fork wielowątkowego procesu (demon, GUI) mógłby skopiować zajęte blokady
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+            executor = ProcessPoolExecutor(min(workers, len(files)), mp_context=multiprocessing.get_context('forkserver'))
+        pending = {}
+        
+        def heartbeat(index: int):
+            if progress_callback:
+                progress_callback(directory, index)
+        
+        def finish_any(index: int):
+            """Czeka na pierwszy plik z puli - odcinkami, z postępem między nimi (xz dużego pliku trwa minuty)"""
+            while True:
+                done, _ = wait(pending, timeout=HEARTBEAT_SLICE, return_when=FIRST_COMPLETED)
+                if done:
+                    break
+                heartbeat(index)
+            for future in done:
+                finish(pending.pop(future), future.result)
+        
+        try:
+            with self.instrumentation.phase('compress'):
+                for index, item in enumerate(files, 1):
+                    check_cancelled(cancel_event)
+                    heartbeat(index)
+                    if throttle:
+                        throttle.consume(item[1], cancel_event, lambda: heartbeat(index))
+                    if executor is None:
+                        finish(item, lambda: compress_file(item[0], method))
+                        continue
+                    if len(pending) >= workers:
+                        finish_any(index)
+                    pending[executor.submit(compress_file, item[0], method)] = item
+                
+                while pending:
+                    finish_any(len(files))
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        return saved
+    
+    def clean_policies(self, cancel_event: Optional[threading.Event] = None,
+                       progress_callback: Optional[Callable[[str, int], None]] = None,
+                       goal: Optional[CleanupGoal] = None) -> Dict[str, int]:
+        """Czyści katalogi według polityk; zwraca bajty według powodu (old, large, count, total_size)
+        
+        Dla polityk z action "compress" są to bajty zaoszczędzone kompresją.
+        Z advanced_settings.backup_before_delete usuwane pliki trafiają do
+        kwarantanny, a miejsce zwalnia się dopiero po jej wygaśnięciu.
+        Indeks plików otwartych (/proc/*/fd) powstaje raz, przy pierwszym
+        katalogu z kandydatami, którego polityka nie usuwa otwartych plików.
+        Z collect_snapshot w trybie testowym przejście zostawia też migawkę
+        w self.snapshot (po prawdziwym czyszczeniu zawierałaby usunięte pliki).
+        Z goal (CleanupGoal) czyszczone są tylko katalogi na jego systemach
+        plików, w każdym największe wybrane pliki, aż zwolnione bajty pokryją cel.
+        """
+        cleaned = defaultdict(int)
+        rules = self.rules
+        snapshot = None
+        if self.collect_snapshot and self.test_mode:
+            from snapshot import SnapshotBuilder
+            snapshot = SnapshotBuilder()
+        throttle = IOThrottle(rules.io_limit_bytes)
+        quarantine = None
+        if rules.quarantine_ttl_seconds is not None and not self.test_mode:
+            from quarantine import Quarantine
+            quarantine = Quarantine()
+        open_index = None
+        
+        try:
+            for root, policy, selected in self._scan_roots(rules, cancel_event, progress_callback, snapshot,
+                                                           mount_points=goal.mount_points if goal else None,
+                                                           reap_temps=not self.test_mode):
+                self._log_or_callback(f"🔍 Przeskanowano katalog: {root}")
+                if goal:
+                    remaining = goal.bytes - sum(cleaned.values())
+                    if remaining <= 0:
+                        break
+                    selected = self._goal_files(selected, remaining)
+                if selected and open_index is None and (policy.action == 'compress' or policy.open_files != 'delete'):
+                    from openfiles import OpenFileIndex
+                    with self.instrumentation.phase('open_files'):
+                        open_index = OpenFileIndex.build(
+                            heartbeat=(lambda: progress_callback(root, 0)) if progress_callback else None)
+                    self.instrumentation.counters['open_descriptors'] += open_index.descriptors
+                if policy.action == 'compress':
+                    if open_index:
+                        selected = self._skip_open(selected, open_index)
+                    if selected:
+                        self._log_or_callback(f"📅 Znaleziono {len(selected)} plików do kompresji w {root}")
+                    results = self._compress_files(selected, root, policy.compression, rules.scan_threads,
+                                                   cancel_event, progress_callback, throttle)
+                else:
+                    if selected:
+                        self._log_or_callback(f"📅 Znaleziono {len(selected)} plików do usunięcia w {root}")
+                    # Przycięcie niszczy zawartość - z kwarantanną otwarte pliki są tylko pomijane
+                    open_action = 'skip' if quarantine and policy.open_files == 'truncate' else policy.open_files
+                    results = self._remove_files(selected, root, cancel_event, progress_callback, throttle,
+                                                 quarantine, open_index, open_action)
+                for reason, size in results.items():
+                    cleaned[reason] += size
+        finally:
+            if quarantine:
+                quarantine.close()
+        
+        if throttle.waited:
+            self.instrumentation.timers['io_throttle'] += throttle.waited
+        if snapshot:
+            with self.instrumentation.phase('snapshot'):
+                self.snapshot = snapshot.build()
+        return dict(cleaned)
+    
+    def load_snapshot(self, scan):
+        """Migawka z zapisanego skanu (StoredScan): katalogi reguł domyślnych, które skan obejmował
+        
+        Skan liczy każdy plik, więc chronione są odfiltrowywane po nazwie.
+        """
+        roots = {root: policy.min_size_bytes is not None
+                 for root, policy in self.policy_table().items() if policy.default_rules}
+        preserve = self.rules.preserve_regex.match if self.rules.preserve_regex else None
+        self.snapshot = scan.to_scan_snapshot(roots, preserve)
+        return self.snapshot
+    
+    def take_snapshot(self, cancel_event: Optional[threading.Event] = None,
+                      progress_callback: Optional[Callable[[str, int], None]] = None):
+        """Samo przejście katalogów z regułami domyślnymi do migawki (ScanSnapshot), bez czyszczenia"""
+        from snapshot import SnapshotBuilder
+        snapshot = SnapshotBuilder()
+        self.instrumentation = Instrumentation()
+        for _ in self._scan_roots(self.rules, cancel_event, progress_callback, snapshot, default_only=True):
+            pass
+        with self.instrumentation.phase('snapshot'):
+            self.snapshot = snapshot.build()
+        return self.snapshot
+    
+    def plan_cleanup(self, cancel_event: Optional[threading.Event] = None) -> List[Dict]:
+        """Zwraca pliki, które zostałyby usunięte, bez ich usuwania"""
+        candidates = []
+        self.instrumentation = Instrumentation()
+        
+        for root, policy, selected in self._scan_roots(self.rules, cancel_event):
+            for file_path, file_size, reason in selected:
+                candidates.append({'path': file_path, 'size': file_size, 'reason': reason, 'root': root,
+                                   'action': policy.action})
+        
+        return candidates
+    
+    def perform_cleanup(self, cancel_event: Optional[threading.Event] = None,
+                        progress_callback: Optional[Callable[[str, int], None]] = None,
+                        goal: Optional[CleanupGoal] = None) -> Dict:
+        """Wykonuje pełne czyszczenie (z goal - celowane, patrz clean_policies)"""
+        self.cleaned_files = []
+        self.compressed_files = []
+        self.errors = 0
+        self.instrumentation = Instrumentation()
+        start_time = datetime.now()
+        
+        cleaned = self.clean_policies(cancel_event, progress_callback, goal)
+        
+        total_cleaned = sum(cleaned.values())
+        self.total_cleaned = total_cleaned
+        
+        result = {
+            'total_cleaned': total_cleaned,
+            'total_cleaned_mb': total_cleaned / (1024 * 1024),
+            'files_cleaned': len(self.cleaned_files),
+            'log_cleaned': cleaned.get('old', 0),
+            'large_cleaned': cleaned.get('large', 0),
+            'limit_cleaned': cleaned.get('count', 0) + cleaned.get('total_size', 0),
+            'cleaned_by_reason': cleaned,
+            'files_compressed': len(self.compressed_files),
+            'bytes_saved': self.instrumentation.counters.get('bytes_saved', 0),
+            'files_quarantined': self.instrumentation.counters.get('quarantined', 0),
+            'files_truncated': self.instrumentation.counters.get('truncations', 0),
+            'files_skipped_open': self.instrumentation.counters.get('open_skipped', 0),
+            'bytes_quarantined': self.instrumentation.counters.get('bytes_quarantined', 0),
+            'errors': self.errors,
+            'start_time': start_time,
+            'end_time': datetime.now(),
+            'instrumentation': self.instrumentation.as_dict()
+        }
+        if goal:
+            result['goal'] = {'mount_points': list(goal.mount_points), 'bytes': goal.bytes,
+                              'reached': total_cleaned >= goal.bytes}
+        
+        self.logger.info(f"Czyszczenie zakończone: {result['files_cleaned']} plików, "
+                         f"{result['total_cleaned_mb']:.2f} MB, fazy: {self.instrumentation.summary()}")
+        return result
+
+class NotificationManager:
+    """Klasa do zarządzania powiadomieniami (notify-send w wątku w tle, nie w wątku GUI)"""
+    
+    def __init__(self, cleanup_message: Optional[Callable[[float, int], Tuple[str, str]]] = None,
+                 min_cleaned_mb: float = 0, min_interval: float = 60.0):
+        self.dispatcher = NotificationDispatcher(
+            desktop_notify,
+            cleanup_message or (lambda mb, files: ("Czysciciel Dysku", f"Wyczyszczono {mb:.0f} MB z {files} plików")),
+            int(min_cleaned_mb * 1024 * 1024),
+            min_interval
+        )
+    
+    def send_notification(self, title: str, message: str):
+        """Kolejkuje powiadomienie systemowe"""
+        self.dispatcher.notify(title, message)
+    
+    def notify_cleanup(self, cleaned_bytes: int, files: int):
+        """Kolejkuje wynik czyszczenia (serie są łączone w jedno powiadomienie)"""
+        self.dispatcher.notify_cleanup(cleaned_bytes, files)
+    
+    def close(self):
+        """Wysyła zaległe powiadomienia"""
+        self.dispatcher.close()
@@ -9,31 +9,131 @@ import os
 import sys
 import time
 import json
+import signal
 import logging
-import schedule
-import subprocess
+import argparse
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Callable, List, Optional
 
 # Dodaj ścieżkę do głównego modułu
 sys.path.append('/opt/czysciciel')
 
+from core import (
+    DEFAULT_CONFIG_FILE, STATS_FILE, CLEANUP_LOCK_FILE, LOCK_POLICIES, PROFILE_MODES, SCAN_SNAPSHOT_DIR,
+    DEFAULT_SCAN_SNAPSHOTS_KEEP,
+    TaskCancelled, LockBusy, ConfigError, RuleSet, CleanupGoal, CleanupLock, DiskAnalyzer, DiskCleaner, Instrumentation,
+    UsageTop, compile_rules, find_mount_point, format_size, get_filesystem_usage, pattern_base, profile_run
+)
+from control import DEFAULT_CONTROL_SOCKET, ControlError, ControlServer, ProgressBroadcaster
+from scheduler import OVERLAP_POLICIES, CostEstimator, CronExpression, Job, Scheduler
+from metrics import DEFAULT_TEXTFILE_PATH, DaemonMetrics, MetricsServer, write_textfile
+from watcher import ConfigWatcher
+from notify import NotificationDispatcher, SystemdNotifier, desktop_notify
+from quarantine import BUCKET_SECONDS, purge
+from openfiles import deleted_open_files
+
+# Najkrótszy odstęp między awaryjnymi czyszczeniami wywołanymi przez poziom quick
+EMERGENCY_COOLDOWN = 600
+
+# Ile końcowych bajtów pliku statystyk czytać przy starcie (szacunki kosztów)
+HISTORY_TAIL_BYTES = 256 * 1024
+
+# Najkrótszy odstęp między komunikatami STATUS= w trakcie poziomu (s)
+STATUS_INTERVAL = 5.0
+
+# Ile największych usuniętych, otwartych plików i procesów zapisywać w statystykach
+HIDDEN_USAGE_TOP = 20
+
+# Ile największych plików, katalogów i rozszerzeń zbiera poziom full (odpowiedź "analysis")
+FULL_TOP_K = 100
+
+# Ile najszybciej rosnących poddrzew i nowych dużych plików zapisywać po porównaniu z poprzednim skanem
+GROWTH_TOP = 20
+
+# Prognoza zapełnienia (forecast_settings): działanie poniżej horyzontu, próbka statvfs najwyżej
+# co FORECAST_SAMPLE_SECONDS, ponowne działanie dla tego samego systemu plików najwcześniej po FORECAST_COOLDOWN
+FORECAST_ACTIONS = ('cleanup', 'alert')
+FORECAST_SAMPLE_SECONDS = 300
+FORECAST_COOLDOWN = 3600
+
+# Ile najszybciej rosnących katalogów pokazywać w prognozie
+FORECAST_TOP = 10
+
+# Historia dla prognozy przy starcie - rekordy czyszczenia z listą plików bywają duże
+FORECAST_HISTORY_BYTES = 8 * 1024 * 1024
+
+# Najkrótszy odstęp między skanami zleconymi przez gniazdo sterujące przez kogoś innego niż root
+# (control_scan_min_interval_minutes) - pełne przejście dysków to kosztowna operacja
+DEFAULT_CONTROL_SCAN_INTERVAL_MINUTES = 15
+
 class CzyscicielDaemon:
     """Demon do automatycznego czyszczenia dysku"""
     
-    def __init__(self):
-        self.log_file = "/var/log/czysciciel-daemon.log"
-        self.config_file = "/etc/czysciciel/config.json"
-        self.pid_file = "/var/run/czysciciel.pid"
+    def __init__(self, config_file: str = DEFAULT_CONFIG_FILE,
+                 log_file: str = "/var/log/czysciciel-daemon.log",
+                 pid_file: str = "/var/run/czysciciel.pid",
+                 stats_file: str = STATS_FILE,
+                 log_to_console: bool = True,
+                 profile: Optional[str] = None):
+        self.log_file = log_file
+        self.config_file = config_file
+        self.pid_file = pid_file
+        self.stats_file = stats_file
+        self.log_to_console = log_to_console
+        self.profile = profile
         
         self.setup_logging()
         self.load_config()
         self.create_pid_file()
         
+        self.analyzer = DiskAnalyzer()
+        try:
+            self.cleaner = DiskCleaner(self.log_file, self.config)
+        except ConfigError as e:
+            self.logger.error(f"Błędna konfiguracja {self.config_file}: {e} - używam domyślnej")
+            self.config = self.default_config()
+            self.cleaner = DiskCleaner(self.log_file, self.config)
+        self.systemd = SystemdNotifier()
+        self.notifier = NotificationDispatcher(self.deliver_notification, self.cleanup_message)
+        self.configure_notifications()
+        self.config_signature = self.read_config_signature()
+        self.reload_forced = False
+        self.config_watcher = None
+        self.metrics = DaemonMetrics()
+        self.metrics_server = None
+        self.cancel_event = threading.Event()
+        self.stopping = False
+        self.scheduler = None
+        self.costs = CostEstimator()
+        self.filesystems = {}
+        self.full_usage = {}
+        self.hidden_usage = {}
+        self.full_top = {}
+        self.growth = {}
+        self.forecast = {}
+        self.forecast_lock = threading.Lock()
+        self.filesystem_trends = None
+        self.directory_trends = None
+        self.directory_mounts = {}
+        self.forecast_actions = {}
+        self.cleanup_goal = None
+        self.full_cursor = 0
+        self.last_emergency = float('-inf')
+        self.full_timestamp = None
+        self.tier_started = 0.0
+        self.analysis_files = 0
+        self.last_status = float('-inf')
+        self.progress = ProgressBroadcaster()
+        self.cleanup_lock = CleanupLock(self.config.get('cleanup_lock', CLEANUP_LOCK_FILE), 'czysciciel-daemon')
+        self.control_server = None
+        self.last_control_scan = float('-inf')
+    
     def setup_logging(self):
         """Konfiguruje system logowania"""
         # Utwórz katalog logów jeśli nie istnieje
-        os.makedirs("/var/log", exist_ok=True)
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
         
         logging.basicConfig(
             filename=self.log_file,
@@ -42,22 +142,26 @@ class CzyscicielDaemon:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        # Dodaj również logowanie do konsoli
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        console_handler.setFormatter(formatter)
-        
         logger = logging.getLogger()
-        logger.addHandler(console_handler)
         
-        self.logger = logger
+        # Dodaj również logowanie do konsoli
+        if self.log_to_console:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            console_handler.setFormatter(formatter)
+            logger.addHandler(console_handler)
         
-    def load_config(self):
-        """Ładuje konfigurację"""
-        default_config = {
+        self.logger = logger
+    
+    def default_config(self) -> dict:
+        """Konfiguracja domyślna (zapisywana przy pierwszym uruchomieniu)"""
+        return {
             "cleaning_enabled": True,
             "scan_interval_hours": 1,
+            "initial_delay_minutes": 5,
+            "schedule_jitter_seconds": 0,
+            "overlap_policy": "skip",
             "days_old": 7,
             "large_file_mb": 200,
             "directories_to_clean": [
@@ -74,16 +178,39 @@ class CzyscicielDaemon:
                 "/var/cache"
             ],
             "notifications_enabled": True,
+            "control_socket": DEFAULT_CONTROL_SOCKET,
+            "control_group": "",
+            "control_scan_min_interval_minutes": DEFAULT_CONTROL_SCAN_INTERVAL_MINUTES,
+            "lock_policy": "wait",
+            "metrics_settings": {
+                "textfile_path": DEFAULT_TEXTFILE_PATH,
+                "listen": ""
+            },
+            "snapshot_settings": {
+                "directory": SCAN_SNAPSHOT_DIR,
+                "keep": DEFAULT_SCAN_SNAPSHOTS_KEEP
+            },
+            "forecast_settings": {
+                "enabled": True,
+                "window_hours": 24,
+                "directory_window_hours": 336,
+                "horizon_hours": 6,
+                "action": "cleanup"
+            },
             "preserve_files": [
                 "*.conf",
                 "*.cfg", 
                 "*.config"
             ]
         }
+    
+    def load_config(self):
+        """Ładuje konfigurację"""
+        default_config = self.default_config()
         
         try:
             # Utwórz katalog konfiguracji
-            os.makedirs("/etc/czysciciel", exist_ok=True)
+            os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
             
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
@@ -91,11 +218,11 @@ class CzyscicielDaemon:
             else:
                 self.config = default_config
                 self.save_config()
-                
+        
         except Exception as e:
             self.logger.error(f"Błąd ładowania konfiguracji: {e}")
             self.config = default_config
-            
+    
     def save_config(self):
         """Zapisuje konfigurację"""
         try:
@@ -104,6 +231,120 @@ class CzyscicielDaemon:
         except Exception as e:
             self.logger.error(f"Błąd zapisywania konfiguracji: {e}")
     
+    def read_config_signature(self) -> Optional[tuple]:
+        """(inode, mtime, rozmiar) pliku konfiguracji - zmienia się przy zapisie i podmianie"""
+        try:
+            st = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def validate_config(self, config: dict) -> RuleSet:
+        """Sprawdza całą konfigurację demona i kompiluje reguły (ConfigError przy błędzie)"""
+        rules = compile_rules(config)
+        
+        if config.get('overlap_policy', 'skip') not in OVERLAP_POLICIES:
+            raise ConfigError(f"overlap_policy: nieznana polityka {config['overlap_policy']!r}")
+        if config.get('lock_policy', 'wait') not in LOCK_POLICIES:
+            raise ConfigError(f"lock_policy: nieznana polityka {config['lock_policy']!r}")
+        
+        tiers = config.get('tiers', {})
+        if not isinstance(tiers, dict) or not all(isinstance(t, dict) for t in tiers.values()):
+            raise ConfigError("tiers: oczekiwano obiektu z ustawieniami poziomów")
+        settings = self.tier_settings(config)
+        if not isinstance(config.get('control_group', ''), str):
+            raise ConfigError(f"control_group: oczekiwano nazwy grupy, jest {config['control_group']!r}")
+        for key in ('scan_interval_hours', 'initial_delay_minutes', 'schedule_jitter_seconds',
+                    'control_scan_min_interval_minutes'):
+            value = config.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ConfigError(f"{key}: oczekiwano liczby nieujemnej, jest {value!r}")
+        notification_settings = config.get('notification_settings', {})
+        if not isinstance(notification_settings, dict):
+            raise ConfigError("notification_settings: oczekiwano obiektu")
+        for key in ('min_cleaned_mb_for_notification', 'min_interval_seconds'):
+            value = notification_settings.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ConfigError(f"notification_settings.{key}: oczekiwano liczby nieujemnej, jest {value!r}")
+        for tier, key in (('quick', 'interval_seconds'), ('incremental', 'interval_hours')):
+            value = settings[tier][key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ConfigError(f"tiers.{tier}.{key}: oczekiwano liczby dodatniej, jest {value!r}")
+        try:
+            CronExpression(settings['full']['schedule'])
+        except (ValueError, AttributeError) as e:
+            raise ConfigError(f"tiers.full.schedule: {e}")
+        if not isinstance(config.get('forecast_settings', {}), dict):
+            raise ConfigError("forecast_settings: oczekiwano obiektu")
+        forecast = self.forecast_settings(config)
+        for key in ('window_hours', 'directory_window_hours', 'horizon_hours'):
+            value = forecast[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ConfigError(f"forecast_settings.{key}: oczekiwano liczby dodatniej, jest {value!r}")
+        if forecast['action'] not in FORECAST_ACTIONS:
+            raise ConfigError(f"forecast_settings.action: nieznane działanie {forecast['action']!r}")
+        
+        return rules
+    
+    def reload_config(self, force: bool = False) -> bool:
+        """Wczytuje ponownie plik konfiguracji i podmienia reguły w całości
+        
+        Wywoływane jako zadanie harmonogramu, więc nigdy w trakcie poziomu
+        incremental ani full. Przy błędzie zostaje poprzednia konfiguracja.
+        """
+        signature = self.read_config_signature()
+        if not force and signature == self.config_signature:
+            return False
+        self.config_signature = signature
+        
+        self.systemd.notify('RELOADING=1', f'MONOTONIC_USEC={time.monotonic_ns() // 1000}',
+                            'STATUS=Przeładowanie konfiguracji')
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            rules = self.validate_config(config)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Odrzucono konfigurację {self.config_file}: {e} - działa poprzednia")
+            self.metrics.record_reload(False)
+            self.systemd.notify('READY=1', f'STATUS=Odrzucono konfigurację: {e}')
+            return False
+        
+        previous = self.config
+        self.config = config
+        self.cleaner.set_rules(rules, config)
+        self.configure_notifications()
+        self.configure_forecast()
+        self.schedule_jobs()
+        
+        for key in ('control_socket', 'metrics_settings', 'cleanup_lock'):
+            if previous.get(key) != config.get(key):
+                self.logger.warning(f"Zmiana {key} wymaga restartu demona")
+        self.metrics.record_reload(True)
+        self.logger.info(f"Przeładowano konfigurację: {len(rules.policies)} polityk czyszczenia, "
+                         f"{len(rules.scan_roots)} do analizy")
+        self.systemd.notify('READY=1', 'STATUS=' + self.idle_status())
+        return True
+    
+    def request_reload(self, signum=None, frame=None):
+        """Zleca przeładowanie konfiguracji po bieżącym poziomie (handler SIGHUP)"""
+        self.reload_forced = True
+        if self.scheduler:
+            self.scheduler.trigger('reload')
+    
+    def reload_task(self):
+        """Zadanie harmonogramu: przeładowanie po SIGHUP lub zmianie pliku"""
+        force, self.reload_forced = self.reload_forced, False
+        self.reload_config(force)
+    
+    def start_config_watcher(self):
+        """Obserwuje plik konfiguracji przez inotify (bez inotify - sprawdzanie w poziomie quick)"""
+        try:
+            self.config_watcher = ConfigWatcher(self.config_file, lambda: self.scheduler.trigger('reload'))
+            self.config_watcher.start()
+        except OSError as e:
+            self.logger.info(f"Brak inotify dla {self.config_file} ({e}) - zmiany sprawdzane co minutę")
+            self.config_watcher = None
+    
     def create_pid_file(self):
         """Tworzy plik PID"""
         try:
@@ -120,237 +361,835 @@ class CzyscicielDaemon:
         except Exception as e:
             self.logger.error(f"Błąd usuwania pliku PID: {e}")
     
-    def get_directory_size(self, path: str) -> int:
-        """Pobiera rozmiar katalogu w bajtach"""
-        total_size = 0
-        try:
-            for dirpath, dirnames, filenames in os.walk(path):
-                for file in filenames:
-                    try:
-                        file_path = os.path.join(dirpath, file)
-                        if os.path.exists(file_path):
-                            total_size += os.path.getsize(file_path)
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-        return total_size
-    
-    def find_old_files(self, directory: str, days_old: int) -> list:
-        """Znajduje pliki starsze niż określona liczba dni"""
-        old_files = []
-        cutoff_date = datetime.now() - timedelta(days=days_old)
-        
-        try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        if os.path.exists(file_path):
-                            # Sprawdź czy plik nie jest na liście do zachowania
-                            if not self.should_preserve_file(file_path):
-                                file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                                if file_time < cutoff_date:
-                                    old_files.append(file_path)
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-            
-        return old_files
+    def configure_notifications(self):
+        """Przenosi notification_settings do dyspozytora powiadomień"""
+        settings = self.config.get('notification_settings', {})
+        self.notifier.min_cleaned_bytes = int(settings.get('min_cleaned_mb_for_notification', 0) * 1024 * 1024)
+        self.notifier.min_interval = settings.get('min_interval_seconds', 60)
+    
+    @staticmethod
+    def cleanup_message(cleaned_mb: float, files: int):
+        return "Czysciciel Dysku", f"Wyczyszczono {cleaned_mb:.0f} MB z {files} plików"
+    
+    def deliver_notification(self, title: str, message: str):
+        """Wysyła powiadomienie (wątek dyspozytora): pulpit i STATUS dla systemd"""
+        settings = self.config.get('notification_settings', {})
+        self.logger.info(f"Powiadomienie: {title} - {message}")
+        self.systemd.notify(f"STATUS={title}: {message}")
+        desktop_notify(title, message, settings.get('notification_urgency'), settings.get('notification_timeout'))
     
-    def find_large_files(self, directory: str, size_mb: int) -> list:
-        """Znajduje pliki większe niż określony rozmiar"""
-        large_files = []
-        size_bytes = size_mb * 1024 * 1024
+    def heartbeat(self, tier: str, phase: Optional[str] = None):
+        """Keepalive watchdoga i STATUS= z wątku wykonującego poziom
         
-        try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        if os.path.exists(file_path):
-                            if not self.should_preserve_file(file_path):
-                                file_size = os.path.getsize(file_path)
-                                if file_size > size_bytes:
-                                    large_files.append((file_path, file_size))
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-            
-        return large_files
+        Wołane z przejścia drzewa (co katalog) i pętli usuwania (co plik), a nie
+        z osobnego timera - zawieszony skan (np. martwy NFS) zatrzymuje
+        WATCHDOG=1 i systemd restartuje demona po WatchdogSec. Długie kroki bez
+        przejścia (limit I/O, pula kompresji, /proc, migawki) wołają je między
+        odcinkami pracy.
+        """
+        self.systemd.watchdog()
+        if not self.systemd.enabled:
+            return
+        now = time.monotonic()
+        if now - self.last_status < STATUS_INTERVAL:
+            return
+        self.last_status = now
+        self.systemd.notify('STATUS=' + self.tier_status(tier, phase))
+    
+    def report_progress(self, tier: str, path: str, count: int):
+        """Callback postępu silnika: klienci gniazda sterującego i systemd"""
+        self.progress.progress(tier, path, count)
+        self.heartbeat(tier)
     
-    def should_preserve_file(self, file_path: str) -> bool:
-        """Sprawdza czy plik powinien być zachowany"""
-        import fnmatch
+    def tier_status(self, tier: str, phase: Optional[str] = None) -> str:
+        """Tekst STATUS= w trakcie poziomu: faza, pliki na sekundę i zwolnione bajty
         
-        filename = os.path.basename(file_path)
-        for pattern in self.config.get('preserve_files', []):
-            if fnmatch.fnmatch(filename, pattern):
-                return True
-        return False
+        Podana faza (np. oczekiwanie na blokadę) to etap bez przejścia drzewa -
+        liczniki mogą być jeszcze z poprzedniego przebiegu, więc bez liczb.
+        """
+        if phase:
+            return f"{tier}: {phase}"
+        elapsed = max(time.monotonic() - self.tier_started, 0.001)
+        if tier == 'full':
+            # Liczniki analizatora są zerowane dla każdego katalogu - dolicz poprzednie
+            files = self.analysis_files + self.analyzer.instrumentation.counters.get('entries_stat', 0)
+            return f"{tier}: analiza, {files} plików ({files / elapsed:.0f}/s)"
+        counters = self.cleaner.instrumentation.counters
+        files = counters.get('entries_stat', 0)
+        return (f"{tier}: czyszczenie, {files} plików ({files / elapsed:.0f}/s), "
+                f"zwolniono {format_size(counters.get('bytes_freed', 0))}")
+    
+    def idle_status(self) -> str:
+        """Tekst STATUS= między poziomami"""
+        rules = self.cleaner.rules
+        return (f"Oczekiwanie: {len(rules.policies)} polityk czyszczenia, {len(rules.scan_roots)} do analizy, "
+                f"zwolniono {format_size(self.metrics.freed_bytes_total)} od startu")
     
     def send_notification(self, title: str, message: str):
-        """Wysyła powiadomienie systemowe"""
-        if not self.config.get('notifications_enabled', True):
-            return
-            
-        try:
-            # Linux - używa notify-send dla wszystkich użytkowników
-            subprocess.run([
-                'su', '-c', 
-                f'DISPLAY=:0 notify-send "{title}" "{message}"',
-                'root'
-            ], check=False)
-            
-            # Alternatywnie wyślij przez systemd-notify
-            subprocess.run([
-                'systemd-notify', 
-                f'STATUS={title}: {message}'
-            ], check=False)
-            
-        except (subprocess.SubprocessError, FileNotFoundError):
-            self.logger.info(f"Powiadomienie: {title} - {message}")
+        """Kolejkuje powiadomienie systemowe (wysyłka w tle, serie łączone)"""
+        if self.config.get('notifications_enabled', True):
+            self.notifier.notify(title, message)
     
-    def perform_cleanup(self) -> dict:
-        """Wykonuje czyszczenie dysku"""
+    def perform_cleanup(self, goal: Optional[CleanupGoal] = None) -> dict:
+        """Wykonuje czyszczenie dysku (z goal - celowane, zlecone przez prognozę zapełnienia)"""
         if not self.config.get('cleaning_enabled', True):
             self.logger.info("Czyszczenie wyłączone w konfiguracji")
             return {'total_cleaned': 0}
         
-        self.logger.info("Rozpoczynam czyszczenie dysku")
-        start_time = datetime.now()
+        if goal:
+            self.logger.info(f"Rozpoczynam czyszczenie celowane: {', '.join(goal.mount_points)}, "
+                             f"cel {format_size(goal.bytes)}")
+        else:
+            self.logger.info("Rozpoczynam czyszczenie dysku")
         
-        total_cleaned = 0
-        files_cleaned = 0
-        cleaned_files = []
+        policy = self.config.get('lock_policy', 'wait')
+        if policy not in LOCK_POLICIES:
+            self.logger.warning(f"Nieznana polityka lock_policy: {policy}, używam 'wait'")
+            policy = 'wait'
         
-        directories = self.config.get('directories_to_clean', ['/var/log', '/tmp'])
-        days_old = self.config.get('days_old', 7)
-        large_file_mb = self.config.get('large_file_mb', 200)
+        start_time = datetime.now()
+        try:
+            result = self.cleanup_lock.run(
+                lambda: self.cleaner.perform_cleanup(
+                    self.cancel_event, lambda path, count: self.report_progress('incremental', path, count), goal
+                ),
+                policy,
+                cancel_event=self.cancel_event,
+                heartbeat=lambda: self.heartbeat('incremental', 'oczekiwanie na blokadę')
+            )
+        except LockBusy as e:
+            self.logger.info(f"Pominięto czyszczenie: {e}")
+            return {'total_cleaned': 0, 'skipped': 'locked', 'lock_owner': e.owner}
+        except TaskCancelled:
+            # Przerwane czyszczenie (budżet lub zatrzymanie) - zapisz to, co już usunięto
+            counters = self.cleaner.instrumentation.counters
+            freed = counters['bytes_freed'] + counters['bytes_quarantined']
+            result = {
+                'total_cleaned': freed,
+                'total_cleaned_mb': freed / (1024 * 1024),
+                'files_cleaned': len(self.cleaner.cleaned_files),
+                'files_compressed': len(self.cleaner.compressed_files),
+                'bytes_saved': counters['bytes_saved'],
+                'files_quarantined': counters['quarantined'],
+                'files_truncated': counters['truncations'],
+                'files_skipped_open': counters['open_skipped'],
+                'bytes_quarantined': counters['bytes_quarantined'],
+                'errors': self.cleaner.errors,
+                'cancelled': True,
+                'start_time': start_time,
+                'end_time': datetime.now(),
+                'instrumentation': self.cleaner.instrumentation.as_dict()
+            }
+        if result.get('piggyback'):
+            owner = result.get('owner') or {}
+            self.logger.info(f"Czyszczenie wykonał właśnie {owner.get('program', 'inny proces')} "
+                             f"(PID {owner.get('pid', '?')}) - używam jego wyniku")
+            result['cleaned_files'] = []
+            return result
         
-        for directory in directories:
-            if not os.path.exists(directory):
-                continue
-                
-            self.logger.info(f"Czyszczenie katalogu: {directory}")
-            
-            # Usuń stare pliki
-            old_files = self.find_old_files(directory, days_old)
-            for file_path in old_files:
-                try:
-                    if os.path.exists(file_path):
-                        file_size = os.path.getsize(file_path)
-                        os.remove(file_path)
-                        total_cleaned += file_size
-                        files_cleaned += 1
-                        cleaned_files.append(file_path)
-                        self.logger.info(f"Usunięto stary plik: {file_path} ({file_size} B)")
-                except Exception as e:
-                    self.logger.error(f"Błąd usuwania {file_path}: {e}")
-            
-            # Usuń duże pliki z /tmp
-            if directory in ['/tmp', '/var/tmp']:
-                large_files = self.find_large_files(directory, large_file_mb)
-                for file_path, file_size in large_files:
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            total_cleaned += file_size
-                            files_cleaned += 1
-                            cleaned_files.append(file_path)
-                            self.logger.info(f"Usunięto duży plik: {file_path} ({file_size} B)")
-                    except Exception as e:
-                        self.logger.error(f"Błąd usuwania {file_path}: {e}")
-        
-        end_time = datetime.now()
-        duration = end_time - start_time
-        
-        result = {
-            'total_cleaned': total_cleaned,
-            'total_cleaned_mb': total_cleaned / (1024 * 1024),
-            'files_cleaned': files_cleaned,
-            'cleaned_files': cleaned_files,
-            'start_time': start_time,
-            'end_time': end_time,
-            'duration': duration
-        }
+        files_cleaned = result['files_cleaned']
+        total_cleaned = result['total_cleaned']
+        duration = result['end_time'] - result['start_time']
+        result['cleaned_files'] = list(self.cleaner.cleaned_files)
+        result['duration'] = duration
         
         # Loguj wyniki
         self.logger.info(f"Czyszczenie zakończone w {duration}")
         self.logger.info(f"Wyczyszczono: {result['total_cleaned_mb']:.2f} MB w {files_cleaned} plikach")
+        if result.get('files_compressed'):
+            self.logger.info(f"Skompresowano {result['files_compressed']} plików, "
+                             f"zaoszczędzono {result['bytes_saved'] / (1024 * 1024):.2f} MB")
+        if result.get('files_skipped_open') or result.get('files_truncated'):
+            self.logger.info(f"Pliki otwarte przez procesy: pominięto {result.get('files_skipped_open', 0)}, "
+                             f"przycięto {result.get('files_truncated', 0)}")
+        if result.get('files_quarantined'):
+            self.logger.info(f"Do kwarantanny: {result['files_quarantined']} plików "
+                             f"({format_size(result['bytes_quarantined'])}) - miejsce zwolni się po jej wygaśnięciu")
         
-        # Wyślij powiadomienie jeśli coś wyczyszczono
-        if total_cleaned > 0:
-            cleaned_mb = result['total_cleaned_mb']
-            self.send_notification(
-                "Czysciciel Dysku",
-                f"Wyczyszczono {cleaned_mb:.0f} MB z {files_cleaned} plików"
-            )
+        # Powiadomienie w tle - próg min_cleaned_mb_for_notification i łączenie serii w dyspozytorze
+        if total_cleaned > 0 and self.config.get('notifications_enabled', True):
+            self.notifier.notify_cleanup(total_cleaned, files_cleaned)
         
         return result
     
-    def analyze_disk_usage(self) -> dict:
+    def analyze_disk_usage(self, directories: Optional[List[str]] = None, top: Optional[UsageTop] = None,
+                           snapshot=None) -> dict:
         """Analizuje wykorzystanie dysku"""
         results = {}
-        directories = self.config.get('directories_to_scan', [])
+        if directories is None:
+            directories = self.cleaner.expander.expand_all(self.cleaner.rules.scan_roots)
         
-        for directory in directories:
-            if os.path.exists(directory):
-                try:
-                    size = self.get_directory_size(directory)
-                    results[directory] = {
-                        'size': size,
-                        'size_mb': size / (1024 * 1024),
-                        'size_gb': size / (1024 * 1024 * 1024)
-                    }
-                    self.logger.debug(f"{directory}: {size / (1024*1024):.2f} MB")
-                except Exception as e:
-                    self.logger.error(f"Błąd skanowania {directory}: {e}")
+        try:
+            results = self.analyzer.analyze_disk_usage(
+                cancel_event=self.cancel_event,
+                progress_callback=lambda path, count: self.report_progress('full', path, count),
+                directories=directories,
+                top=top,
+                snapshot=snapshot
+            )
+            for directory, data in results.items():
+                self.logger.debug(f"{directory}: {data['size_mb']:.2f} MB")
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            self.logger.error(f"Błąd skanowania: {e}")
         
         return results
     
-    def scheduled_task(self):
-        """Zaplanowane zadanie czyszczenia"""
-        self.logger.info("Uruchamianie zaplanowanego czyszczenia")
+    def profile_mode(self) -> Optional[str]:
+        """Tryb profilowania z wiersza poleceń lub advanced_settings.profile"""
+        mode = self.profile or self.config.get('advanced_settings', {}).get('profile')
+        if mode and mode not in PROFILE_MODES:
+            self.logger.warning(f"Nieznany tryb profilowania: {mode}")
+            return None
+        return mode
+    
+    def tier_settings(self, config: Optional[dict] = None) -> dict:
+        """Ustawienia poziomów quick/incremental/full z wartościami domyślnymi"""
+        config = self.config if config is None else config
+        tiers = config.get('tiers', {})
+        return {
+            'quick': dict({'interval_seconds': 60}, **tiers.get('quick', {})),
+            'incremental': dict({'interval_hours': config.get('scan_interval_hours', 1),
+                                 'budget_seconds': 900}, **tiers.get('incremental', {})),
+            'full': dict({'schedule': '0 3 * * *', 'budget_seconds': 3600}, **tiers.get('full', {}))
+        }
+    
+    def forecast_settings(self, config: Optional[dict] = None) -> dict:
+        """Ustawienia prognozy zapełnienia z wartościami domyślnymi"""
+        config = self.config if config is None else config
+        return dict({'enabled': True, 'window_hours': 24, 'directory_window_hours': 336,
+                     'horizon_hours': 6, 'action': 'cleanup'}, **config.get('forecast_settings', {}))
+    
+    def configure_forecast(self):
+        """(Re)konfiguruje okna prognozy; wyłączona prognoza nie ładuje NumPy ani historii"""
+        settings = self.forecast_settings()
+        with self.forecast_lock:
+            if not settings['enabled']:
+                self.filesystem_trends = self.directory_trends = None
+                self.forecast = {}
+                return
+            from forecast import MIN_DIRECTORY_SAMPLES, TrendWindow
+            if self.filesystem_trends is None:
+                self.filesystem_trends = TrendWindow(0, FORECAST_SAMPLE_SECONDS)
+                self.directory_trends = TrendWindow(0, min_samples=MIN_DIRECTORY_SAMPLES)
+            self.filesystem_trends.window_seconds = settings['window_hours'] * 3600
+            self.directory_trends.window_seconds = settings['directory_window_hours'] * 3600
+    
+    def record_trend_samples(self, timestamp: float, filesystems: Optional[dict] = None,
+                             disk_usage: Optional[dict] = None) -> bool:
+        """Dopisuje próbki zajętości do okien prognozy; zwraca, czy przybyła próbka systemu plików"""
+        if self.filesystem_trends is None:
+            return False
+        added = False
+        with self.forecast_lock:
+            for mount, usage in (filesystems or {}).items():
+                # Zajętość z perspektywy użytkownika: system plików jest pełny, gdy free (f_bavail) spada do zera
+                added |= self.filesystem_trends.add(mount, timestamp, usage['total'] - usage['free'])
+            for path, data in (disk_usage or {}).items():
+                self.directory_trends.add(path, timestamp, data['size'])
+        return added
+    
+    def update_forecast(self):
+        """Trendy okien i czas do zapełnienia każdego systemu plików; poniżej horyzontu - działanie"""
+        settings = self.forecast_settings()
+        from forecast import growing, time_to_full
+        with self.forecast_lock:
+            if self.filesystem_trends is None:
+                return
+            filesystems = dict(self.filesystems)
+            self.filesystem_trends.discard(set(self.filesystem_trends.series) - set(filesystems))
+            trends = self.filesystem_trends.trends()
+            directories = growing(self.directory_trends.trends(), FORECAST_TOP)
+        
+        for entry in directories:
+            if entry['path'] not in self.directory_mounts:
+                self.directory_mounts[entry['path']] = find_mount_point(entry['path'])
+            entry['mount_point'] = self.directory_mounts[entry['path']]
+        forecast = {}
+        for mount, trend in trends.items():
+            forecast[mount] = time_to_full(trend, filesystems[mount]['free'])
+            forecast[mount]['directories'] = [entry['path'] for entry in directories if entry['mount_point'] == mount]
+        
+        self.forecast = {
+            'timestamp': datetime.now().isoformat(),
+            'horizon_hours': settings['horizon_hours'],
+            'filesystems': forecast,
+            'directories': directories
+        }
+        self.metrics.record_forecast(forecast, directories)
+        self.act_on_forecast(forecast, settings)
+    
+    def act_on_forecast(self, forecast: dict, settings: dict):
+        """Czyszczenie celowane albo alert, gdy istotny wzrost zapełni system plików przed horyzontem
         
+        Cel to miejsce, które przy górnej granicy tempa wzrostu wystarczy na cały
+        horyzont; czyszczenie obejmuje tylko katalogi na zagrożonych systemach plików.
+        """
+        horizon = settings['horizon_hours']
+        now = time.monotonic()
+        endangered = {mount: entry for mount, entry in forecast.items()
+                      if entry['significant'] and entry['hours_to_full'] < horizon
+                      and now - self.forecast_actions.get(mount, float('-inf')) >= FORECAST_COOLDOWN}
+        if not endangered:
+            return
+        for mount in endangered:
+            self.forecast_actions[mount] = now
+        
+        summary = ', '.join(f"{mount} za {entry['hours_to_full']:.1f} h "
+                            f"(najwcześniej {entry['hours_to_full_earliest']:.1f} h, "
+                            f"+{format_size(int(entry['bytes_per_hour']))}/h)"
+                            for mount, entry in endangered.items())
+        self.logger.warning(f"Prognoza: zapełnienie przed horyzontem {horizon} h - {summary}")
+        
+        cleanup = (settings['action'] == 'cleanup' and self.config.get('cleaning_enabled', True)
+                   and self.scheduler is not None)
+        if not cleanup:
+            self.metrics.record_forecast_action('alert')
+            self.send_notification("Czysciciel Dysku", f"Dysk zapełni się w ciągu {horizon} h: {summary}")
+            return
+        needed = sum(max(entry['bytes_per_hour_high'] * horizon - entry['free'], 0) for entry in endangered.values())
+        self.cleanup_goal = CleanupGoal(tuple(endangered), int(needed) + 1)
+        self.metrics.record_forecast_action('cleanup')
+        self.scheduler.trigger('preemptive')
+    
+    def refresh_filesystems(self) -> dict:
+        """Zajętość systemów plików z katalogów konfiguracji (tylko statvfs)"""
+        filesystems = {}
+        rules = self.cleaner.rules
+        # Dla wzorców tylko stała część (/home/*/.cache -> /home), nie tysiące statvfs co minutę
+        for path in dict.fromkeys(pattern_base(p) for p in rules.clean_roots + rules.scan_roots):
+            try:
+                usage = get_filesystem_usage(path)
+            except OSError:
+                continue
+            filesystems[usage['mount_point']] = usage
+        
+        self.filesystems = filesystems
+        self.metrics.record_filesystems(filesystems)
+        return filesystems
+    
+    def quick_check(self):
+        """Poziom quick: statvfs co minutę i awaryjne czyszczenie przy braku miejsca"""
+        filesystems = self.refresh_filesystems()
+        if self.record_trend_samples(time.time(), filesystems):
+            self.update_forecast()
+        
+        if self.scheduler and self.config_watcher is None and self.read_config_signature() != self.config_signature:
+            self.scheduler.trigger('reload')
+        
+        advanced = self.config.get('advanced_settings', {})
+        if advanced.get('emergency_cleanup_enabled', False):
+            threshold = advanced.get('critical_space_threshold_gb', 1) * 1024 ** 3
+            low = [mount for mount, usage in filesystems.items() if usage['free'] < threshold]
+            now = time.monotonic()
+            if low and self.scheduler and now - self.last_emergency >= EMERGENCY_COOLDOWN:
+                self.last_emergency = now
+                self.logger.warning(f"Mało miejsca na {', '.join(low)} - awaryjne czyszczenie")
+                self.scheduler.trigger('incremental')
+        
+        self.write_metrics()
+    
+    def select_full_roots(self, roots: List[str], budget: Optional[float]) -> List[str]:
+        """Wybiera katalogi mieszczące się w budżecie według kosztu poprzednich skanów
+        
+        Kolejne okna zaczynają od katalogu, na którym skończyło poprzednie,
+        więc przy za małym budżecie wszystkie katalogi są skanowane po kolei.
+        """
+        if not roots:
+            return []
+        
+        start = self.full_cursor % len(roots)
+        selected = []
+        planned = 0.0
+        for root in roots[start:] + roots[:start]:
+            cost = self.costs.estimate('root:' + root, 0.0)
+            if selected and budget and planned + cost > budget:
+                break
+            selected.append(root)
+            planned += cost
+        
+        self.full_cursor = start + len(selected)
+        if len(selected) < len(roots):
+            self.logger.info(f"Budżet {budget} s mieści {len(selected)} z {len(roots)} katalogów "
+                             f"(szacowany koszt {planned:.1f} s)")
+        return selected
+    
+    def run_full(self, cycle: Instrumentation) -> dict:
+        """Poziom full: analiza directories_to_scan w oknie serwisowym"""
+        roots = self.cleaner.expander.expand_all(self.cleaner.rules.scan_roots)
+        selected = self.select_full_roots(roots, self.tier_settings()['full'].get('budget_seconds'))
+        disk_usage = {}
+        analysis = Instrumentation()
+        partial = len(selected) < len(roots)
+        self.analysis_files = 0
+        top = UsageTop(FULL_TOP_K)
+        snapshot = self.open_scan_snapshot()
+        
+        with cycle.phase('analysis'):
+            try:
+                for root in selected:
+                    try:
+                        results = self.analyze_disk_usage([root], top, snapshot)
+                    except TaskCancelled:
+                        if self.stopping:
+                            raise
+                        partial = True
+                        break
+                    analysis.merge(self.analyzer.instrumentation)
+                    self.analysis_files = analysis.counters.get('entries_stat', 0)
+                    for path, data in results.items():
+                        self.costs.update('root:' + path, data['scan_time'])
+                    disk_usage.update(results)
+            except BaseException:
+                if snapshot:
+                    snapshot.abort()
+                raise
+        growth = None
+        if snapshot:
+            with cycle.phase('snapshot'):
+                path = self.store_scan_snapshot(snapshot)
+            if path:
+                with cycle.phase('growth'):
+                    growth = self.scan_growth(path)
+        
+        # Usunięte, ale otwarte pliki - różnica między statvfs a sumą katalogów
+        with cycle.phase('hidden_usage'):
+            hidden = deleted_open_files(heartbeat=lambda: self.heartbeat('full', 'ukryte zajęcie'))
+        self.hidden_usage = {
+            'total_bytes': hidden['total_bytes'],
+            'filesystems': hidden['filesystems'],
+            'processes': hidden['processes'][:HIDDEN_USAGE_TOP],
+            'files': [{key: entry[key] for key in ('path', 'mount_point', 'size', 'pids')}
+                      for entry in hidden['files'][:HIDDEN_USAGE_TOP]]
+        }
+        self.metrics.record_hidden_usage(hidden['filesystems'])
+        if hidden['total_bytes']:
+            holders = ', '.join(f"{p['name']} ({p['pid']}): {format_size(p['bytes'])}" for p in hidden['processes'][:3])
+            self.logger.info(f"Usunięte, ale otwarte pliki zajmują {format_size(hidden['total_bytes'])}: {holders}")
+        
+        self.full_usage.update(disk_usage)
+        self.record_trend_samples(time.time(), disk_usage=disk_usage)
+        self.full_top = top.as_dict()
+        if growth is not None:
+            self.growth = growth
+        self.full_timestamp = datetime.now().isoformat()
+        return {
+            'disk_usage': disk_usage,
+            'hidden_usage': self.hidden_usage,
+            'growth': growth,
+            'partial': partial,
+            'instrumentation': {'analysis': analysis.as_dict()}
+        }
+    
+    def run_incremental(self, cycle: Instrumentation, goal: Optional[CleanupGoal] = None) -> dict:
+        """Poziom incremental: czyszczenie gorących katalogów (directories_to_clean)"""
+        with cycle.phase('cleanup'):
+            cleanup_result = self.perform_cleanup(goal)
+        
+        reached = cleanup_result.get('goal', {}).get('reached', True)
+        if goal and not reached:
+            message = (f"Czyszczenie celowane zwolniło {format_size(cleanup_result['total_cleaned'])} "
+                       f"z {format_size(goal.bytes)} - {', '.join(goal.mount_points)} nadal zapełni się przed horyzontem")
+            self.logger.warning(message)
+            self.send_notification("Czysciciel Dysku", message)
+        
+        return {
+            'filesystems': self.refresh_filesystems(),
+            'cleanup_result': cleanup_result,
+            'forecast': self.forecast
+        }
+    
+    def run_tier(self, tier: str, work: Callable[[Instrumentation], dict]):
+        """Uruchamia poziom z budżetem czasu, profilowaniem, statystykami i metrykami"""
+        budget = self.tier_settings()[tier].get('budget_seconds')
+        estimate = self.costs.estimate(tier)
+        estimate_text = f"{estimate:.1f} s" if estimate is not None else "brak danych"
+        self.logger.info(f"Uruchamianie poziomu {tier} (szacowany koszt {estimate_text}, budżet {budget} s)")
+        if estimate is not None and budget and estimate > budget:
+            self.logger.warning(f"Szacowany koszt poziomu {tier} przekracza budżet - zostanie przerwany po {budget} s")
+        
+        # Każde uruchomienie ma własne zdarzenie przerwania: budżet albo zatrzymanie demona
+        self.cancel_event = threading.Event()
+        if self.stopping:
+            self.cancel_event.set()
+        timer = None
+        if budget:
+            timer = threading.Timer(budget, self.cancel_event.set)
+            timer.daemon = True
+            timer.start()
+        
+        stats_dir = os.path.dirname(os.path.abspath(self.stats_file))
+        cycle = Instrumentation()
+        start = self.tier_started = time.monotonic()
+        outcome = 'failure'
+        self.last_status = float('-inf')
+        self.heartbeat(tier, 'start')
+        self.progress.publish({'type': 'start', 'tier': tier})
         try:
-            # Analiza dysku
-            disk_usage = self.analyze_disk_usage()
-            
-            # Czyszczenie
-            cleanup_result = self.perform_cleanup()
+            with profile_run(self.profile_mode(), stats_dir, f'daemon-{tier}') as profile_path:
+                stats = work(cycle)
+            duration = time.monotonic() - start
+            if self.cancel_event.is_set() and not self.stopping:
+                self.logger.warning(f"Poziom {tier} przekroczył budżet {budget} s")
+            self.costs.update(tier, duration)
             
-            # Zapisz statystyki
-            stats = {
-                'timestamp': datetime.now().isoformat(),
-                'disk_usage': disk_usage,
-                'cleanup_result': cleanup_result
-            }
+            stats = dict({'timestamp': datetime.now().isoformat(), 'tier': tier,
+                          'duration': duration, 'estimated_cost': estimate}, **stats)
+            stats.setdefault('instrumentation', {})['cycle'] = cycle.as_dict()
+            with cycle.phase('stats_write'):
+                self.write_stats(stats)
             
-            stats_file = "/var/log/czysciciel-stats.json"
-            try:
-                with open(stats_file, 'a') as f:
-                    json.dump(stats, f)
-                    f.write('\n')
-            except Exception as e:
-                self.logger.error(f"Błąd zapisywania statystyk: {e}")
-                
+            self.metrics.record_cycle(tier, stats.get('disk_usage', {}), stats.get('cleanup_result', {}),
+                                      duration, self.costs.estimate(tier))
+            outcome = 'success'
+            self.logger.info(f"Poziom {tier} zakończony w {duration:.1f} s: {cycle.summary()}")
+            if profile_path:
+                self.logger.info(f"Profil cyklu zapisany: {profile_path}")
+        except TaskCancelled:
+            outcome = 'cancelled'
+            self.logger.info(f"Poziom {tier} przerwany")
+            self.metrics.record_failure(tier, time.monotonic() - start)
         except Exception as e:
-            self.logger.error(f"Błąd podczas zaplanowanego zadania: {e}")
+            self.logger.error(f"Błąd podczas poziomu {tier}: {e}")
+            self.metrics.record_failure(tier, time.monotonic() - start)
+        finally:
+            if timer:
+                timer.cancel()
+            self.progress.publish({'type': 'done', 'tier': tier, 'result': outcome})
+            if not self.stopping:
+                self.systemd.notify('STATUS=' + self.idle_status())
+        
+        self.write_metrics()
+    
+    def full_task(self):
+        """Zaplanowana pełna analiza"""
+        self.run_tier('full', self.run_full)
+    
+    def incremental_task(self):
+        """Zaplanowane czyszczenie"""
+        self.run_tier('incremental', self.run_incremental)
+    
+    def preemptive_task(self):
+        """Czyszczenie celowane zlecone przez prognozę zapełnienia (poza harmonogramem)"""
+        goal, self.cleanup_goal = self.cleanup_goal, None
+        if goal:
+            self.run_tier('incremental', lambda cycle: self.run_incremental(cycle, goal))
+    
+    def scheduled_task(self):
+        """Pełny cykl poza harmonogramem: analiza i czyszczenie"""
+        self.full_task()
+        self.incremental_task()
+    
+    def write_stats(self, stats: dict):
+        """Dopisuje rekord do pliku statystyk JSONL"""
+        try:
+            # Serializuj całość przed zapisem, żeby nie zostawić uciętej linii
+            line = json.dumps(stats, default=str)
+            with open(self.stats_file, 'a') as f:
+                f.write(line + '\n')
+        except Exception as e:
+            self.logger.error(f"Błąd zapisywania statystyk: {e}")
+    
+    def load_history(self):
+        """Odtwarza szacunki kosztów, ostatnią pełną analizę i okna prognozy z końca pliku statystyk"""
+        forecasting = self.filesystem_trends is not None
+        for stats in self.read_stats_tail(FORECAST_HISTORY_BYTES if forecasting else HISTORY_TAIL_BYTES):
+            tier = stats.get('tier')
+            if tier and isinstance(stats.get('duration'), (int, float)):
+                self.costs.update(tier, stats['duration'])
+            if tier == 'full':
+                for path, data in stats.get('disk_usage', {}).items():
+                    self.costs.update('root:' + path, data.get('scan_time', 0.0))
+                    self.full_usage[path] = data
+                self.full_timestamp = stats.get('timestamp')
+            if forecasting:
+                try:
+                    timestamp = datetime.fromisoformat(stats['timestamp']).timestamp()
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.record_trend_samples(timestamp, stats.get('filesystems'),
+                                          stats.get('disk_usage') if tier == 'full' else None)
+    
+    def read_stats_tail(self, max_bytes: int = HISTORY_TAIL_BYTES) -> List[dict]:
+        """Ostatnie rekordy pliku statystyk (czyta tylko końcowe max_bytes)"""
+        try:
+            with open(self.stats_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                offset = max(0, f.tell() - max_bytes)
+                f.seek(offset)
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+        
+        if offset:
+            lines = lines[1:]  # Pierwsza linia może być ucięta
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+    
+    def control_privileged(self, uid: Optional[int]) -> bool:
+        """Czy klient gniazda (UID z SO_PEERCRED) może czytać analizę i zlecać skan: root lub grupa control_group"""
+        if uid == 0:
+            return True
+        group = self.config.get('control_group')
+        if uid is None or not group:
+            return False
+        import grp
+        import pwd
+        try:
+            members = grp.getgrnam(group)
+            user = pwd.getpwuid(uid)
+        except KeyError:
+            return False
+        return user.pw_gid == members.gr_gid or user.pw_name in members.gr_mem
+    
+    def control_commands(self) -> dict:
+        """Polecenia gniazda sterującego
+        
+        analysis i subtree zwracają ścieżki z drzew dostępnych tylko dla roota
+        oraz PID-y i nazwy procesów (hidden_usage), a scan zleca przejście całych
+        dysków - tylko dla roota i grupy control_group; scan spoza roota
+        najwyżej raz na control_scan_min_interval_minutes.
+        """
+        def require_privileged(uid, command):
+            if not self.control_privileged(uid):
+                raise ControlError(f"{command} wymaga uprawnień root lub grupy control_group")
+        
+        def status(request, uid):
+            current = self.scheduler.current if self.scheduler else None
+            return {
+                'pid': os.getpid(),
+                'running': current.name if current else None,
+                'cost_estimates': dict(self.costs.estimates),
+                'full_timestamp': self.full_timestamp
+            }
+        
+        def analysis(request, uid):
+            require_privileged(uid, 'analysis')
+            return {
+                'timestamp': self.full_timestamp,
+                'directories': dict(self.full_usage),
+                'filesystems': dict(self.filesystems),
+                'hidden_usage': self.hidden_usage,
+                'top': self.full_top,
+                'growth': self.growth,
+                'forecast': self.forecast
+            }
+        
+        def subtree(request, uid):
+            require_privileged(uid, 'subtree')
+            path = os.path.normpath(request.get('path') or '/')
+            prefix = path.rstrip('/') + '/'
+            directories = {p: data for p, data in list(self.full_usage.items())
+                           if p == path or p.startswith(prefix)}
+            return {'timestamp': self.full_timestamp, 'path': path, 'directories': directories}
+        
+        def trigger(tier):
+            def command(request, uid):
+                if tier == 'incremental' and uid != 0:
+                    raise ControlError("czyszczenie przez demona wymaga uprawnień root")
+                if not self.scheduler or not self.scheduler.trigger(tier):
+                    raise ControlError(f"poziom {tier} nie jest zaplanowany")
+                return {'tier': tier, 'queued': True}
+            return command
+        
+        scan_lock = threading.Lock()
+        
+        def scan(request, uid):
+            require_privileged(uid, 'scan')
+            if uid == 0:
+                return trigger('full')(request, uid)
+            interval = self.config.get('control_scan_min_interval_minutes', DEFAULT_CONTROL_SCAN_INTERVAL_MINUTES) * 60
+            with scan_lock:
+                elapsed = time.monotonic() - self.last_control_scan
+                if elapsed < interval:
+                    raise ControlError(f"skan zlecono niedawno - kolejny najwcześniej za {int(interval - elapsed)} s")
+                response = trigger('full')(request, uid)
+                self.last_control_scan = time.monotonic()
+            return response
+        
+        def reload(request, uid):
+            if uid != 0:
+                raise ControlError("przeładowanie konfiguracji wymaga uprawnień root")
+            self.request_reload()
+            return {'queued': True}
+        
+        def stats(request, uid):
+            last = min(int(request.get('last') or 100), 1000)
+            return {'history': self.read_stats_tail()[-last:]}
+        
+        return {
+            'status': status,
+            'analysis': analysis,
+            'subtree': subtree,
+            'scan': scan,
+            'cleanup': trigger('incremental'),
+            'reload': reload,
+            'stats': stats
+        }
+    
+    def start_control_server(self):
+        """Uruchamia gniazdo sterujące dla GUI i skryptów"""
+        path = self.config.get('control_socket', DEFAULT_CONTROL_SOCKET)
+        if not path:
+            return
+        try:
+            self.control_server = ControlServer(path, self.control_commands(), self.progress)
+            self.control_server.start()
+            self.logger.info(f"Gniazdo sterujące: {path}")
+        except OSError as e:
+            self.logger.error(f"Nie można utworzyć gniazda sterującego {path}: {e}")
+            self.control_server = None
+    
+    def write_metrics(self):
+        """Zapisuje plik .prom dla textfile collectora node_exportera"""
+        path = self.config.get('metrics_settings', {}).get('textfile_path', DEFAULT_TEXTFILE_PATH)
+        if not path:
+            return
+        if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            self.logger.debug(f"Brak katalogu textfile collectora dla {path}")
+            return
+        try:
+            write_textfile(path, self.metrics.render())
+        except OSError as e:
+            self.logger.error(f"Błąd zapisywania metryk {path}: {e}")
+    
+    def start_metrics_server(self):
+        """Uruchamia endpoint /metrics jeśli skonfigurowano metrics_settings.listen"""
+        listen = self.config.get('metrics_settings', {}).get('listen')
+        if not listen:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, listen)
+            self.metrics_server.start()
+            self.logger.info(f"Endpoint /metrics nasłuchuje na {listen}")
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Nie można uruchomić endpointu /metrics na {listen}: {e}")
+            self.metrics_server = None
+    
+    def open_scan_snapshot(self):
+        """ScanWriter dla poziomu full (snapshot_settings.directory; pusty - migawki wyłączone)"""
+        directory = self.config.get('snapshot_settings', {}).get('directory', SCAN_SNAPSHOT_DIR)
+        if not directory:
+            return None
+        from snapshot import ScanWriter
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            return ScanWriter(directory)
+        except OSError as e:
+            self.logger.error(f"Nie można utworzyć migawki skanu w {directory}: {e}")
+            return None
+    
+    def store_scan_snapshot(self, snapshot) -> Optional[str]:
+        """Publikuje migawkę skanu i usuwa najstarsze ponad snapshot_settings.keep; zwraca jej ścieżkę"""
+        from snapshot import prune_scans
+        if not snapshot.roots:
+            snapshot.abort()  # Przerwany przed zakończeniem pierwszego katalogu
+            return None
+        self.heartbeat('full', 'zapis migawki')
+        try:
+            path = snapshot.close()
+        except OSError as e:
+            self.logger.error(f"Błąd zapisywania migawki skanu: {e}")
+            snapshot.abort()
+            return None
+        self.logger.info(f"Migawka skanu: {path} ({snapshot.count} plików)")
+        keep = self.config.get('snapshot_settings', {}).get('keep', DEFAULT_SCAN_SNAPSHOTS_KEEP)
+        prune_scans(snapshot.directory, max(keep, 2))
+        return path
+    
+    def scan_growth(self, path: str) -> Optional[dict]:
+        """Porównanie migawki z poprzednią: co urosło od ostatniego skanu (None - brak poprzedniej)"""
+        from snapshot import StoredScan, diff_scans, list_scans
+        scans = list_scans(os.path.dirname(path))
+        if path not in scans or scans.index(path) == 0:
+            return None
+        previous = scans[scans.index(path) - 1]
+        try:
+            growth = diff_scans(StoredScan(previous), StoredScan(path), GROWTH_TOP,
+                                int(self.cleaner.config['large_file_mb'] * 1024 * 1024),
+                                lambda: self.heartbeat('full', 'porównanie migawek'))
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Błąd porównywania migawek {previous} i {path}: {e}")
+            return None
+        if growth['subtrees']:
+            fastest = ', '.join(f"{entry['path']} (+{format_size(entry['delta_bytes'])})"
+                                for entry in growth['subtrees'][:3])
+            self.logger.info(f"Od poprzedniego skanu urosło: {fastest}")
+        # Pełne ścieżki migawek nie są potrzebne w statystykach ani odpowiedzi "analysis"
+        growth['old'], growth['new'] = growth['old']['created'], growth['new']['created']
+        return growth
+    
+    def purge_quarantine(self):
+        """Usuwa wygasłe kubełki kwarantanny (advanced_settings.quarantine_ttl_hours)"""
+        ttl = self.cleaner.rules.quarantine_ttl_seconds
+        if ttl is None:
+            return
+        result = purge(ttl)
+        if result['buckets'] or result['errors']:
+            self.logger.info(f"Kwarantanna: usunięto {result['files']} wygasłych plików "
+                             f"({format_size(result['bytes'])}), błędy: {result['errors']}")
     
     def setup_schedule(self):
-        """Konfiguruje harmonogram zadań"""
-        interval = self.config.get('scan_interval_hours', 1)
+        """Tworzy harmonogram i odtwarza szacunki kosztów z historii"""
+        self.scheduler = Scheduler()
+        # Keepalive z pętli tylko bez zadania w tle - trwający poziom wysyła go sam
+        self.scheduler.idle_callback = self.systemd.watchdog
+        self.scheduler.idle_interval = self.systemd.watchdog_interval
+        self.configure_forecast()
+        self.load_history()
+        self.schedule_jobs()
+    
+    def schedule_jobs(self):
+        """(Re)konfiguruje zadania poziomów quick/incremental/full według bieżącej konfiguracji"""
+        tiers = self.tier_settings()
+        interval = tiers['incremental']['interval_hours']
+        initial_delay = self.config.get('initial_delay_minutes', 5)
+        jitter = self.config.get('schedule_jitter_seconds', 0)
+        policy = self.config.get('overlap_policy', 'skip')
+        if policy not in OVERLAP_POLICIES:
+            self.logger.warning(f"Nieznana polityka overlap_policy: {policy}, używam 'skip'")
+            policy = 'skip'
         
-        # Wyczyść poprzednie harmonogramy
-        schedule.clear()
+        self.scheduler.overlap_policy = policy
         
-        # Ustaw nowy harmonogram
-        schedule.every(interval).hours.do(self.scheduled_task)
+        jobs = [
+            # statvfs jest tani - wykonuje się w pętli harmonogramu, także w trakcie skanu
+            Job('quick', self.quick_check, tiers['quick']['interval_seconds'], inline=True),
+            # Pierwsze czyszczenie po initial_delay_minutes, potem co interval godzin
+            Job('incremental', self.incremental_task, interval * 3600,
+                first_delay=initial_delay * 60, jitter=jitter),
+            # Tylko na żądanie (SIGHUP, inotify) - nie w wątku pętli, więc zawsze między poziomami
+            Job('reload', self.reload_task),
+            # Czyszczenie celowane - tylko na żądanie prognozy zapełnienia z poziomu quick
+            Job('preemptive', self.preemptive_task)
+        ]
+        if self.cleaner.rules.quarantine_ttl_seconds is not None:
+            # Wygasanie to listing katalogów kwarantanny - co kubełek, niezależnie od poziomów
+            jobs.append(Job('quarantine', self.purge_quarantine, BUCKET_SECONDS, first_delay=60))
         
-        self.logger.info(f"Harmonogram ustawiony na {interval} godzin(y)")
+        window = tiers['full']['schedule']
+        try:
+            jobs.append(Job('full', self.full_task, cron=CronExpression(window), jitter=jitter))
+        except ValueError as e:
+            self.logger.error(f"Błędne okno pełnej analizy: {e}")
+        self.scheduler.replace_jobs(jobs)
+        
+        self.logger.info(f"Harmonogram: quick co {tiers['quick']['interval_seconds']} s, "
+                         f"incremental co {interval} godzin(y) (pierwsze za {initial_delay} min), "
+                         f"full według '{window}', jitter do {jitter} s")
+    
+    def stop(self, signum=None, frame=None):
+        """Przerywa pętlę harmonogramu i bieżące zadanie (handler SIGTERM/SIGINT)"""
+        self.stopping = True
+        self.cancel_event.set()
+        if self.scheduler:
+            self.scheduler.stop()
     
     def run(self):
         """Główna pętla demona"""
@@ -358,21 +1197,24 @@ class CzyscicielDaemon:
         
         # Ustaw harmonogram
         self.setup_schedule()
+        self.start_metrics_server()
+        self.start_control_server()
+        self.start_config_watcher()
         
-        # Pierwsze uruchomienie po 5 minutach
-        schedule.every(5).minutes.do(self.scheduled_task).tag('initial')
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+        signal.signal(signal.SIGHUP, self.request_reload)
+        
+        # Type=notify: systemd uznaje usługę za uruchomioną dopiero po wczytaniu konfiguracji
+        self.systemd.notify('READY=1', 'STATUS=' + self.idle_status())
+        if self.systemd.watchdog_interval:
+            self.logger.info(f"Watchdog systemd: WATCHDOG=1 co {self.systemd.watchdog_interval:.0f} s")
         
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # Sprawdzaj co minutę
-                
-                # Po pierwszym uruchomieniu usuń zadanie inicjalne
-                if schedule.get_jobs('initial'):
-                    schedule.clear('initial')
-                    
-        except KeyboardInterrupt:
-            self.logger.info("Otrzymano sygnał przerwania")
+            self.scheduler.run()
+            self.logger.info("Otrzymano sygnał zatrzymania")
+            self.systemd.notify('STOPPING=1', 'STATUS=Zatrzymywanie')
+            self.scheduler.join()
         except Exception as e:
             self.logger.error(f"Błąd w głównej pętli: {e}")
         finally:
@@ -381,15 +1223,28 @@ class CzyscicielDaemon:
     def cleanup(self):
         """Sprzątanie przed zakończeniem"""
         self.logger.info("Zatrzymuję demona...")
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.control_server:
+            self.control_server.stop()
+        if self.config_watcher:
+            self.config_watcher.stop()
+        self.notifier.close()
+        self.systemd.close()
         self.remove_pid_file()
 
 def main():
     """Główna funkcja demona"""
+    parser = argparse.ArgumentParser(description='Czysciciel Dysku - demon')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None,
+                        help='profiluj każdy cykl (wynik obok pliku statystyk)')
+    args = parser.parse_args()
+    
     if os.geteuid() != 0:
         print("Demon musi być uruchomiony jako root!")
         sys.exit(1)
     
-    daemon = CzyscicielDaemon()
+    daemon = CzyscicielDaemon(profile=args.profile)
     
     try:
         daemon.run()
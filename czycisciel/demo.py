@@ -68,7 +68,7 @@ def run_translation_test():
     
     sys.path.append('.')
     try:
-        from main import TranslationManager
+        from core import TranslationManager
         
         translator = TranslationManager()
         
@@ -105,7 +105,7 @@ def run_cleaner_test():
     
     try:
         sys.path.append('.')
-        from main import DiskCleaner
+        from core import DiskCleaner
         
         # Stwórz instancję cleanera
         cleaner = DiskCleaner("/tmp/test_cleaner.log")
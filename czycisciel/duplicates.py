@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Duplicates - Wyszukiwanie zduplikowanych plików
+Etapy rozmiar -> skrót początku i końca -> pełny skrót (mmap) w puli wątków, opcjonalna deduplikacja
+"""
+
+import os
+import mmap
+import stat
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from core import DEFAULT_SCAN_THREADS, TEMP_NAME, Instrumentation, check_cancelled, walk_files
+
+# Ile bajtów z początku i z końca pliku hashuje etap wstępny
+PARTIAL_BYTES = 64 * 1024
+
+# Porcja pełnego skrótu - hashlib zwalnia GIL dla dużych buforów
+HASH_CHUNK = 1024 * 1024
+
+# Pliki zmienione w tym czasie są pomijane (zapisywane logi, ucinanie przez logrotate)
+DEFAULT_MIN_AGE = 60
+
+# Zadania puli są zlecane porcjami - przy milionach plików bez miliona obiektów Future naraz
+BATCH_SIZE = 4096
+
+DEDUPE_MODES = ('hardlink', 'reflink')
+
+# ioctl FICLONE z <linux/fs.h>
+FICLONE = 0x40049409
+
+class DuplicateFile(NamedTuple):
+    path: str
+    device: int
+    inode: int
+    mtime_ns: int
+
+class DuplicateGroup(NamedTuple):
+    """Pliki o identycznej zawartości (różne i-węzły)"""
+    size: int
+    digest: str
+    files: Tuple[DuplicateFile, ...]
+    
+    @property
+    def reclaimable(self) -> int:
+        """Bajty do odzyskania przy zostawieniu jednej kopii"""
+        return self.size * (len(self.files) - 1)
+    
+    def as_dict(self) -> Dict:
+        return {
+            'size': self.size,
+            'digest': self.digest,
+            'reclaimable': self.reclaimable,
+            'paths': [f.path for f in self.files]
+        }
+
+def _hasher():
+    return hashlib.blake2b(digest_size=20)
+
+def _open(path: str) -> int:
+    return os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+
+def partial_hash(path: str, size: int) -> Tuple[str, int]:
+    """Skrót pierwszych i ostatnich PARTIAL_BYTES; zwraca (skrót, przeczytane bajty)
+    
+    Plik nie większy niż 2 * PARTIAL_BYTES jest czytany w całości, więc jego
+    skrót wstępny jest już skrótem pełnym.
+    """
+    fd = _open(path)
+    try:
+        if os.fstat(fd).st_size != size:
+            raise FileNotFoundError(f"Plik zmienił się w trakcie: {path}")
+        hasher = _hasher()
+        if size <= 2 * PARTIAL_BYTES:
+            data = os.pread(fd, size, 0)
+            hasher.update(data)
+            return hasher.hexdigest(), len(data)
+        head = os.pread(fd, PARTIAL_BYTES, 0)
+        tail = os.pread(fd, PARTIAL_BYTES, size - PARTIAL_BYTES)
+        hasher.update(head)
+        hasher.update(tail)
+        return hasher.hexdigest(), len(head) + len(tail)
+    finally:
+        os.close(fd)
+
+def full_hash(path: str, size: int) -> Tuple[str, int]:
+    """Skrót całego pliku czytanego przez mmap (bez kopiowania do bufora Pythona)"""
+    fd = _open(path)
+    try:
+        if os.fstat(fd).st_size != size:
+            raise FileNotFoundError(f"Plik zmienił się w trakcie: {path}")
+        hasher = _hasher()
+        with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, HASH_CHUNK):
+                    hasher.update(view[offset:offset + HASH_CHUNK])
+            finally:
+                view.release()
+        return hasher.hexdigest(), size
+    finally:
+        os.close(fd)
+
+def _outermost(directories: Iterable[str]) -> List[str]:
+    """Katalogi bez zagnieżdżonych w innych z listy (każde drzewo przechodzone raz)"""
+    result = []
+    for directory in sorted({os.path.abspath(d) for d in directories}):
+        if not any(directory.startswith(parent.rstrip('/') + '/') for parent in result):
+            result.append(directory)
+    return result
+
+class DuplicateFinder:
+    """Wyszukuje duplikaty bez czytania większości plików
+    
+    1. Jedno przejście drzewa grupuje pliki po rozmiarze (plik o unikalnym
+       rozmiarze nie ma duplikatu); dowiązania twarde do tego samego i-węzła
+       liczą się raz, dowiązania symboliczne są pomijane.
+    2. W grupach kolizji hashowane są pierwsze i ostatnie 64 KiB.
+    3. Tylko pliki o zgodnym skrócie wstępnym są hashowane w całości.
+    Etapy 2 i 3 wykonuje pula wątków (odczyt i blake2b zwalniają GIL).
+    """
+    
+    def __init__(self, min_size: int = 1, threads: int = DEFAULT_SCAN_THREADS, min_age: float = DEFAULT_MIN_AGE):
+        self.min_size = max(1, min_size)
+        self.threads = threads
+        self.min_age = min_age
+        self.instrumentation = Instrumentation()
+    
+    def _collect(self, directories: List[str], cancel_event: Optional[threading.Event],
+                 progress_callback: Optional[Callable[[str, int], None]]) -> Dict[int, List[DuplicateFile]]:
+        """Etap 1: pliki regularne według rozmiaru"""
+        counters = self.instrumentation.counters
+        by_size = defaultdict(list)
+        min_size = self.min_size
+        newest = time.time() - self.min_age
+        is_temp = TEMP_NAME.match
+        
+        for directory in directories:
+            for path, st in walk_files(directory, cancel_event, self.instrumentation, progress_callback,
+                                       follow_symlinks=False):
+                if st.st_size < min_size or not stat.S_ISREG(st.st_mode):
+                    continue
+                if is_temp(os.path.basename(path)):
+                    continue  # Podmiana lub kompresja w toku albo pozostałość po przerwanej
+                if st.st_mtime > newest:
+                    counters['recently_modified'] += 1
+                    continue
+                by_size[st.st_size].append(DuplicateFile(path, st.st_dev, st.st_ino, st.st_mtime_ns))
+        
+        # Tylko kolizje rozmiaru, po jednej ścieżce na i-węzeł
+        candidates = {}
+        for size, files in by_size.items():
+            if len(files) < 2:
+                continue
+            unique = {}
+            for f in files:
+                unique.setdefault((f.device, f.inode), f)
+            counters['same_inode'] += len(files) - len(unique)
+            if len(unique) > 1:
+                candidates[size] = list(unique.values())
+        return candidates
+    
+    def _refine(self, groups: List[Tuple[int, List[DuplicateFile]]], hasher: Callable[[str, int], Tuple[str, int]],
+                executor, cancel_event: Optional[threading.Event],
+                progress_callback: Optional[Callable[[str, int], None]], counter: str) -> Dict[Tuple[int, str], List[DuplicateFile]]:
+        """Dzieli grupy według skrótu; zwraca tylko podgrupy z co najmniej dwoma plikami"""
+        counters = self.instrumentation.counters
+        items = [(size, f) for size, files in groups for f in files]
+        
+        def work(item):
+            size, f = item
+            check_cancelled(cancel_event)
+            try:
+                return item, hasher(f.path, size)
+            except (OSError, ValueError) as e:
+                return item, e
+        
+        refined = defaultdict(list)
+        done = 0
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            for (size, f), outcome in executor.map(work, batch) if executor else map(work, batch):
+                done += 1
+                if isinstance(outcome, Exception):
+                    if isinstance(outcome, OSError):
+                        self.instrumentation.record_error(outcome)
+                    continue
+                digest, read = outcome
+                counters[counter] += 1
+                counters['bytes_hashed'] += read
+                refined[(size, digest)].append(f)
+                if progress_callback:
+                    progress_callback(f.path, done)
+        
+        return {key: files for key, files in refined.items() if len(files) > 1}
+    
+    def find(self, directories: Iterable[str], cancel_event: Optional[threading.Event] = None,
+             progress_callback: Optional[Callable[[str, int], None]] = None) -> List[DuplicateGroup]:
+        """Grupy duplikatów posortowane malejąco według bajtów do odzyskania"""
+        self.instrumentation = Instrumentation()
+        counters = self.instrumentation.counters
+        
+        with self.instrumentation.phase('walk'):
+            candidates = self._collect(_outermost(directories), cancel_event, progress_callback)
+        counters['size_candidates'] = sum(len(files) for files in candidates.values())
+        
+        executor = None
+        if self.threads > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(self.threads, thread_name_prefix='czysciciel-hash')
+        try:
+            with self.instrumentation.phase('partial_hash'):
+                partial = self._refine(list(candidates.items()), partial_hash, executor,
+                                       cancel_event, progress_callback, 'partial_hashes')
+            
+            # Skrót wstępny małego pliku obejmuje całą zawartość
+            complete = {key: files for key, files in partial.items() if key[0] <= 2 * PARTIAL_BYTES}
+            pending = [(size, files) for (size, _), files in partial.items() if size > 2 * PARTIAL_BYTES]
+            with self.instrumentation.phase('full_hash'):
+                complete.update(self._refine(pending, full_hash, executor, cancel_event,
+                                             progress_callback, 'full_hashes'))
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        groups = [DuplicateGroup(size, digest, tuple(sorted(files))) for (size, digest), files in complete.items()]
+        groups.sort(key=lambda g: (-g.reclaimable, g.files[0].path))
+        counters['duplicate_groups'] = len(groups)
+        counters['reclaimable_bytes'] = sum(g.reclaimable for g in groups)
+        return groups
+
+# Plik tymczasowy podmiany w katalogu zastępowanego pliku (core.TEMP_NAME - pomijany i sprzątany przez skan)
+TEMP_PREFIX = '.czysciciel-dedupe-'
+
+def _replace_tmp(tmp: str, target: str):
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+def _replace_with_link(source: str, target: str, target_st: os.stat_result):
+    directory = os.path.dirname(target)
+    while True:
+        # link() nie nadpisuje - losowa nazwa zamiast PID, którego pozostałość mogłaby blokować podmianę
+        tmp = os.path.join(directory, f"{TEMP_PREFIX}{os.urandom(6).hex()}.tmp")
+        try:
+            os.link(source, tmp)
+        except FileExistsError:
+            continue
+        break
+    _replace_tmp(tmp, target)
+
+def _replace_with_clone(source: str, target: str, target_st: os.stat_result):
+    """Kopia reflink (FICLONE) z właścicielem, uprawnieniami i czasami zastępowanego pliku"""
+    src = _open(source)
+    try:
+        dst, tmp = tempfile.mkstemp(suffix='.tmp', prefix=TEMP_PREFIX, dir=os.path.dirname(target))
+        try:
+            fcntl.ioctl(dst, FICLONE, src)
+            os.fchown(dst, target_st.st_uid, target_st.st_gid)
+            os.fchmod(dst, stat.S_IMODE(target_st.st_mode))
+            os.utime(dst, ns=(target_st.st_atime_ns, target_st.st_mtime_ns))
+        except BaseException:
+            os.close(dst)
+            os.unlink(tmp)
+            raise
+        os.close(dst)
+    finally:
+        os.close(src)
+    _replace_tmp(tmp, target)
+
+def _unchanged(f: DuplicateFile, size: int) -> Optional[os.stat_result]:
+    """Aktualny lstat pliku, jeśli to nadal ten sam plik regularny co przy skanowaniu"""
+    try:
+        st = os.lstat(f.path)
+    except OSError:
+        return None
+    if (not stat.S_ISREG(st.st_mode) or st.st_size != size or st.st_mtime_ns != f.mtime_ns
+            or (st.st_dev, st.st_ino) != (f.device, f.inode)):
+        return None
+    return st
+
+def dedupe(groups: Iterable[DuplicateGroup], mode: str, dry_run: bool = False,
+           instrumentation: Optional[Instrumentation] = None,
+           cancel_event: Optional[threading.Event] = None) -> Dict:
+    """Zastępuje duplikaty dowiązaniem twardym lub kopią reflink pierwszego pliku grupy
+    
+    Plik jest pomijany, jeśli zmienił się od skanowania albo leży na innym
+    systemie plików. Dowiązanie twarde wymaga też tego samego właściciela i
+    uprawnień (inaczej użytkownik straciłby własny plik); reflink zachowuje
+    osobny i-węzeł z metadanymi zastępowanego pliku. Podmiana jest atomowa
+    (plik tymczasowy w tym samym katalogu + rename).
+    """
+    if mode not in DEDUPE_MODES:
+        raise ValueError(f"Nieznany tryb deduplikacji: {mode}")
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    replace = _replace_with_link if mode == 'hardlink' else _replace_with_clone
+    counters = instrumentation.counters
+    result = {'mode': mode, 'dry_run': dry_run, 'replaced': 0, 'freed_bytes': 0, 'skipped': 0, 'errors': 0}
+    
+    for group in groups:
+        check_cancelled(cancel_event)
+        keep, *duplicates = group.files
+        keep_st = _unchanged(keep, group.size)
+        if keep_st is None:
+            result['skipped'] += len(duplicates)
+            continue
+        
+        for f in duplicates:
+            st = _unchanged(f, group.size)
+            if st is None or st.st_dev != keep_st.st_dev:
+                result['skipped'] += 1
+                continue
+            if mode == 'hardlink' and (st.st_uid, st.st_gid, st.st_mode) != (keep_st.st_uid, keep_st.st_gid, keep_st.st_mode):
+                counters['dedupe_metadata_mismatch'] += 1
+                result['skipped'] += 1
+                continue
+            
+            if not dry_run:
+                try:
+                    with instrumentation.phase('dedupe'):
+                        replace(keep.path, f.path, st)
+                except OSError as e:
+                    instrumentation.record_error(e)
+                    result['errors'] += 1
+                    continue
+            
+            result['replaced'] += 1
+            # Plik z innymi dowiązaniami nadal zajmuje miejsce
+            if st.st_nlink == 1:
+                result['freed_bytes'] += group.size
+    
+    counters['dedupe_replaced'] += result['replaced']
+    return result
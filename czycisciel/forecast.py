@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Forecast - Prognoza zapełnienia systemów plików
+Odporny trend zajętości (Theil-Sen w przesuwnym oknie, z odcinkami rozdzielonymi czyszczeniami)
+i czas do zapełnienia z przedziałem ufności - dla demona (poziom quick) i historii statystyk
+"""
+
+import math
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Najmniej próbek w oknie, od której serii liczony jest trend (systemy plików / katalogi z poziomu full)
+MIN_SAMPLES = 6
+MIN_DIRECTORY_SAMPLES = 3
+
+# Najwięcej próbek serii - par nachyleń jest n(n-1)/2
+MAX_SAMPLES = 512
+
+# Spadek między kolejnymi próbkami większy niż tyle odchyleń (MAD) różnic i niż MIN_DROP_BYTES
+# zaczyna nowy odcinek (czyszczenie, usunięte dane) - nachylenia liczone są tylko wewnątrz odcinków
+DROP_MAD = 5.0
+MIN_DROP_BYTES = 64 * 1024 * 1024
+
+# Kwantyl rozkładu normalnego dla dwustronnego przedziału 90%
+Z_90 = 1.645
+
+# Ile punktów załamania trendu sprawdzać (model odcinkowy: ostatni odcinek o innym tempie) i kwantyl
+# dla ich przedziałów - 90% z poprawką Bonferroniego na liczbę kandydatów, żeby szum nie udawał załamania
+BREAK_CANDIDATES = 16
+BREAK_Z = 2.73
+
+def _segments(values: np.ndarray, min_drop: float) -> np.ndarray:
+    """Numer odcinka każdej próbki - nowy odcinek po wyraźnym spadku wartości"""
+    steps = np.diff(values)
+    if not len(steps):
+        return np.zeros(len(values), dtype=np.int64)
+    spread = 1.4826 * np.median(np.abs(steps - np.median(steps)))
+    drops = steps < -max(DROP_MAD * spread, min_drop)
+    return np.concatenate(([0], np.cumsum(drops)))
+
+def _theil_sen(times: np.ndarray, values: np.ndarray, segment: np.ndarray, min_samples: int,
+               z: float) -> Optional[Dict]:
+    """Nachylenie Theila-Sena z przedziałem ufności Sena; pary tylko wewnątrz odcinków"""
+    if len(times) < min_samples:
+        return None
+    first, second = np.triu_indices(len(times), 1)
+    pairs = (segment[first] == segment[second]) & (times[second] > times[first])
+    first, second = first[pairs], second[pairs]
+    if len(first) < min_samples:
+        return None
+    slopes = np.sort((values[second] - values[first]) / (times[second] - times[first]))
+    
+    sizes = np.unique(segment, return_counts=True)[1]
+    spread = z * math.sqrt(float(np.sum(sizes * (sizes - 1) * (2 * sizes + 5))) / 18)
+    count = len(slopes)
+    low = max(int((count - spread) / 2), 0)
+    high = min(int(math.ceil((count + spread) / 2)), count - 1)
+    return {
+        'slope': float(np.median(slopes)),
+        'slope_low': float(slopes[low]),
+        'slope_high': float(slopes[high]),
+        'samples': len(times),
+        'segments': len(sizes),
+        'span_seconds': float(times[-1] - times[0])
+    }
+
+def _residual(times: np.ndarray, values: np.ndarray, segment: np.ndarray, slope: float) -> float:
+    """Suma odchyleń bezwzględnych od prostej o danym nachyleniu (wyraz wolny - mediana w każdym odcinku)"""
+    residuals = values - slope * times
+    return float(sum(np.sum(np.abs(part - np.median(part)))
+                     for part in np.split(residuals, np.flatnonzero(np.diff(segment)) + 1)))
+
+def robust_trend(times: Iterable[float], values: Iterable[float], min_samples: int = MIN_SAMPLES,
+                 min_drop: float = MIN_DROP_BYTES, z: float = Z_90) -> Optional[Dict]:
+    """Nachylenie Theila-Sena (wartość na sekundę) z przedziałem ufności; None - za mało danych
+    
+    Nachylenie to mediana nachyleń wszystkich par próbek z tego samego odcinka,
+    więc skok w dół po czyszczeniu ani pojedyncze odstające próbki nie zaniżają
+    trendu. Granice przedziału to nachylenia o rangach Sena (test Manna-Kendalla,
+    wariancje odcinków sumowane): low > 0 oznacza istotny wzrost.
+    
+    Model jest odcinkowy: jeśli przedział ostatniej części okna (szerszy, BREAK_Z)
+    jest rozłączny z przedziałem całego okna, trend to ta część (break_seconds - jej początek),
+    z punktem załamania o najmniejszej sumie odchyleń obu części. Nagły wzrost
+    nie jest wtedy rozmywany przez spokojne godziny sprzed niego.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    segment = _segments(values, min_drop)
+    trend = _theil_sen(times, values, segment, min_samples, z)
+    if trend is None:
+        return None
+    trend['break_seconds'] = None
+    
+    best, best_cost = trend, None
+    count = len(times)
+    for start in np.unique(np.linspace(2, count - min_samples, BREAK_CANDIDATES).astype(np.int64)):
+        recent = _theil_sen(times[start:], values[start:], segment[start:], min_samples, BREAK_Z)
+        if recent is None or (recent['slope_low'] <= trend['slope_high'] and trend['slope_low'] <= recent['slope_high']):
+            continue
+        if BREAK_Z != z:
+            recent = _theil_sen(times[start:], values[start:], segment[start:], min_samples, z)
+        earlier = _theil_sen(times[:start], values[:start], segment[:start], 2, z)
+        earlier_slope = earlier['slope'] if earlier else trend['slope']
+        cost = (_residual(times[:start], values[:start], segment[:start], earlier_slope)
+                + _residual(times[start:], values[start:], segment[start:], recent['slope']))
+        if best_cost is None or cost < best_cost:
+            best, best_cost = recent, cost
+            recent['break_seconds'] = float(times[start])
+    return best
+
+def _hours(free: float, slope: float) -> Optional[float]:
+    return free / slope / 3600 if slope > 0 else None
+
+def time_to_full(trend: Dict, free: int) -> Dict:
+    """Czas do zapełnienia przy trendzie zajętości i bieżącym wolnym miejscu
+    
+    hours_to_full dla mediany nachylenia, earliest/latest dla granic przedziału
+    (None - brak wzrostu). confidence to stosunek najwcześniejszego do
+    najpóźniejszego terminu: 1 - zgodne, 0 - wzrost nieistotny.
+    """
+    slope, low, high = trend['slope'], trend['slope_low'], trend['slope_high']
+    return {
+        'free': free,
+        'bytes_per_hour': slope * 3600,
+        'bytes_per_hour_low': low * 3600,
+        'bytes_per_hour_high': high * 3600,
+        'hours_to_full': _hours(free, slope),
+        'hours_to_full_earliest': _hours(free, high),
+        'hours_to_full_latest': _hours(free, low),
+        'confidence': min(max(low / high, 0.0), 1.0) if high > 0 else 0.0,
+        'significant': low > 0,
+        'samples': trend['samples'],
+        'window_hours': trend['span_seconds'] / 3600
+    }
+
+class TrendWindow:
+    """Serie próbek (czas, wartość) w przesuwnym oknie, po jednej na klucz (punkt montowania, katalog)
+    
+    Próbka bliższa poprzedniej niż min_spacing sekund jest pomijana, więc
+    sprawdzenia co minutę nie wypychają starszej części okna.
+    """
+    
+    def __init__(self, window_seconds: float, min_spacing: float = 0.0, min_samples: int = MIN_SAMPLES):
+        self.window_seconds = window_seconds
+        self.min_spacing = min_spacing
+        self.min_samples = min_samples
+        self.series: Dict[str, deque] = {}
+    
+    def add(self, key: str, timestamp: float, value: float) -> bool:
+        """Dopisuje próbkę; zwraca, czy została przyjęta"""
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = deque(maxlen=MAX_SAMPLES)
+        elif timestamp - series[-1][0] < self.min_spacing:
+            return False
+        series.append((timestamp, value))
+        while timestamp - series[0][0] > self.window_seconds:
+            series.popleft()
+        return True
+    
+    def discard(self, keys: Iterable[str]):
+        for key in keys:
+            self.series.pop(key, None)
+    
+    def trend(self, key: str, min_drop: float = MIN_DROP_BYTES) -> Optional[Dict]:
+        series = self.series.get(key)
+        if not series:
+            return None
+        times, values = zip(*series)
+        return robust_trend(times, values, self.min_samples, min_drop)
+    
+    def trends(self, min_drop: float = MIN_DROP_BYTES) -> Dict[str, Dict]:
+        """Trendy wszystkich serii z wystarczającą liczbą próbek"""
+        trends = {}
+        for key in list(self.series):
+            trend = self.trend(key, min_drop)
+            if trend is not None:
+                trends[key] = trend
+        return trends
+
+def growing(trends: Dict[str, Dict], top: int) -> List[Dict]:
+    """Najszybciej rosnące serie (np. katalogi) według mediany nachylenia"""
+    entries = [{'path': key, 'bytes_per_hour': trend['slope'] * 3600,
+                'bytes_per_hour_low': trend['slope_low'] * 3600, 'samples': trend['samples']}
+               for key, trend in trends.items() if trend['slope'] > 0]
+    entries.sort(key=lambda entry: entry['bytes_per_hour'], reverse=True)
+    return entries[:top]
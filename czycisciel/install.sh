@@ -73,8 +73,21 @@ mkdir -p /var/run
 echo_info "Kopiowanie plików..."
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
 
+cp "$SCRIPT_DIR/core.py" /opt/czysciciel/
 cp "$SCRIPT_DIR/main.py" /opt/czysciciel/
 cp "$SCRIPT_DIR/daemon.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/metrics.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/scheduler.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/control.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/watcher.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/notify.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/duplicates.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/compress.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/quarantine.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/openfiles.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/snapshot.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/forecast.py" /opt/czysciciel/
+cp "$SCRIPT_DIR/cli.py" /opt/czysciciel/
 cp "$SCRIPT_DIR/requirements.txt" /opt/czysciciel/
 cp "$SCRIPT_DIR/czysciciel.service" /etc/systemd/system/
 
@@ -82,6 +95,7 @@ cp "$SCRIPT_DIR/czysciciel.service" /etc/systemd/system/
 echo_info "Ustawianie uprawnień..."
 chmod +x /opt/czysciciel/main.py
 chmod +x /opt/czysciciel/daemon.py
+chmod +x /opt/czysciciel/cli.py
 chmod 644 /etc/systemd/system/czysciciel.service
 
 # Zainstaluj zależności Python
@@ -121,6 +135,16 @@ EOF
 
 chmod +x /usr/local/bin/czysciciel-gui
 
+# Utwórz polecenie CLI
+echo_info "Tworzenie polecenia czysciciel..."
+cat > /usr/local/bin/czysciciel << 'EOF'
+#!/bin/sh
+# Interfejs wiersza poleceń Czysciciela Dysku
+exec python3 /opt/czysciciel/cli.py "$@"
+EOF
+
+chmod +x /usr/local/bin/czysciciel
+
 # Utwórz plik desktop dla GUI
 echo_info "Tworzenie pliku .desktop..."
 cat > /usr/share/applications/czysciciel.desktop << 'EOF'
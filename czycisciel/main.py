@@ -9,291 +9,119 @@ Date: 26 września 2025
 
 import sys
 import os
-import json
 import logging
 import threading
 import time
-from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Dict, List, Tuple
+from datetime import datetime
+from typing import Dict, Optional
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-import subprocess
 import schedule
+from concurrent.futures import ThreadPoolExecutor
 
-class TranslationManager:
-    """Klasa do zarządzania tłumaczeniami"""
+# Silnik jest w module bez GUI - ponowny eksport dla zgodności z `from main import ...`
+from core import (
+    TaskCancelled, check_cancelled, TranslationManager,
+    DiskAnalyzer, DiskCleaner, NotificationManager, CleanupLock, LockBusy, ConfigError, UsageTop, SCAN_SNAPSHOT_DIR
+)
+from control import ControlClient, ControlError
+from openfiles import deleted_open_files
+
+# Lista "największych" w zakładce analizy - rodzaje (klucze UsageTop.as_dict) i ich długość
+TOP_KINDS = ('files', 'directories', 'extensions', 'growth')
+GUI_TOP_K = 100
+
+logger = logging.getLogger(__name__)
+
+class TaskHandle:
+    """Uchwyt pojedynczego zadania w tle - anulowanie i raportowanie postępu"""
     
-    def __init__(self):
-        self.current_lang = "pl"  # Default Polish
-        self.translations = {}
-        self.load_translations()
+    PROGRESS_INTERVAL = 0.2  # Minimalny odstęp między aktualizacjami postępu (s)
     
-    def load_translations(self):
-        """Ładuje tłumaczenia z pliku"""
-        try:
-            # Try different possible paths
-            translation_paths = [
-                "translations.json",
-                "assets/translations.json", 
-                "/opt/inv-cleaner/translations.json",
-                "/snap/inv-cleaner/current/translations.json"
-            ]
-            
-            for path in translation_paths:
-                if os.path.exists(path):
-                    with open(path, 'r', encoding='utf-8') as f:
-                        self.translations = json.load(f)
-                    break
-            else:
-                # Fallback translations if file not found
-                self.translations = {
-                    "pl": {"app_title": "Inv Cleaner - Zaawansowane Narzędzie"},
-                    "en": {"app_title": "Inv Cleaner - Advanced Tool"}
-                }
-        except Exception as e:
-            print(f"Error loading translations: {e}")
-            self.translations = {"pl": {}, "en": {}}
+    def __init__(self, task_type: str, manager: 'TaskManager', on_progress=None):
+        self.task_type = task_type
+        self.manager = manager
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+        self._last_progress = 0.0
     
-    def get(self, key: str, *args) -> str:
-        """Pobiera tłumaczenie dla klucza"""
-        try:
-            text = self.translations.get(self.current_lang, {}).get(key, key)
-            if args:
-                return text.format(*args)
-            return text
-        except Exception:
-            return key
+    def cancel(self):
+        """Zgłasza prośbę o anulowanie zadania"""
+        self.cancel_event.set()
     
-    def set_language(self, lang: str):
-        """Ustawia język aplikacji"""
-        if lang in self.translations:
-            self.current_lang = lang
-
-class DiskAnalyzer:
-    """Klasa do analizy wykorzystania dysku"""
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
     
-    def __init__(self):
-        self.scan_results = {}
-        
-    def get_directory_size(self, path: str) -> int:
-        """Pobiera rozmiar katalogu w bajtach"""
-        total_size = 0
-        try:
-            for dirpath, dirnames, filenames in os.walk(path):
-                for file in filenames:
-                    try:
-                        file_path = os.path.join(dirpath, file)
-                        if os.path.exists(file_path):
-                            total_size += os.path.getsize(file_path)
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-        return total_size
-    
-    def analyze_disk_usage(self, root_path: str = "/") -> Dict:
-        """Analizuje wykorzystanie dysku"""
-        results = {}
-        important_dirs = [
-            "/var/log", "/tmp", "/var/tmp", "/home", "/usr", 
-            "/var", "/opt", "/boot", "/etc"
-        ]
-        
-        for dir_path in important_dirs:
-            if os.path.exists(dir_path):
-                size = self.get_directory_size(dir_path)
-                results[dir_path] = {
-                    'size': size,
-                    'size_mb': size / (1024 * 1024),
-                    'size_gb': size / (1024 * 1024 * 1024)
-                }
-        
-        self.scan_results = results
-        return results
+    def report_progress(self, path: str, count: int):
+        """Przekazuje postęp do GUI (z ograniczeniem częstotliwości)"""
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if now - self._last_progress < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.manager.dispatch(self.on_progress, path, count)
 
-class DiskCleaner:
-    """Klasa do czyszczenia dysku"""
-    
-    def __init__(self, log_file: str = "/var/log/czysciciel.log"):
-        self.log_file = log_file
-        self.setup_logging()
-        self.cleaned_files = []
-        self.total_cleaned = 0
-        self.test_mode = False
-        self.test_callback = None
-        
-    def set_test_mode(self, enabled: bool, callback=None):
-        """Ustawia tryb testowy"""
-        self.test_mode = enabled
-        self.test_callback = callback
-    
-    def _log_or_callback(self, message: str, level: str = "info"):
-        """Loguje wiadomość lub wywołuje callback w trybie testowym"""
-        if self.test_mode and self.test_callback:
-            self.test_callback(message)
-        else:
-            if level == "info":
-                self.logger.info(message)
-            elif level == "error":
-                self.logger.error(message)
-        
-    def setup_logging(self):
-        """Konfiguruje system logowania"""
-        logging.basicConfig(
-            filename=self.log_file,
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        self.logger = logging.getLogger(__name__)
+class TaskManager:
+    """Wykonuje zadania GUI w tle: jedno zadanie danego typu naraz, z anulowaniem"""
     
-    def find_old_files(self, directory: str, days_old: int = 7) -> List[str]:
-        """Znajduje pliki starsze niż określona liczba dni"""
-        old_files = []
-        cutoff_date = datetime.now() - timedelta(days=days_old)
-        
-        try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        if os.path.exists(file_path):
-                            file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                            if file_time < cutoff_date:
-                                old_files.append(file_path)
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-            
-        return old_files
+    def __init__(self, root, max_workers: int = 2):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="czysciciel-task")
+        self.lock = threading.Lock()
+        self.active = {}
     
-    def find_large_files(self, directory: str, size_mb: int = 200) -> List[Tuple[str, int]]:
-        """Znajduje pliki większe niż określony rozmiar"""
-        large_files = []
-        size_bytes = size_mb * 1024 * 1024
+    def dispatch(self, callback, *args):
+        """Wywołuje callback w wątku GUI"""
+        if callback is not None:
+            self.root.after(0, lambda: callback(*args))
+    
+    def is_running(self, task_type: str) -> bool:
+        """Sprawdza czy zadanie danego typu jest w toku"""
+        with self.lock:
+            return task_type in self.active
+    
+    def submit(self, task_type: str, func, on_done=None, on_error=None,
+               on_cancel=None, on_progress=None) -> Optional[TaskHandle]:
+        """Uruchamia zadanie; zwraca None jeśli zadanie tego typu już trwa
         
-        try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        if os.path.exists(file_path):
-                            file_size = os.path.getsize(file_path)
-                            if file_size > size_bytes:
-                                large_files.append((file_path, file_size))
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            pass
-            
-        return large_files
-    
-    def clean_log_files(self) -> int:
-        """Czyści stare pliki logów"""
-        cleaned_size = 0
-        log_directories = ["/var/log", "/tmp", "/var/tmp"]
-        
-        for log_dir in log_directories:
-            if os.path.exists(log_dir):
-                self._log_or_callback(f"🔍 Skanowanie katalogu: {log_dir}")
-                old_files = self.find_old_files(log_dir, 7)
-                
-                if old_files:
-                    self._log_or_callback(f"📅 Znaleziono {len(old_files)} starych plików w {log_dir}")
-                
-                for file_path in old_files:
-                    try:
-                        if os.path.exists(file_path):
-                            file_size = os.path.getsize(file_path)
-                            
-                            if self.test_mode:
-                                self._log_or_callback(f"🗑️  SYMULACJA: {file_path} ({file_size} bajtów)")
-                            else:
-                                os.remove(file_path)
-                                cleaned_size += file_size
-                                self.cleaned_files.append(file_path)
-                                self._log_or_callback(f"✅ Usunięto: {file_path} ({file_size} bajtów)")
-                            
-                            if self.test_mode:
-                                cleaned_size += file_size  # Count for simulation
-                                
-                    except (OSError, IOError) as e:
-                        self._log_or_callback(f"❌ Błąd: {file_path}: {e}", "error")
-        
-        return cleaned_size
-    
-    def clean_large_files(self) -> int:
-        """Czyści duże pliki tymczasowe"""
-        cleaned_size = 0
-        temp_directories = ["/tmp", "/var/tmp"]
-        
-        for temp_dir in temp_directories:
-            if os.path.exists(temp_dir):
-                self._log_or_callback(f"🔍 Skanowanie dużych plików w: {temp_dir}")
-                large_files = self.find_large_files(temp_dir, 200)
-                
-                if large_files:
-                    self._log_or_callback(f"📏 Znaleziono {len(large_files)} dużych plików w {temp_dir}")
-                
-                for file_path, file_size in large_files:
-                    try:
-                        if os.path.exists(file_path):
-                            if self.test_mode:
-                                self._log_or_callback(f"🗑️  SYMULACJA: {file_path} ({file_size / (1024*1024):.2f} MB)")
-                            else:
-                                os.remove(file_path)
-                                cleaned_size += file_size
-                                self.cleaned_files.append(file_path)
-                                self._log_or_callback(f"✅ Usunięto duży plik: {file_path} ({file_size / (1024*1024):.2f} MB)")
-                            
-                            if self.test_mode:
-                                cleaned_size += file_size  # Count for simulation
-                                
-                    except (OSError, IOError) as e:
-                        self._log_or_callback(f"❌ Błąd: {file_path}: {e}", "error")
-        
-        return cleaned_size
-    
-    def perform_cleanup(self) -> Dict:
-        """Wykonuje pełne czyszczenie"""
-        self.cleaned_files = []
-        start_time = datetime.now()
-        
-        log_cleaned = self.clean_log_files()
-        large_cleaned = self.clean_large_files()
-        
-        total_cleaned = log_cleaned + large_cleaned
-        self.total_cleaned = total_cleaned
-        
-        result = {
-            'total_cleaned': total_cleaned,
-            'total_cleaned_mb': total_cleaned / (1024 * 1024),
-            'files_cleaned': len(self.cleaned_files),
-            'log_cleaned': log_cleaned,
-            'large_cleaned': large_cleaned,
-            'start_time': start_time,
-            'end_time': datetime.now()
-        }
-        
-        self.logger.info(f"Czyszczenie zakończone: {result}")
-        return result
-
-class NotificationManager:
-    """Klasa do zarządzania powiadomieniami"""
+        func otrzymuje TaskHandle i powinien przekazywać handle.cancel_event
+        oraz handle.report_progress do silnika skanowania.
+        """
+        with self.lock:
+            if task_type in self.active:
+                return None
+            handle = TaskHandle(task_type, self, on_progress)
+            self.active[task_type] = handle
+        
+        def run():
+            try:
+                result = func(handle)
+            except TaskCancelled:
+                self.dispatch(on_cancel)
+            except Exception as e:
+                self.dispatch(on_error, e)
+            else:
+                self.dispatch(on_done, result)
+            finally:
+                with self.lock:
+                    self.active.pop(task_type, None)
+        
+        self.executor.submit(run)
+        return handle
     
-    @staticmethod
-    def send_notification(title: str, message: str):
-        """Wysyła powiadomienie systemowe"""
-        try:
-            # Linux - używa notify-send
-            subprocess.run(['notify-send', title, message], check=False)
-        except (subprocess.SubprocessError, FileNotFoundError):
-            print(f"Powiadomienie: {title} - {message}")
+    def cancel(self, task_type: Optional[str] = None):
+        """Anuluje zadanie danego typu lub wszystkie zadania"""
+        with self.lock:
+            handles = [h for t, h in self.active.items() if task_type is None or t == task_type]
+        for handle in handles:
+            handle.cancel()
+    
+    def shutdown(self):
+        """Anuluje zadania i zamyka pulę wątków"""
+        self.cancel()
+        self.executor.shutdown(wait=False)
 
 class TestConsole:
     """Okno konsoli testowej do podglądu operacji na żywo"""
@@ -304,12 +132,12 @@ class TestConsole:
         self.window = None
         self.console_text = None
         self.is_open = False
-        
+    
     def open_console(self):
         """Otwiera okno konsoli testowej"""
         if self.is_open:
             return
-            
+        
         self.window = tk.Toplevel(self.parent)
         self.window.title(self.translator.get("test_console_title"))
         self.window.geometry("800x600")
@@ -343,7 +171,7 @@ class TestConsole:
         self.is_open = True
         self.add_message("=== 🧪 INV CLEANER TEST MODE ===")
         self.add_message(self.translator.get("test_scanning"))
-        
+    
     def add_message(self, message: str):
         """Dodaje wiadomość do konsoli"""
         if self.console_text and self.is_open:
@@ -353,7 +181,7 @@ class TestConsole:
             self.console_text.insert(tk.END, formatted_message)
             self.console_text.see(tk.END)
             self.console_text.update()
-            
+    
     def close_console(self):
         """Zamyka okno konsoli"""
         if self.window:
@@ -391,15 +219,29 @@ class CzyscicielApp:
         
         self.analyzer = DiskAnalyzer()
         self.cleaner = DiskCleaner()
-        self.notification_manager = NotificationManager()
+        # Test czyszczenia zostawia migawkę kolumnową - symulator progów bez ponownego skanowania
+        self.cleaner.collect_snapshot = True
+        self.notification_manager = NotificationManager(
+            lambda mb, files: ("Inv Cleaner", self.translator.get("notification_cleaned", mb, files))
+        )
         self.test_console = TestConsole(self.root, self.translator)
+        self.tasks = TaskManager(self.root)
+        self.control = ControlClient()
+        self.cleanup_lock = CleanupLock(program='czysciciel-gui')
+        self.scan_source = None
+        self.scan_fallback = None
+        self.hidden_usage = {}
+        self.top_usage = {}
+        self.forecast = {}
         
         self.is_monitoring = False
         self.monitoring_thread = None
         
         self.setup_ui()
         self.setup_scheduler()
-        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        threading.Thread(target=self._load_stored_snapshot, name='snapshot-load', daemon=True).start()
+    
     def update_language(self):
         """Aktualizuje interfejs po zmianie języka"""
         self.root.title(self.translator.get("app_title"))
@@ -414,12 +256,14 @@ class CzyscicielApp:
         self.scan_btn.config(text=self.translator.get("scan_disk"))
         self.clean_btn.config(text=self.translator.get("clean_now"))
         self.test_btn.config(text=self.translator.get("test_clean"))
+        self.cancel_scan_btn.config(text=self.translator.get("cancel"))
+        self.cancel_clean_btn.config(text=self.translator.get("cancel"))
         
         if self.is_monitoring:
             self.monitor_btn.config(text=self.translator.get("stop_monitoring"))
         else:
             self.monitor_btn.config(text=self.translator.get("start_monitoring"))
-            
+        
         self.refresh_logs_btn.config(text=self.translator.get("refresh_logs"))
         self.clear_logs_btn.config(text=self.translator.get("clear_logs"))
         
@@ -430,7 +274,17 @@ class CzyscicielApp:
         self.results_tree.heading('Path', text=self.translator.get("path"))
         self.results_tree.heading('Size_MB', text=self.translator.get("size_mb"))
         self.results_tree.heading('Size_GB', text=self.translator.get("size_gb"))
-        
+        self.top_label.config(text=self.translator.get("largest"))
+        selected = self.top_combo.current()
+        self.top_combo.config(values=[self.translator.get("top_" + kind) for kind in TOP_KINDS])
+        self.top_combo.current(max(selected, 0))
+        self.top_tree.heading('Path', text=self.translator.get("path"))
+        self.top_tree.heading('Size_MB', text=self.translator.get("size_mb"))
+        self.top_tree.heading('Files', text=self.translator.get("files_count"))
+        self._update_forecast()
+        self.simulation_chart_btn.config(text=self.translator.get("simulation_chart"))
+        self._update_simulation()
+    
     def setup_ui(self):
         """Konfiguruje interfejs użytkownika"""
         # Notebook dla zakładek
@@ -457,16 +311,31 @@ class CzyscicielApp:
         self.setup_cleaning_tab()
         self.setup_log_tab()
         self.setup_settings_tab()
-        
+    
     def setup_disk_analysis_tab(self):
         """Konfiguruje zakładkę analizy dysku"""
+        scan_btn_frame = ttk.Frame(self.disk_frame)
+        scan_btn_frame.pack(pady=10)
+        
         # Przycisk skanowania
         self.scan_btn = ttk.Button(
-            self.disk_frame, 
+            scan_btn_frame, 
             text=self.translator.get("scan_disk"), 
             command=self.scan_disk
         )
-        self.scan_btn.pack(pady=10)
+        self.scan_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_scan_btn = ttk.Button(
+            scan_btn_frame,
+            text=self.translator.get("cancel"),
+            command=lambda: self.cancel_task("scan"),
+            state=tk.DISABLED
+        )
+        self.cancel_scan_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Prognoza zapełnienia z demona (trend zajętości systemów plików)
+        self.forecast_var = tk.StringVar()
+        ttk.Label(self.disk_frame, textvariable=self.forecast_var, justify=tk.LEFT).pack(padx=10, anchor=tk.W)
         
         # Ramka na wykres
         self.chart_frame = ttk.Frame(self.disk_frame)
@@ -483,6 +352,23 @@ class CzyscicielApp:
         self.results_tree.heading('Size_GB', text=self.translator.get("size_gb"))
         self.results_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Największe pliki, katalogi i rozszerzenia - z tego samego skanu
+        top_frame = ttk.Frame(self.disk_frame)
+        top_frame.pack(fill=tk.X, padx=10)
+        self.top_label = ttk.Label(top_frame, text=self.translator.get("largest"))
+        self.top_label.pack(side=tk.LEFT)
+        self.top_combo = ttk.Combobox(top_frame, values=[self.translator.get("top_" + kind) for kind in TOP_KINDS],
+                                      state="readonly", width=16)
+        self.top_combo.current(0)
+        self.top_combo.pack(side=tk.LEFT, padx=5)
+        self.top_combo.bind("<<ComboboxSelected>>", lambda event: self._update_top_results())
+        
+        self.top_tree = ttk.Treeview(self.disk_frame, columns=('Path', 'Size_MB', 'Files'), show='headings', height=8)
+        self.top_tree.heading('Path', text=self.translator.get("path"))
+        self.top_tree.heading('Size_MB', text=self.translator.get("size_mb"))
+        self.top_tree.heading('Files', text=self.translator.get("files_count"))
+        self.top_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    
     def setup_cleaning_tab(self):
         """Konfiguruje zakładkę czyszczenia"""
         # Przyciski
@@ -510,6 +396,14 @@ class CzyscicielApp:
         )
         self.monitor_btn.pack(side=tk.LEFT, padx=5)
         
+        self.cancel_clean_btn = ttk.Button(
+            btn_frame,
+            text=self.translator.get("cancel"),
+            command=lambda: self.cancel_task("cleanup"),
+            state=tk.DISABLED
+        )
+        self.cancel_clean_btn.pack(side=tk.LEFT, padx=5)
+        
         # Status
         self.status_var = tk.StringVar()
         self.status_var.set(self.translator.get("status_ready"))
@@ -523,7 +417,7 @@ class CzyscicielApp:
             width=80
         )
         self.clean_results.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
+    
     def setup_log_tab(self):
         """Konfiguruje zakładkę logów"""
         # Przyciski
@@ -551,7 +445,7 @@ class CzyscicielApp:
             width=100
         )
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
+    
     def setup_settings_tab(self):
         """Konfiguruje zakładkę ustawień"""
         # Ustawienia
@@ -580,6 +474,21 @@ class CzyscicielApp:
         self.size_var = tk.IntVar(value=200)
         ttk.Spinbox(size_frame, from_=50, to=1000, textvariable=self.size_var, width=10).pack(side=tk.LEFT, padx=5)
         
+        # Symulacja progów na migawce z ostatniego testu
+        simulation_frame = ttk.Frame(self.settings_frame)
+        simulation_frame.pack(pady=5)
+        self.simulation_var = tk.StringVar()
+        ttk.Label(simulation_frame, textvariable=self.simulation_var, justify=tk.LEFT).pack(side=tk.LEFT)
+        self.simulation_chart_btn = ttk.Button(
+            simulation_frame,
+            text=self.translator.get("simulation_chart"),
+            command=self.show_simulation_chart
+        )
+        self.simulation_chart_btn.pack(side=tk.LEFT, padx=5)
+        self.days_var.trace_add('write', lambda *_: self._update_simulation())
+        self.size_var.trace_add('write', lambda *_: self._update_simulation())
+        self._update_simulation()
+        
         # Częstotliwość skanowania
         freq_frame = ttk.Frame(self.settings_frame)
         freq_frame.pack(pady=5)
@@ -592,28 +501,109 @@ class CzyscicielApp:
         new_lang = self.lang_var.get()
         self.translator.set_language(new_lang)
         self.update_language()
-        
+    
     def setup_scheduler(self):
         """Konfiguruje harmonogram czyszczenia"""
         schedule.every().hour.do(self.scheduled_cleanup)
+    
+    def _set_task_buttons(self, task_type: str, running: bool):
+        """Przełącza przyciski zadania i przycisk anulowania"""
+        start_state = tk.DISABLED if running else tk.NORMAL
+        cancel_state = tk.NORMAL if running else tk.DISABLED
+        if task_type == "scan":
+            self.scan_btn.config(state=start_state)
+            self.cancel_scan_btn.config(state=cancel_state)
+        else:
+            self.clean_btn.config(state=start_state)
+            self.test_btn.config(state=start_state)
+            self.cancel_clean_btn.config(state=cancel_state)
+    
+    def _start_task(self, task_type: str, func, on_done, on_error, progress_key: str) -> bool:
+        """Uruchamia zadanie w menedżerze zadań i ustawia stan przycisków"""
+        def finish(callback):
+            def wrapper(*args):
+                self._set_task_buttons(task_type, False)
+                callback(*args)
+            return wrapper
+        
+        handle = self.tasks.submit(
+            task_type,
+            func,
+            on_done=finish(on_done),
+            on_error=finish(on_error),
+            on_cancel=finish(self._on_task_cancelled),
+            on_progress=lambda path, count: self.status_var.set(
+                self.translator.get(progress_key, path, count)
+            )
+        )
+        if handle is None:
+            self.status_var.set(self.translator.get("status_busy"))
+            return False
         
+        self._set_task_buttons(task_type, True)
+        return True
+    
+    def cancel_task(self, task_type: str):
+        """Anuluje zadanie danego typu"""
+        self.tasks.cancel(task_type)
+    
+    def _on_task_cancelled(self):
+        """Obsługuje anulowane zadanie"""
+        self.status_var.set(self.translator.get("status_cancelled"))
+        if self.test_console.is_open:
+            self.test_console.add_message("⛔ " + self.translator.get("status_cancelled"))
+    
     def scan_disk(self):
         """Skanuje dysk i wyświetla wyniki"""
-        self.status_var.set(self.translator.get("status_scanning"))
-        self.root.update()
-        
-        # Uruchom skanowanie w osobnym wątku
-        threading.Thread(target=self._scan_disk_thread, daemon=True).start()
-        
-    def _scan_disk_thread(self):
-        """Wątek skanowania dysku"""
-        try:
-            results = self.analyzer.analyze_disk_usage()
-            
-            # Aktualizuj UI w głównym wątku
-            self.root.after(0, lambda: self._update_disk_results(results))
-        except Exception as e:
-            self.root.after(0, lambda: self.status_var.set(f"Błąd: {str(e)}"))
+        started = self._start_task(
+            "scan",
+            self._scan_task,
+            self._update_disk_results,
+            lambda e: self.status_var.set(f"Błąd: {str(e)}"),
+            "status_scanning_progress"
+        )
+        if started:
+            self.status_var.set(self.translator.get("status_scanning"))
+    
+    def _scan_task(self, handle: TaskHandle) -> Dict:
+        """Pobiera analizę z demona; skanuje lokalnie tylko gdy demon nie działa lub odmówił"""
+        self.scan_fallback = None
+        if self.control.available():
+            try:
+                analysis = self.control.request('analysis')
+                if not analysis['directories']:
+                    # Demon nie ma jeszcze pełnej analizy - zleć ją i pokazuj postęp
+                    for event in self.control.stream('scan', wait=True):
+                        check_cancelled(handle.cancel_event)
+                        if event.get('type') == 'progress':
+                            handle.report_progress(event['path'], event['files'])
+                    analysis = self.control.request('analysis')
+                self.scan_source = analysis['timestamp']
+                self.hidden_usage = analysis.get('hidden_usage') or {}
+                self.top_usage = dict(analysis.get('top') or {})
+                self.forecast = analysis.get('forecast') or {}
+                # Poddrzewa, które najbardziej urosły od poprzedniego skanu demona (porównanie migawek)
+                self.top_usage['growth'] = [
+                    {'path': entry['path'], 'size': entry['delta_bytes'], 'files': entry['delta_files']}
+                    for entry in (analysis.get('growth') or {}).get('subtrees', [])
+                ]
+                return analysis['directories']
+            except ControlError as e:
+                # Powód trafia na pasek stanu po skanowaniu lokalnym (_update_disk_results)
+                logger.warning(f"Demon niedostępny, skanowanie lokalne: {e}")
+                self.scan_fallback = str(e)
+        
+        self.scan_source = None
+        self.forecast = {}
+        top = UsageTop(GUI_TOP_K)
+        results = self.analyzer.analyze_disk_usage(
+            cancel_event=handle.cancel_event,
+            progress_callback=handle.report_progress,
+            top=top
+        )
+        self.top_usage = top.as_dict()
+        self.hidden_usage = deleted_open_files()
+        return results
     
     def _update_disk_results(self, results):
         """Aktualizuje wyniki skanowania dysku"""
@@ -629,9 +619,50 @@ class CzyscicielApp:
                 f"{data['size_gb']:.2f}"
             ))
         
+        # Usunięte, ale otwarte pliki - miejsce zajęte poza drzewem katalogów
+        hidden = self.hidden_usage.get('total_bytes', 0)
+        if hidden:
+            processes = ', '.join(p['name'] for p in self.hidden_usage.get('processes', [])[:3])
+            self.results_tree.insert('', 'end', values=(
+                f"{self.translator.get('hidden_usage')} ({processes})",
+                f"{hidden / (1024 * 1024):.2f}",
+                f"{hidden / (1024 * 1024 * 1024):.2f}"
+            ))
+        
+        self._update_top_results()
+        self._update_forecast()
+        
         # Stwórz wykres
         self.create_disk_chart(results)
-        self.status_var.set(self.translator.get("status_scan_complete"))
+        if self.scan_source:
+            self.status_var.set(self.translator.get("status_daemon_results", self.scan_source))
+        elif self.scan_fallback:
+            self.status_var.set(self.translator.get("status_scan_complete_local", self.scan_fallback))
+        else:
+            self.status_var.set(self.translator.get("status_scan_complete"))
+    
+    def _update_top_results(self):
+        """Wypełnia listę największych plików, katalogów, rozszerzeń lub przyrostów wybranych w liście rozwijanej"""
+        for item in self.top_tree.get_children():
+            self.top_tree.delete(item)
+        
+        for entry in self.top_usage.get(TOP_KINDS[self.top_combo.current()], []):
+            self.top_tree.insert('', 'end', values=(
+                entry.get('path') or entry.get('extension') or self.translator.get("no_extension"),
+                f"{entry['size'] / (1024 * 1024):.2f}",
+                entry.get('files', '')
+            ))
+    
+    def _update_forecast(self):
+        """Czas do zapełnienia systemów plików według prognozy demona (bez demona - pusto)"""
+        lines = []
+        for mount, entry in sorted(self.forecast.get('filesystems', {}).items()):
+            if entry['significant']:
+                lines.append(self.translator.get("forecast_full", mount, entry['hours_to_full'],
+                                                 entry['hours_to_full_earliest'], entry['confidence'] * 100))
+            else:
+                lines.append(self.translator.get("forecast_stable", mount))
+        self.forecast_var.set("\n".join(lines))
     
     def create_disk_chart(self, results):
         """Tworzy wykres kołowy wykorzystania dysku"""
@@ -642,6 +673,11 @@ class CzyscicielApp:
         if not results:
             return
         
+        # matplotlib/numpy ładowane dopiero przy pierwszym wykresie
+        import matplotlib.pyplot as plt
+        import numpy as np
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
         # Przygotuj dane
         labels = []
         sizes = []
@@ -671,52 +707,138 @@ class CzyscicielApp:
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
     
+    def _apply_settings(self) -> bool:
+        """Przenosi wiek i rozmiar z zakładki ustawień do reguł czyszczenia"""
+        try:
+            self.cleaner.update_config(dict(self.cleaner.config, days_old=self.days_var.get(),
+                                            large_file_mb=self.size_var.get()))
+        except (tk.TclError, ConfigError) as e:
+            self.status_var.set(self.translator.get("status_settings_invalid", str(e)))
+            return False
+        return True
+    
+    def _update_simulation(self):
+        """Przelicza na migawce, ile zwolniłyby bieżące days_old i large_file_mb (bez dostępu do dysku)"""
+        snapshot = self.cleaner.snapshot
+        if snapshot is None:
+            self.simulation_var.set(self.translator.get("simulation_no_snapshot"))
+            self.simulation_chart_btn.config(state=tk.DISABLED)
+            return
+        try:
+            days_old, large_file_mb = self.days_var.get(), self.size_var.get()
+        except tk.TclError:
+            return  # Niedokończona wartość w polu
+        
+        directories = snapshot.simulate(days_old, large_file_mb)
+        lines = [self.translator.get("simulation_result",
+                                     sum(d['bytes'] for d in directories.values()) / (1024 * 1024),
+                                     sum(d['files'] for d in directories.values()))]
+        lines += [f"  {root}: {d['bytes'] / (1024 * 1024):.2f} MB" for root, d in directories.items() if d['files']]
+        self.simulation_var.set("\n".join(lines))
+        self.simulation_chart_btn.config(state=tk.NORMAL)
+    
+    def _load_stored_snapshot(self):
+        """Wczytuje najnowszą migawkę skanu demona dla symulatora progów (wątek w tle)"""
+        from snapshot import StoredScan, list_scans
+        
+        scans = list_scans(SCAN_SNAPSHOT_DIR)
+        if not scans or self.cleaner.snapshot is not None:
+            return
+        try:
+            self.cleaner.load_snapshot(StoredScan(scans[-1]))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Nie można wczytać migawki skanu {scans[-1]}: {e}")
+            self.tasks.dispatch(self.status_var.set, self.translator.get("status_snapshot_failed", str(e)))
+            return
+        self.tasks.dispatch(self._update_simulation)
+    
+    def show_simulation_chart(self):
+        """Okno z krzywymi miejsca do zwolnienia w funkcji days_old i large_file_mb"""
+        snapshot = self.cleaner.snapshot
+        if snapshot is None:
+            return
+        try:
+            days_old, large_file_mb = self.days_var.get(), self.size_var.get()
+        except tk.TclError:
+            return
+        
+        import matplotlib.pyplot as plt
+        import numpy as np
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        days_values = np.arange(0, 91)
+        size_values = np.arange(0, 2001, 10)
+        fig, (age_ax, size_ax) = plt.subplots(1, 2, figsize=(10, 4))
+        age_ax.plot(days_values, snapshot.age_curve(days_values, large_file_mb) / (1024 * 1024))
+        age_ax.axvline(days_old, color='red', linestyle='--')
+        age_ax.set_xlabel(self.translator.get("simulation_age_axis"))
+        size_ax.plot(size_values, snapshot.size_curve(size_values, days_old) / (1024 * 1024))
+        size_ax.axvline(large_file_mb, color='red', linestyle='--')
+        size_ax.set_xlabel(self.translator.get("simulation_size_axis"))
+        for ax in (age_ax, size_ax):
+            ax.set_ylabel(self.translator.get("simulation_bytes_axis"))
+            ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+        
+        window = tk.Toplevel(self.root)
+        window.title(self.translator.get("simulation_chart"))
+        canvas = FigureCanvasTkAgg(fig, window)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        window.protocol("WM_DELETE_WINDOW", lambda: (plt.close(fig), window.destroy()))
+    
     def test_cleanup(self):
         """Testowe czyszczenie z konsolą"""
+        if not self._apply_settings():
+            return
+        started = self._start_task(
+            "cleanup",
+            self._test_cleanup_task,
+            self._update_test_results,
+            self._on_test_error,
+            "status_cleaning_progress"
+        )
+        if not started:
+            return
+        
         self.status_var.set(self.translator.get("status_testing"))
         
         # Otwórz konsolę testową
         self.test_console.open_console()
-        
-        # Uruchom test w osobnym wątku
-        threading.Thread(target=self._test_cleanup_thread, daemon=True).start()
-        
-    def _test_cleanup_thread(self):
-        """Wątek testowego czyszczenia"""
+    
+    def _test_cleanup_task(self, handle: TaskHandle) -> Dict:
+        """Zadanie testowego czyszczenia (wątek roboczy)"""
+        # Wiadomości z wątku roboczego trafiają do konsoli przez wątek GUI
+        console_callback = lambda message: self.tasks.dispatch(self.test_console.add_message, message)
         try:
             # Ustaw tryb testowy
-            self.cleaner.set_test_mode(True, self.test_console.add_message)
+            self.cleaner.set_test_mode(True, console_callback)
             
             # Wykonaj symulację czyszczenia
-            result = self.cleaner.perform_cleanup()
-            
-            # Pokaż podsumowanie w konsoli
-            total_mb = result['total_cleaned_mb']
-            files_count = result['files_cleaned']
-            
-            if total_mb > 0:
-                self.test_console.add_message("")
-                self.test_console.add_message(f"💾 RAZEM DO WYCZYSZCZENIA: {total_mb:.2f} MB ({files_count} plików)")
-                self.test_console.add_message("")
-                self.test_console.add_message("✅ " + self.translator.get("test_complete"))
-            else:
-                self.test_console.add_message("✅ " + self.translator.get("test_no_files"))
-            
-            # Aktualizuj UI w głównym wątku
-            self.root.after(0, lambda: self._update_test_results(result))
-            
-        except Exception as e:
-            self.test_console.add_message(f"❌ Błąd: {str(e)}")
-            self.root.after(0, lambda: self.status_var.set(f"Błąd testowania: {str(e)}"))
+            return self.cleaner.perform_cleanup(handle.cancel_event, handle.report_progress)
         finally:
             # Wyłącz tryb testowy
             self.cleaner.set_test_mode(False)
     
+    def _on_test_error(self, error: Exception):
+        """Obsługuje błąd testowego czyszczenia"""
+        self.test_console.add_message(f"❌ Błąd: {str(error)}")
+        self.status_var.set(f"Błąd testowania: {str(error)}")
+    
     def _update_test_results(self, result):
         """Aktualizuje wyniki testu"""
         cleaned_mb = result['total_cleaned_mb']
         files_count = result['files_cleaned']
         
+        # Pokaż podsumowanie w konsoli
+        if cleaned_mb > 0:
+            self.test_console.add_message("")
+            self.test_console.add_message(f"💾 RAZEM DO WYCZYSZCZENIA: {cleaned_mb:.2f} MB ({files_count} plików)")
+            self.test_console.add_message("")
+            self.test_console.add_message("✅ " + self.translator.get("test_complete"))
+        else:
+            self.test_console.add_message("✅ " + self.translator.get("test_no_files"))
+        
         message = f"""
 {self.translator.get('test_complete')}
 {self.translator.get('time')}: {result['start_time'].strftime('%H:%M:%S')} - {result['end_time'].strftime('%H:%M:%S')}
@@ -724,27 +846,49 @@ SYMULACJA - {self.translator.get('cleaned_size')}: {cleaned_mb:.2f} MB
 {self.translator.get('files_count')}: {files_count}
 {self.translator.get('log_files')}: {result['log_cleaned'] / (1024*1024):.2f} MB
 {self.translator.get('large_files')}: {result['large_cleaned'] / (1024*1024):.2f} MB
+{self.translator.get('limit_files')}: {result.get('limit_cleaned', 0) / (1024*1024):.2f} MB
         """
         
         self.clean_results.insert(tk.END, message + "\n" + "="*50 + "\n")
         self.clean_results.see(tk.END)
         
         self.status_var.set(f"Test: {cleaned_mb:.2f} MB do wyczyszczenia")
+        self._update_simulation()
     
-    def manual_cleanup(self):
-        """Ręczne czyszczenie"""
-        self.status_var.set(self.translator.get("status_cleaning"))
-        threading.Thread(target=self._cleanup_thread, daemon=True).start()
+    def manual_cleanup(self, lock_policy: str = 'piggyback'):
+        """Ręczne czyszczenie
         
-    def _cleanup_thread(self):
-        """Wątek czyszczenia"""
-        try:
-            # Wyłącz tryb testowy dla rzeczywistego czyszczenia
-            self.cleaner.set_test_mode(False)
-            result = self.cleaner.perform_cleanup()
-            self.root.after(0, lambda: self._update_cleanup_results(result))
-        except Exception as e:
-            self.root.after(0, lambda: self.status_var.set(f"Błąd czyszczenia: {str(e)}"))
+        Jeśli demon lub CLI właśnie czyści, czeka i pokazuje ich wynik
+        (piggyback); czyszczenie z harmonogramu GUI jest wtedy pomijane.
+        """
+        if not self._apply_settings():
+            return
+        started = self._start_task(
+            "cleanup",
+            lambda handle: self._cleanup_task(handle, lock_policy),
+            self._update_cleanup_results,
+            self._on_cleanup_error,
+            "status_cleaning_progress"
+        )
+        if started:
+            self.status_var.set(self.translator.get("status_cleaning"))
+    
+    def _cleanup_task(self, handle: TaskHandle, lock_policy: str = 'piggyback') -> Dict:
+        """Zadanie czyszczenia (wątek roboczy)"""
+        # Wyłącz tryb testowy dla rzeczywistego czyszczenia
+        self.cleaner.set_test_mode(False)
+        return self.cleanup_lock.run(
+            lambda: self.cleaner.perform_cleanup(handle.cancel_event, handle.report_progress),
+            lock_policy,
+            cancel_event=handle.cancel_event
+        )
+    
+    def _on_cleanup_error(self, error: Exception):
+        """Obsługuje błąd czyszczenia"""
+        if isinstance(error, LockBusy):
+            self.status_var.set(self.translator.get("status_cleanup_locked", str(error)))
+        else:
+            self.status_var.set(f"Błąd czyszczenia: {str(error)}")
     
     def _update_cleanup_results(self, result):
         """Aktualizuje wyniki czyszczenia"""
@@ -758,6 +902,10 @@ SYMULACJA - {self.translator.get('cleaned_size')}: {cleaned_mb:.2f} MB
 {self.translator.get('files_count')}: {files_count}
 {self.translator.get('log_files')}: {result['log_cleaned'] / (1024*1024):.2f} MB
 {self.translator.get('large_files')}: {result['large_cleaned'] / (1024*1024):.2f} MB
+{self.translator.get('limit_files')}: {result.get('limit_cleaned', 0) / (1024*1024):.2f} MB
+{self.translator.get('compressed_files')}: {result.get('files_compressed', 0)} ({result.get('bytes_saved', 0) / (1024*1024):.2f} MB)
+{self.translator.get('quarantined_files')}: {result.get('files_quarantined', 0)} ({result.get('bytes_quarantined', 0) / (1024*1024):.2f} MB)
+{self.translator.get('open_files_result')}: {result.get('files_skipped_open', 0)} / {result.get('files_truncated', 0)}
         """
         
         self.clean_results.insert(tk.END, message + "\n" + "="*50 + "\n")
@@ -765,17 +913,14 @@ SYMULACJA - {self.translator.get('cleaned_size')}: {cleaned_mb:.2f} MB
         
         self.status_var.set(self.translator.get("status_cleaned", cleaned_mb))
         
-        # Wyślij powiadomienie
-        if cleaned_mb > 0:
-            self.notification_manager.send_notification(
-                "Inv Cleaner",
-                self.translator.get("notification_cleaned", cleaned_mb, files_count)
-            )
+        # Wyślij powiadomienie (w tle; czyszczenia z jednej serii dają jedno powiadomienie)
+        self.notification_manager.notify_cleanup(result['total_cleaned'], files_count)
     
     def scheduled_cleanup(self):
         """Zaplanowane czyszczenie"""
         if self.is_monitoring:
-            self._cleanup_thread()
+            # Przez wątek GUI - menedżer zadań pominie je, jeśli czyszczenie już trwa
+            self.root.after(0, lambda: self.manual_cleanup('skip'))
     
     def toggle_monitoring(self):
         """Włącza/wyłącza monitoring"""
@@ -830,6 +975,13 @@ SYMULACJA - {self.translator.get('cleaned_size')}: {cleaned_mb:.2f} MB
                     self.translator.get("cannot_clear_logs", str(e))
                 )
     
+    def on_close(self):
+        """Zamyka aplikację, anulując zadania w tle"""
+        self.is_monitoring = False
+        self.tasks.shutdown()
+        self.notification_manager.close()
+        self.root.destroy()
+    
     def run(self):
         """Uruchamia aplikację"""
         self.root.mainloop()
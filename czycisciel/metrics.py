@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Metrics - Eksport metryk w formacie Prometheus
+Plik .prom dla textfile collectora node_exportera i opcjonalny endpoint /metrics
+"""
+
+import os
+import time
+import socket
+import logging
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Domyślny katalog textfile collectora node_exportera (Debian/Ubuntu)
+DEFAULT_TEXTFILE_PATH = "/var/lib/prometheus/node-exporter/czysciciel.prom"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+def _escape_label(value: str) -> str:
+    """Escapuje wartość etykiety zgodnie z formatem tekstowym Prometheusa"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_sample(name: str, value, labels: Optional[Dict[str, str]] = None) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+        return f"{name}{{{label_text}}} {float(value)!r}"
+    return f"{name} {float(value)!r}"
+
+def write_textfile(path: str, text: str):
+    """Zapisuje plik atomowo (plik tymczasowy w tym samym katalogu + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.czysciciel-', suffix='.prom.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class DaemonMetrics:
+    """Stan metryk demona aktualizowany po każdym poziomie (quick/incremental/full)"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.directories = {}
+        self.filesystems = {}
+        self.hidden_usage = {}
+        self.forecast = {}
+        self.growing_directories = []
+        self.forecast_actions_total = defaultdict(int)
+        self.last_cleanup = {}
+        self.freed_bytes_total = 0
+        self.files_deleted_total = 0
+        self.files_compressed_total = 0
+        self.compression_saved_bytes_total = 0
+        self.cycles_total = defaultdict(int)
+        self.errors_total = defaultdict(int)
+        self.cycle_duration = {}
+        self.cost_estimate = {}
+        self.last_cycle_timestamp = {}
+        self.last_success_timestamp = {}
+        self.last_quick_check_timestamp = 0.0
+        self.config_reloads_total = defaultdict(int)
+        self.config_last_reload_success = 1
+    
+    def record_cycle(self, tier: str, disk_usage: Dict, cleanup_result: Dict, duration: float,
+                     cost_estimate: Optional[float] = None):
+        """Zapisuje wynik udanego przebiegu poziomu"""
+        with self.lock:
+            self.directories.update(disk_usage)
+            if cleanup_result:
+                self.last_cleanup = cleanup_result
+                self.freed_bytes_total += cleanup_result.get('total_cleaned', 0)
+                self.files_deleted_total += cleanup_result.get('files_cleaned', 0)
+                self.files_compressed_total += cleanup_result.get('files_compressed', 0)
+                self.compression_saved_bytes_total += cleanup_result.get('bytes_saved', 0)
+                for code, count in cleanup_result.get('instrumentation', {}).get('errors', {}).items():
+                    self.errors_total[code] += count
+            self.cycles_total[(tier, 'success')] += 1
+            self.cycle_duration[tier] = duration
+            if cost_estimate is not None:
+                self.cost_estimate[tier] = cost_estimate
+            self.last_cycle_timestamp[tier] = self.last_success_timestamp[tier] = time.time()
+    
+    def record_failure(self, tier: str, duration: float):
+        """Zapisuje nieudany lub przerwany przebieg poziomu"""
+        with self.lock:
+            self.cycles_total[(tier, 'failure')] += 1
+            self.cycle_duration[tier] = duration
+            self.last_cycle_timestamp[tier] = time.time()
+    
+    def record_filesystems(self, filesystems: Dict):
+        """Zapisuje wynik szybkiego sprawdzenia statvfs"""
+        with self.lock:
+            self.filesystems = dict(filesystems)
+            self.last_quick_check_timestamp = time.time()
+    
+    def record_hidden_usage(self, filesystems: Dict[str, int]):
+        """Zapisuje miejsce zajęte przez usunięte, ale otwarte pliki (poziom full)"""
+        with self.lock:
+            self.hidden_usage = dict(filesystems)
+    
+    def record_forecast(self, filesystems: Dict[str, Dict], directories: List[Dict]):
+        """Zapisuje prognozę zapełnienia systemów plików i najszybciej rosnące katalogi"""
+        with self.lock:
+            self.forecast = dict(filesystems)
+            self.growing_directories = list(directories)
+    
+    def record_forecast_action(self, action: str):
+        """Zlicza działanie wywołane prognozą (czyszczenie celowane lub alert)"""
+        with self.lock:
+            self.forecast_actions_total[action] += 1
+    
+    def record_reload(self, success: bool):
+        """Zapisuje wynik przeładowania konfiguracji"""
+        with self.lock:
+            self.config_reloads_total['success' if success else 'failure'] += 1
+            self.config_last_reload_success = int(success)
+    
+    def render(self) -> str:
+        """Zwraca metryki w formacie tekstowym Prometheusa"""
+        lines = []
+        
+        def metric(name: str, metric_type: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(_format_sample(name, value, labels))
+        
+        def per_tier(values: Dict):
+            return [({'tier': tier}, value) for tier, value in sorted(values.items())]
+        
+        with self.lock:
+            directories = sorted(self.directories.items())
+            filesystems = sorted(self.filesystems.items())
+            metric('czysciciel_directory_size_bytes', 'gauge', 'Rozmiar katalogu w ostatnim skanie',
+                   [({'path': path}, data['size']) for path, data in directories])
+            metric('czysciciel_directory_files', 'gauge', 'Liczba plików w katalogu w ostatnim skanie',
+                   [({'path': path}, data.get('files', 0)) for path, data in directories])
+            metric('czysciciel_scan_duration_seconds', 'gauge', 'Czas skanowania katalogu',
+                   [({'path': path}, data.get('scan_time', 0)) for path, data in directories])
+            metric('czysciciel_scan_errors', 'gauge', 'Błędy dostępu w ostatnim skanie katalogu',
+                   [({'path': path}, data.get('errors', 0)) for path, data in directories])
+            metric('czysciciel_filesystem_size_bytes', 'gauge', 'Rozmiar systemu plików (statvfs)',
+                   [({'mount_point': mount}, usage['total']) for mount, usage in filesystems])
+            metric('czysciciel_filesystem_free_bytes', 'gauge', 'Wolne miejsce dla użytkowników (statvfs)',
+                   [({'mount_point': mount}, usage['free']) for mount, usage in filesystems])
+            metric('czysciciel_hidden_usage_bytes', 'gauge', 'Miejsce zajęte przez usunięte, ale otwarte pliki',
+                   [({'mount_point': mount}, size) for mount, size in sorted(self.hidden_usage.items())])
+            forecast = sorted(self.forecast.items())
+            metric('czysciciel_filesystem_growth_bytes_per_hour', 'gauge',
+                   'Trend zajętości systemu plików (mediana Theila-Sena w oknie prognozy)',
+                   [({'mount_point': mount}, entry['bytes_per_hour']) for mount, entry in forecast])
+            metric('czysciciel_filesystem_time_to_full_seconds', 'gauge',
+                   'Prognozowany czas do zapełnienia (tylko przy wzroście)',
+                   [({'mount_point': mount}, entry['hours_to_full'] * 3600)
+                    for mount, entry in forecast if entry['hours_to_full'] is not None])
+            metric('czysciciel_filesystem_time_to_full_earliest_seconds', 'gauge',
+                   'Najwcześniejszy termin zapełnienia z 90% przedziału ufności',
+                   [({'mount_point': mount}, entry['hours_to_full_earliest'] * 3600)
+                    for mount, entry in forecast if entry['hours_to_full_earliest'] is not None])
+            metric('czysciciel_filesystem_forecast_confidence', 'gauge',
+                   'Zgodność prognozy: najwcześniejszy / najpóźniejszy termin (0 - wzrost nieistotny)',
+                   [({'mount_point': mount}, entry['confidence']) for mount, entry in forecast])
+            metric('czysciciel_directory_growth_bytes_per_hour', 'gauge',
+                   'Trend rozmiaru najszybciej rosnących katalogów (skany poziomu full)',
+                   [({'path': entry['path']}, entry['bytes_per_hour']) for entry in self.growing_directories])
+            metric('czysciciel_forecast_actions_total', 'counter', 'Działania wywołane prognozą zapełnienia',
+                   [({'action': action}, count) for action, count in sorted(self.forecast_actions_total.items())])
+            metric('czysciciel_last_cleanup_freed_bytes', 'gauge', 'Bajty zwolnione w ostatnim czyszczeniu',
+                   [(None, self.last_cleanup.get('total_cleaned', 0))])
+            metric('czysciciel_last_cleanup_files_deleted', 'gauge', 'Pliki usunięte w ostatnim czyszczeniu',
+                   [(None, self.last_cleanup.get('files_cleaned', 0))])
+            metric('czysciciel_freed_bytes_total', 'counter', 'Bajty zwolnione od startu demona',
+                   [(None, self.freed_bytes_total)])
+            metric('czysciciel_files_deleted_total', 'counter', 'Pliki usunięte od startu demona',
+                   [(None, self.files_deleted_total)])
+            metric('czysciciel_files_compressed_total', 'counter', 'Pliki skompresowane w miejscu od startu demona',
+                   [(None, self.files_compressed_total)])
+            metric('czysciciel_compression_saved_bytes_total', 'counter', 'Bajty zaoszczędzone kompresją od startu demona',
+                   [(None, self.compression_saved_bytes_total)])
+            metric('czysciciel_errors_total', 'counter', 'Błędy usuwania według errno od startu demona',
+                   [({'errno': code}, count) for code, count in sorted(self.errors_total.items())])
+            metric('czysciciel_cycles_total', 'counter', 'Przebiegi poziomów według wyniku',
+                   [({'tier': tier, 'result': result}, count)
+                    for (tier, result), count in sorted(self.cycles_total.items())])
+            metric('czysciciel_cycle_duration_seconds', 'gauge', 'Czas trwania ostatniego przebiegu poziomu',
+                   per_tier(self.cycle_duration))
+            metric('czysciciel_cost_estimate_seconds', 'gauge', 'Szacowany koszt poziomu z poprzednich przebiegów',
+                   per_tier(self.cost_estimate))
+            metric('czysciciel_last_cycle_timestamp_seconds', 'gauge', 'Czas zakończenia ostatniego przebiegu',
+                   per_tier(self.last_cycle_timestamp))
+            metric('czysciciel_last_success_timestamp_seconds', 'gauge', 'Czas ostatniego udanego przebiegu',
+                   per_tier(self.last_success_timestamp))
+            metric('czysciciel_last_quick_check_timestamp_seconds', 'gauge', 'Czas ostatniego sprawdzenia statvfs',
+                   [(None, self.last_quick_check_timestamp)])
+            metric('czysciciel_config_reloads_total', 'counter', 'Przeładowania konfiguracji według wyniku',
+                   [({'result': result}, count) for result, count in sorted(self.config_reloads_total.items())])
+            metric('czysciciel_config_last_reload_success', 'gauge',
+                   'Czy ostatnie przeładowanie konfiguracji się powiodło (0 - działa poprzednia)',
+                   [(None, self.config_last_reload_success)])
+        
+        return "\n".join(lines) + "\n"
+
+def _create_server(listen: str, metrics: 'DaemonMetrics'):
+    """Tworzy serwer HTTP (import http.server dopiero przy włączonym endpoincie)"""
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Obsługa GET /metrics"""
+        
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format, *args)
+    
+    if listen.startswith('unix:'):
+        class UnixMetricsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+            
+            def get_request(self):
+                # BaseHTTPRequestHandler oczekuje krotki (host, port)
+                request, _ = super().get_request()
+                return request, ('unix', 0)
+        
+        path = listen[len('unix:'):]
+        if os.path.exists(path):
+            os.unlink(path)
+        server = UnixMetricsServer(path, MetricsHandler)
+        os.chmod(path, 0o660)
+        return server
+    
+    class TCPMetricsServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+    
+    host, _, port = listen.rpartition(':')
+    return TCPMetricsServer((host or '127.0.0.1', int(port)), MetricsHandler)
+
+class MetricsServer:
+    """Endpoint HTTP /metrics na localhost lub gnieździe Unix
+    
+    listen: "127.0.0.1:9469" albo "unix:/run/czysciciel/metrics.sock".
+    """
+    
+    def __init__(self, metrics: DaemonMetrics, listen: str):
+        self.metrics = metrics
+        self.listen = listen
+        self.server = None
+        self.thread = None
+    
+    def start(self):
+        """Uruchamia serwer w wątku w tle"""
+        self.server = _create_server(self.listen, self.metrics)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Zatrzymuje serwer i usuwa gniazdo Unix"""
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server.address_family == socket.AF_UNIX:
+            try:
+                os.unlink(self.listen[len('unix:'):])
+            except OSError:
+                pass
+        self.server = None
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Notify - Powiadomienia w tle i komunikaty dla systemd
+Dyspozytor łączący serie powiadomień oraz sd_notify przez NOTIFY_SOCKET bez podprocesu
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SystemdNotifier:
+    """Komunikaty sd_notify (READY=1, STATUS=..., WATCHDOG=1) wysyłane datagramem na NOTIFY_SOCKET
+    
+    Bez NOTIFY_SOCKET (uruchomienie poza systemd) notify() nic nie robi.
+    Gniazdo jest otwierane raz, więc częste komunikaty kosztują jeden sendto.
+    watchdog() można wołać dowolnie często (np. co katalog) - WATCHDOG=1 wychodzi
+    co ćwierć WatchdogSec, więc przerwa między komunikatami nie przekracza połowy limitu.
+    """
+    
+    def __init__(self, address: Optional[str] = None, watchdog_timeout: Optional[float] = None):
+        address = address if address is not None else os.environ.get('NOTIFY_SOCKET', '')
+        if address.startswith('@'):
+            address = '\0' + address[1:]  # Gniazdo w abstrakcyjnej przestrzeni nazw
+        self.address = address
+        self.sock = None
+        self.lock = threading.Lock()
+        if watchdog_timeout is None:
+            watchdog_timeout = self.watchdog_timeout()
+        self.watchdog_interval = watchdog_timeout / 4 if watchdog_timeout and address else None
+        self.last_watchdog = float('-inf')
+    
+    @staticmethod
+    def watchdog_timeout() -> Optional[float]:
+        """WatchdogSec usługi w sekundach (WATCHDOG_USEC), jeśli dotyczy tego procesu"""
+        pid = os.environ.get('WATCHDOG_PID')
+        if pid and pid != str(os.getpid()):
+            return None
+        try:
+            usec = int(os.environ.get('WATCHDOG_USEC', ''))
+        except ValueError:
+            return None
+        return usec / 1e6 if usec > 0 else None
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.address)
+    
+    def notify(self, *assignments: str) -> bool:
+        """Wysyła jeden komunikat z przypisaniami, np. notify("READY=1", "STATUS=...")"""
+        if not self.address:
+            return False
+        payload = '\n'.join(assignments).encode('utf-8')
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+                self.sock.sendto(payload, self.address)
+            except OSError as e:
+                logger.debug(f"sd_notify: {e}")
+                return False
+        return True
+    
+    def watchdog(self) -> bool:
+        """Wysyła WATCHDOG=1, jeśli od poprzedniego minęło watchdog_interval"""
+        if self.watchdog_interval is None:
+            return False
+        now = time.monotonic()
+        if now - self.last_watchdog < self.watchdog_interval:
+            return False
+        self.last_watchdog = now
+        return self.notify('WATCHDOG=1')
+    
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+def desktop_notify(title: str, message: str, urgency: Optional[str] = None,
+                   timeout_ms: Optional[int] = None):
+    """Powiadomienie na pulpicie przez notify-send (lista argumentów, bez powłoki)"""
+    command = ['notify-send']
+    if urgency:
+        command += ['-u', urgency]
+    if timeout_ms:
+        command += ['-t', str(timeout_ms)]
+    env = dict(os.environ)
+    env.setdefault('DISPLAY', ':0')
+    try:
+        subprocess.run(command + [title, message], check=False, timeout=10, env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (subprocess.SubprocessError, FileNotFoundError):
+        logger.info(f"Powiadomienie: {title} - {message}")
+
+class NotificationDispatcher:
+    """Wysyła powiadomienia w wątku w tle, łącząc serie i ograniczając częstotliwość
+    
+    notify() i notify_cleanup() tylko dopisują zdarzenie i wracają. Wątek czeka
+    coalesce_seconds na kolejne zdarzenia i zachowuje co najmniej min_interval
+    między wysyłkami; wszystko, co przyjdzie w tym czasie, trafia do jednego
+    powiadomienia. Wyniki czyszczeń są sumowane, a suma poniżej
+    min_cleaned_bytes nie daje powiadomienia.
+    """
+    
+    MAX_LINES = 3
+    
+    def __init__(self, sender: Callable[[str, str], None],
+                 cleanup_message: Callable[[float, int], Tuple[str, str]],
+                 min_cleaned_bytes: int = 0, min_interval: float = 60.0, coalesce_seconds: float = 2.0):
+        self.sender = sender
+        self.cleanup_message = cleanup_message
+        self.min_cleaned_bytes = min_cleaned_bytes
+        self.min_interval = min_interval
+        self.coalesce_seconds = coalesce_seconds
+        self.condition = threading.Condition()
+        self.messages: List[Tuple[str, str]] = []
+        self.cleaned_bytes = 0
+        self.cleaned_files = 0
+        self.cleanups = 0
+        self.last_sent = float('-inf')
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.suppressed = 0
+    
+    def _enqueue(self, update: Callable[[], None]):
+        with self.condition:
+            if self.closed:
+                return
+            update()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='notifications', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+    
+    def notify(self, title: str, message: str):
+        """Kolejkuje powiadomienie (identyczne w jednej serii są wysyłane raz)"""
+        def update():
+            if (title, message) not in self.messages:
+                self.messages.append((title, message))
+        self._enqueue(update)
+    
+    def notify_cleanup(self, cleaned_bytes: int, files: int):
+        """Kolejkuje wynik czyszczenia (sumowany z innymi w tej samej serii)"""
+        def update():
+            self.cleaned_bytes += cleaned_bytes
+            self.cleaned_files += files
+            self.cleanups += 1
+        self._enqueue(update)
+    
+    def _pending(self) -> bool:
+        return bool(self.messages) or self.cleanups > 0
+    
+    def _take(self) -> List[Tuple[str, str]]:
+        """Zabiera zdarzenia serii i składa z nich powiadomienia (wywoływane z condition)"""
+        batch = []
+        if self.cleanups:
+            if self.cleaned_bytes > 0 and self.cleaned_bytes >= self.min_cleaned_bytes:
+                batch.append(self.cleanup_message(self.cleaned_bytes / (1024 * 1024), self.cleaned_files))
+            else:
+                self.suppressed += self.cleanups
+            self.cleaned_bytes = self.cleaned_files = self.cleanups = 0
+        
+        if len(self.messages) == 1:
+            batch.append(self.messages[0])
+        elif self.messages:
+            lines = [message for _, message in self.messages[:self.MAX_LINES]]
+            if len(self.messages) > self.MAX_LINES:
+                lines.append(f"(+{len(self.messages) - self.MAX_LINES} więcej)")
+            batch.append((self.messages[0][0], '\n'.join(lines)))
+        self.messages = []
+        return batch
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._pending() and not self.closed:
+                    self.condition.wait()
+                if not self._pending():
+                    return
+                
+                # Okno łączenia serii, nie krótsze niż odstęp od poprzedniej wysyłki
+                deadline = max(time.monotonic() + self.coalesce_seconds, self.last_sent + self.min_interval)
+                while not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self._take()
+            
+            for title, message in batch:
+                try:
+                    self.sender(title, message)
+                except Exception as e:
+                    logger.warning(f"Nie udało się wysłać powiadomienia: {e}")
+            if batch:
+                self.sent += len(batch)
+                self.last_sent = time.monotonic()
+    
+    def close(self, timeout: float = 5.0):
+        """Wysyła zaległe powiadomienia bez czekania na okno i kończy wątek"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Open Files - Pliki otwarte przez procesy
+Jedno przejście /proc/*/fd daje indeks (st_dev, st_ino) -> PID sprawdzany dla każdego kandydata do usunięcia
+oraz "ukryte zajęcie" - pliki usunięte, ale wciąż otwarte, które nadal zajmują miejsce
+"""
+
+import os
+import re
+import stat
+import errno
+import fnmatch
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+PROC = '/proc'
+
+# readlink deskryptora usuniętego pliku kończy się tym dopiskiem
+DELETED_SUFFIX = ' (deleted)'
+
+# Domyślne wzorce ścieżek usuniętych plików, które czysciciel hidden --truncate może przyciąć
+# (advanced_settings.truncate_deleted_patterns) - logi usług, które nie zamknęły ich po rotacji
+DEFAULT_TRUNCATE_PATTERNS = ('/var/log/*',)
+
+_OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+def iter_descriptors(proc: str = PROC,
+                     heartbeat: Optional[Callable[[], None]] = None) -> Iterator[Tuple[int, str, os.stat_result]]:
+    """(PID, ścieżka /proc/PID/fd/N, stat celu) dla deskryptorów zwykłych plików wszystkich procesów
+    
+    stat deskryptora działa także dla plików już usuniętych (st_nlink == 0).
+    Procesy, które zakończyły się w trakcie, i niedostępne bez roota są pomijane.
+    heartbeat jest wołany co proces (keepalive watchdoga demona).
+    """
+    with os.scandir(proc) as processes:
+        for process in processes:
+            if not process.name.isdigit():
+                continue
+            if heartbeat:
+                heartbeat()
+            try:
+                descriptors = os.scandir(os.path.join(process.path, 'fd'))
+            except OSError:
+                continue
+            with descriptors:
+                pid = int(process.name)
+                for descriptor in descriptors:
+                    try:
+                        st = os.stat(descriptor.path)
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(st.st_mode):
+                        yield pid, descriptor.path, st
+
+class OpenFileIndex:
+    """Indeks (st_dev, st_ino) -> PID-y procesów, które mają plik otwarty
+    
+    Budowany raz na przebieg czyszczenia; sprawdzenie kandydata to jeden lstat
+    i wyszukanie w słowniku zamiast przeglądania /proc dla każdego pliku.
+    Bez roota widać tylko procesy tego samego użytkownika.
+    """
+    
+    def __init__(self, index: Dict[Tuple[int, int], Set[int]], descriptors: int = 0):
+        self.index = index
+        self.descriptors = descriptors
+    
+    @classmethod
+    def build(cls, proc: str = PROC, heartbeat: Optional[Callable[[], None]] = None) -> 'OpenFileIndex':
+        index = {}
+        descriptors = 0
+        for pid, _, st in iter_descriptors(proc, heartbeat):
+            descriptors += 1
+            index.setdefault((st.st_dev, st.st_ino), set()).add(pid)
+        return cls(index, descriptors)
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def lookup(self, path: str) -> Tuple[Optional[Tuple[int, int]], Optional[Set[int]]]:
+        """(st_dev, st_ino) z lstat i PID-y procesów, które mają plik otwarty (None - żaden/brak pliku)"""
+        if not self.index:
+            return None, None
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return None, None
+        key = (st.st_dev, st.st_ino)
+        return key, self.index.get(key)
+    
+    def holders(self, path: str) -> Optional[Set[int]]:
+        """PID-y procesów, które mają plik otwarty (None - żaden lub plik nie istnieje)"""
+        return self.lookup(path)[1]
+
+def truncate_held(path: str, key: Tuple[int, int]):
+    """Przycina do zera plik otwarty przez proces - przez deskryptor, tylko jeśli to nadal i-węzeł key
+    
+    Ścieżka w katalogu innego użytkownika (np. /tmp) może zostać podmieniona
+    między sprawdzeniem a przycięciem: O_NOFOLLOW odrzuca dowiązanie,
+    a porównanie (st_dev, st_ino) - inny plik. O_NONBLOCK - kolejka FIFO
+    nie blokuje otwarcia. Niezgodność daje OSError (ESTALE).
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC)
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or (st.st_dev, st.st_ino) != key:
+            raise OSError(errno.ESTALE, "plik podmieniony po sprawdzeniu otwartych deskryptorów", path)
+        os.truncate(fd, 0)
+    finally:
+        os.close(fd)
+
+def _mount_points(proc: str = PROC) -> Dict[int, str]:
+    """st_dev -> punkt montowania (z /proc/self/mountinfo; przy kilku - najkrótszy)"""
+    mounts = {}
+    try:
+        with open(os.path.join(proc, 'self', 'mountinfo'), 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 5:
+                    continue
+                major, minor = fields[2].split(':')
+                device = os.makedev(int(major), int(minor))
+                mount = _OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[4])
+                if device not in mounts or len(mount) < len(mounts[device]):
+                    mounts[device] = mount
+    except OSError:
+        pass
+    return mounts
+
+def _process_name(pid: int, proc: str = PROC) -> str:
+    try:
+        with open(os.path.join(proc, str(pid), 'comm'), 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().strip()
+    except OSError:
+        return '?'
+
+def deleted_open_files(proc: str = PROC, heartbeat: Optional[Callable[[], None]] = None) -> Dict:
+    """Pliki usunięte, ale wciąż otwarte przez procesy - miejsca, którego nie widać w drzewie katalogów
+    
+    Jedno przejście /proc/*/fd; plik otwarty przez kilka procesów (lub kilka
+    deskryptorów) liczy się raz w sumach, ale u każdego procesu. Rozmiar to
+    zajęte bloki. Pomijane są pliki spoza zamontowanych systemów plików
+    (memfd, pamięć współdzielona) - nie zajmują dysku.
+    Zwraca {'total_bytes', 'files', 'processes', 'filesystems'}.
+    """
+    mounts = _mount_points(proc)
+    files = {}
+    for pid, descriptor, st in iter_descriptors(proc, heartbeat):
+        if st.st_nlink or st.st_dev not in mounts:
+            continue
+        entry = files.get((st.st_dev, st.st_ino))
+        if entry is None:
+            try:
+                path = os.readlink(descriptor)
+            except OSError:
+                continue
+            if path.endswith(DELETED_SUFFIX):
+                path = path[:-len(DELETED_SUFFIX)]
+            entry = files[(st.st_dev, st.st_ino)] = {
+                'path': path, 'mount_point': mounts[st.st_dev], 'size': st.st_blocks * 512,
+                'device': st.st_dev, 'inode': st.st_ino, 'pids': [], 'descriptors': []
+            }
+        if pid not in entry['pids']:
+            entry['pids'].append(pid)
+        entry['descriptors'].append(descriptor)
+    
+    processes = {}
+    filesystems = {}
+    for entry in files.values():
+        filesystems[entry['mount_point']] = filesystems.get(entry['mount_point'], 0) + entry['size']
+        for pid in entry['pids']:
+            process = processes.get(pid)
+            if process is None:
+                process = processes[pid] = {'pid': pid, 'name': _process_name(pid, proc), 'files': 0, 'bytes': 0}
+            process['files'] += 1
+            process['bytes'] += entry['size']
+    
+    return {
+        'total_bytes': sum(filesystems.values()),
+        'files': sorted(files.values(), key=lambda entry: entry['size'], reverse=True),
+        'processes': sorted(processes.values(), key=lambda process: process['bytes'], reverse=True),
+        'filesystems': filesystems
+    }
+
+def truncate_deleted(files: Iterable[Dict], patterns: Iterable[str] = DEFAULT_TRUNCATE_PATTERNS) -> List[Dict]:
+    """Przycina do zera usunięte, otwarte pliki, których pierwotna ścieżka pasuje do patterns
+    
+    Przez /proc/PID/fd/N - proces pisze dalej do tego samego i-węzła, a miejsce
+    wraca od razu. Przed przycięciem sprawdzane jest, że deskryptor nadal
+    wskazuje ten sam usunięty plik.
+    """
+    patterns = tuple(patterns)
+    results = []
+    for entry in files:
+        if not any(fnmatch.fnmatchcase(entry['path'], pattern) for pattern in patterns):
+            continue
+        result = {'path': entry['path'], 'pids': entry['pids'], 'size': entry['size'], 'status': 'gone'}
+        for descriptor in entry['descriptors']:
+            try:
+                st = os.stat(descriptor)
+                if (st.st_dev, st.st_ino) != (entry['device'], entry['inode']) or st.st_nlink:
+                    continue
+                os.truncate(descriptor, 0)
+            except OSError as e:
+                result.update(status='error', error=str(e))
+                continue
+            result['status'] = 'truncated'
+            result.pop('error', None)
+            break
+        results.append(result)
+    return results
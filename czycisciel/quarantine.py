@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Quarantine - Kwarantanna zamiast usuwania (advanced_settings.backup_before_delete)
+Przeniesienie przez rename (lub reflink) do katalogu na tym samym systemie plików, manifest, wygasanie i przywracanie
+"""
+
+import os
+import json
+import time
+import re
+import errno
+import fcntl
+import shutil
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from core import find_mount_point
+
+# Katalog kwarantanny w punkcie montowania każdego systemu plików (jak .Trash-UID)
+QUARANTINE_DIR = '.czysciciel-quarantine'
+MANIFEST = 'manifest.jsonl'
+
+# Bez prawa zapisu w punkcie montowania (uruchomienie bez roota) - kwarantanna w katalogu domowym,
+# o ile plik leży na tym samym systemie plików
+HOME_QUARANTINE = os.path.expanduser('~/.local/share/czysciciel-quarantine')
+
+# Pliki są grupowane w kubełki godzinowe - wygaśnięcie to usunięcie całego kubełka
+BUCKET_SECONDS = 3600
+
+# ioctl FICLONE z <linux/fs.h>
+FICLONE = 0x40049409
+
+_OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+logger = logging.getLogger(__name__)
+
+def _clone_move(source: str, target: str, dst_dir_fd: Optional[int] = None):
+    """Przeniesienie między punktami montowania tego samego systemu plików (bind mount, subwolumin btrfs)
+    
+    Kopia reflink współdzieli bloki z oryginałem, więc to także tylko operacje
+    na metadanych. Bez wsparcia reflink zgłasza OSError - dane nie są kopiowane.
+    """
+    src = os.open(source, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+    try:
+        st = os.fstat(src)
+        dst = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600,
+                      dir_fd=dst_dir_fd)
+        try:
+            fcntl.ioctl(dst, FICLONE, src)
+            os.fchown(dst, st.st_uid, st.st_gid)
+            os.fchmod(dst, st.st_mode & 0o7777)
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except BaseException:
+            os.close(dst)
+            os.unlink(target, dir_fd=dst_dir_fd)
+            raise
+        os.close(dst)
+    finally:
+        os.close(src)
+    os.unlink(source)
+
+def move_file(source: str, target: str, dst_dir_fd: Optional[int] = None):
+    """rename, a przy EXDEV kopia reflink i usunięcie źródła; target względem dst_dir_fd, jeśli podany"""
+    try:
+        os.rename(source, target, dst_dir_fd=dst_dir_fd)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        _clone_move(source, target, dst_dir_fd)
+
+class Quarantine:
+    """Przenosi pliki do kwarantanny systemu plików, na którym leżą
+    
+    Jeden obiekt na przebieg czyszczenia: urządzenie katalogu i katalog
+    kwarantanny są zapamiętywane, a manifesty kubełków pozostają otwarte,
+    więc plik kosztuje rename i dopisanie jednej linii.
+    """
+    
+    def __init__(self):
+        self.directories: Dict[str, str] = {}  # katalog pliku -> katalog kwarantanny
+        self.manifests: Dict[str, object] = {}
+        self.sequence = 0
+    
+    def _root_for(self, directory: str) -> str:
+        root = self.directories.get(directory)
+        if root is None:
+            root = os.path.join(find_mount_point(directory), QUARANTINE_DIR)
+            try:
+                os.makedirs(root, mode=0o700, exist_ok=True)
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EPERM, errno.EROFS):
+                    raise
+                os.makedirs(HOME_QUARANTINE, mode=0o700, exist_ok=True)
+                if os.stat(HOME_QUARANTINE).st_dev != os.stat(directory).st_dev:
+                    raise
+                root = HOME_QUARANTINE
+            self.directories[directory] = root
+        return root
+    
+    def _manifest(self, bucket_dir: str):
+        manifest = self.manifests.get(bucket_dir)
+        if manifest is None:
+            os.makedirs(bucket_dir, mode=0o700, exist_ok=True)
+            manifest = open(os.path.join(bucket_dir, MANIFEST), 'a', encoding='utf-8', buffering=1)
+            self.manifests[bucket_dir] = manifest
+        return manifest
+    
+    def move(self, path: str, size: int, reason: str) -> str:
+        """Przenosi plik do kwarantanny i dopisuje go do manifestu; zwraca identyfikator"""
+        now = time.time()
+        bucket = str(int(now // BUCKET_SECONDS))
+        root = self._root_for(os.path.dirname(path))
+        bucket_dir = os.path.join(root, bucket)
+        manifest = self._manifest(bucket_dir)
+        
+        self.sequence += 1
+        name = f"{time.time_ns()}-{os.getpid()}-{self.sequence}"
+        move_file(path, os.path.join(bucket_dir, name))
+        item_id = f"{bucket}/{name}"
+        manifest.write(json.dumps({'id': item_id, 'path': path, 'size': size, 'reason': reason,
+                                   'time': now}) + '\n')
+        return item_id
+    
+    def close(self):
+        for manifest in self.manifests.values():
+            manifest.close()
+        self.manifests = {}
+
+def quarantine_dirs() -> List[str]:
+    """Możliwe katalogi kwarantanny - po jednym na zamontowany system plików i katalog domowy"""
+    mounts = []
+    try:
+        with open('/proc/self/mounts', 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 1:
+                    # Spacje i inne znaki w punkcie montowania są zapisane jako \\ooo
+                    mounts.append(_OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1]))
+    except OSError:
+        mounts = ['/']
+    return sorted({os.path.join(mount, QUARANTINE_DIR) for mount in mounts} | {HOME_QUARANTINE})
+
+def existing_roots() -> List[str]:
+    return [root for root in quarantine_dirs() if os.path.isdir(root)]
+
+def _buckets(root: str) -> List[str]:
+    try:
+        return sorted(name for name in os.listdir(root) if name.isdigit())
+    except OSError:
+        return []
+
+def _read_manifest(bucket_dir: str) -> List[Dict]:
+    """Wpisy kubełka bez przywróconych"""
+    entries = {}
+    try:
+        with open(os.path.join(bucket_dir, MANIFEST), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Linia ucięta przy awarii
+                if record.get('restored'):
+                    entries.pop(record.get('id'), None)
+                elif 'path' in record:
+                    entries[record['id']] = record
+    except OSError:
+        return []
+    return list(entries.values())
+
+def list_entries(roots: Optional[Iterable[str]] = None) -> List[Dict]:
+    """Pliki w kwarantannie (najnowsze na końcu) z polem root"""
+    entries = []
+    for root in roots if roots is not None else existing_roots():
+        for bucket in _buckets(root):
+            for entry in _read_manifest(os.path.join(root, bucket)):
+                entries.append(dict(entry, root=root))
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+_DIRECTORY_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+def _open_parent(path: str, uid: int, gid: int) -> int:
+    """Deskryptor katalogu nadrzędnego path, otwieranego składnik po składniku (openat, O_NOFOLLOW)
+    
+    Przywracanie działa jako root, a katalogi na ścieżce może podmieniać ich
+    właściciel - dowiązanie w miejscu katalogu przekierowałoby plik gdzie
+    indziej. Każdy składnik musi być katalogiem roota lub właściciela pliku
+    (uid); brakujące są tworzone i oddawane właścicielowi.
+    """
+    fd = os.open('/', _DIRECTORY_FLAGS)
+    try:
+        for part in os.path.dirname(os.path.abspath(path)).split('/'):
+            if not part:
+                continue
+            try:
+                child = os.open(part, _DIRECTORY_FLAGS, dir_fd=fd)
+            except FileNotFoundError:
+                os.mkdir(part, 0o777, dir_fd=fd)
+                if os.geteuid() == 0 and uid != 0:
+                    os.chown(part, uid, gid, dir_fd=fd, follow_symlinks=False)
+                child = os.open(part, _DIRECTORY_FLAGS, dir_fd=fd)
+            except OSError as e:
+                if e.errno not in (errno.ELOOP, errno.ENOTDIR):
+                    raise
+                raise OSError(e.errno, "składnik ścieżki nie jest katalogiem (dowiązanie?)", part) from None
+            os.close(fd)
+            fd = child
+            owner = os.fstat(fd).st_uid
+            if owner not in (0, uid):
+                raise PermissionError(errno.EPERM, f"katalog należy do innego użytkownika (UID {owner})", part)
+        return fd
+    except BaseException:
+        os.close(fd)
+        raise
+
+def restore(entries: Iterable[Dict], overwrite: bool = False) -> List[Dict]:
+    """Przywraca wpisy pod pierwotne ścieżki; zwraca wynik dla każdego wpisu
+    
+    Istniejący plik nie jest nadpisywany bez overwrite. Brakujące katalogi
+    nadrzędne są tworzone. Ścieżka z dowiązaniem symbolicznym lub katalogiem
+    innego użytkownika niż właściciel pliku (i root) jest odrzucana.
+    """
+    results = []
+    for entry in entries:
+        source = os.path.join(entry['root'], entry['id'])
+        target = entry['path']
+        result = {'id': entry['id'], 'path': target}
+        try:
+            st = os.lstat(source)
+            parent = _open_parent(target, st.st_uid, st.st_gid)
+            try:
+                name = os.path.basename(target)
+                if not overwrite:
+                    try:
+                        os.stat(name, dir_fd=parent, follow_symlinks=False)
+                    except FileNotFoundError:
+                        pass
+                    else:
+                        raise FileExistsError(errno.EEXIST, "plik już istnieje", target)
+                move_file(source, name, parent)
+            finally:
+                os.close(parent)
+            bucket_dir = os.path.dirname(source)
+            with open(os.path.join(bucket_dir, MANIFEST), 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'id': entry['id'], 'restored': time.time()}) + '\n')
+            result['status'] = 'restored'
+        except OSError as e:
+            result.update(status='error', error=str(e))
+        results.append(result)
+    return results
+
+def purge(ttl_seconds: float, everything: bool = False, now: Optional[float] = None,
+          roots: Optional[Iterable[str]] = None) -> Dict:
+    """Usuwa kubełki starsze niż ttl_seconds (everything - wszystkie)
+    
+    Koszt to listing katalogów kwarantanny; manifest jest czytany tylko dla
+    usuwanych kubełków (do raportu zwolnionych bajtów).
+    """
+    now = time.time() if now is None else now
+    result = {'buckets': 0, 'files': 0, 'bytes': 0, 'errors': 0}
+    for root in roots if roots is not None else existing_roots():
+        for bucket in _buckets(root):
+            if not everything and (int(bucket) + 1) * BUCKET_SECONDS + ttl_seconds > now:
+                continue
+            bucket_dir = os.path.join(root, bucket)
+            entries = _read_manifest(bucket_dir)
+            try:
+                shutil.rmtree(bucket_dir)
+            except OSError as e:
+                logger.error(f"Nie można usunąć {bucket_dir}: {e}")
+                result['errors'] += 1
+                continue
+            result['buckets'] += 1
+            result['files'] += len(entries)
+            result['bytes'] += sum(entry.get('size', 0) for entry in entries)
+    return result
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Scheduler - Harmonogram zadań demona
+Sen do dokładnego terminu, jedno zadanie naraz, losowy jitter terminów,
+okna serwisowe w składni crona i szacowanie kosztu z poprzednich uruchomień
+"""
+
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+# Co zrobić, gdy termin zadania minie w trakcie trwającego zadania
+OVERLAP_POLICIES = ('skip', 'coalesce')
+
+logger = logging.getLogger(__name__)
+
+class CronExpression:
+    """Wyrażenie w składni crona: minuta godzina dzień miesiąc dzień_tygodnia
+    
+    Obsługuje *, liczby, zakresy a-b, listy a,b i kroki */n lub a-b/n.
+    Dzień tygodnia 0-7 (0 i 7 to niedziela).
+    """
+    
+    FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7)]
+    
+    def __init__(self, expression: str):
+        self.expression = expression
+        parts = expression.split()
+        if len(parts) != len(self.FIELDS):
+            raise ValueError(f"Wyrażenie crona musi mieć 5 pól: {expression!r}")
+        
+        self.values = {}
+        for part, (name, low, high) in zip(parts, self.FIELDS):
+            self.values[name] = self._parse_field(part, low, high)
+        if 7 in self.values['weekday']:
+            self.values['weekday'].add(0)
+        
+        # Jak w cronie: gdy oba pola dni są ograniczone, wystarczy zgodność jednego
+        self.day_restricted = parts[2] != '*'
+        self.weekday_restricted = parts[4] != '*'
+    
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for item in field.split(','):
+            range_part, _, step_part = item.partition('/')
+            step = int(step_part) if step_part else 1
+            if range_part == '*':
+                start, end = low, high
+            elif '-' in range_part:
+                start, end = (int(v) for v in range_part.split('-', 1))
+            else:
+                start = int(range_part)
+                end = high if step_part else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Wartość spoza zakresu {low}-{high}: {item!r}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.values['day']
+        weekday_ok = (moment.isoweekday() % 7) in self.values['weekday']
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+    
+    def next_after(self, moment: datetime) -> datetime:
+        """Pierwsza pasująca minuta ściśle po moment"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        
+        while candidate < limit:
+            if candidate.month not in self.values['month']:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.values['hour']:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.values['minute']:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        
+        raise ValueError(f"Wyrażenie crona nigdy nie pasuje: {self.expression!r}")
+
+class CostEstimator:
+    """Szacuje koszt (czas) zadań na podstawie poprzednich uruchomień (średnia wykładnicza)"""
+    
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.estimates: Dict[str, float] = {}
+    
+    def update(self, key: str, duration: float):
+        previous = self.estimates.get(key)
+        if previous is None:
+            self.estimates[key] = duration
+        else:
+            self.estimates[key] = previous + self.alpha * (duration - previous)
+    
+    def estimate(self, key: str, default: Optional[float] = None) -> Optional[float]:
+        return self.estimates.get(key, default)
+
+class Job:
+    """Zadanie okresowe (co interval sekund lub według crona) z terminem na zegarze monotonicznym
+    
+    Zadanie bez interval i cron uruchamia się tylko na żądanie (Scheduler.trigger).
+    """
+    
+    def __init__(self, name: str, func: Callable[[], None], interval: Optional[float] = None,
+                 first_delay: float = 0.0, jitter: float = 0.0,
+                 cron: Optional[CronExpression] = None, inline: bool = False):
+        if interval is not None and cron is not None:
+            raise ValueError("Zadanie wymaga interval albo cron, nie obu")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.inline = inline
+        self.pending = False
+        self.runs = 0
+        self.skipped = 0
+        if interval is None and cron is None:
+            self.next_run = float('inf')
+        elif cron is None:
+            self.base = time.monotonic() + first_delay
+            self.next_run = self.base + self._jitter()
+        else:
+            self.advance(time.monotonic())
+    
+    def _jitter(self) -> float:
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+    
+    def same_schedule(self, other: 'Job') -> bool:
+        """Czy zadanie ma ten sam harmonogram co other"""
+        return (self.interval == other.interval and self.jitter == other.jitter and self.inline == other.inline
+                and (self.cron.expression if self.cron else None) == (other.cron.expression if other.cron else None))
+    
+    def advance(self, now: float):
+        """Ustawia następny termin (bez dryfu - kolejne wielokrotności interwału)"""
+        if self.interval is None and self.cron is None:
+            self.next_run = float('inf')
+            return
+        if self.cron is not None:
+            wall_now = datetime.now()
+            delay = (self.cron.next_after(wall_now) - wall_now).total_seconds()
+            self.next_run = now + delay + self._jitter()
+            return
+        missed = max(0, int((now - self.base) // self.interval))
+        self.base += (missed + 1) * self.interval
+        self.next_run = self.base + self._jitter()
+
+class Scheduler:
+    """Uruchamia zadania w jednym wątku roboczym, nigdy dwa naraz
+    
+    Pętla run() śpi na Event do najbliższego terminu, więc stop() (np. z
+    handlera SIGTERM) budzi ją natychmiast. Jeśli termin minie, gdy inne
+    zadanie jeszcze trwa, polityka "skip" pomija to uruchomienie, a
+    "coalesce" wykonuje zadanie raz zaraz po zakończeniu bieżącego.
+    Zadania inline (tanie, np. statvfs) wykonują się w wątku pętli i nie
+    czekają na zadanie w tle. idle_callback (np. keepalive watchdoga) jest
+    wołany co idle_interval tylko wtedy, gdy żadne zadanie w tle nie trwa -
+    trwające zadanie musi sygnalizować postęp samo.
+    """
+    
+    def __init__(self, overlap_policy: str = 'skip'):
+        if overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(f"Nieznana polityka nakładania: {overlap_policy}")
+        self.overlap_policy = overlap_policy
+        self.jobs: List[Job] = []
+        self.lock = threading.RLock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.current: Optional[Job] = None
+        self.worker: Optional[threading.Thread] = None
+        self.idle_callback: Optional[Callable[[], None]] = None
+        self.idle_interval: Optional[float] = None
+    
+    def add_job(self, name: str, func: Callable[[], None], interval: Optional[float] = None,
+                first_delay: float = 0.0, jitter: float = 0.0,
+                cron: Optional[CronExpression] = None, inline: bool = False) -> Job:
+        """Dodaje zadanie okresowe"""
+        job = Job(name, func, interval, first_delay, jitter, cron, inline)
+        with self.lock:
+            self.jobs.append(job)
+        self.wakeup.set()
+        return job
+    
+    def replace_jobs(self, jobs: List[Job]):
+        """Podmienia wszystkie zadania; zadania o niezmienionym harmonogramie zachowują terminy
+        
+        Bezpieczne z wątku zadania (np. przeładowanie konfiguracji w trakcie pracy pętli).
+        """
+        with self.lock:
+            previous = {job.name: job for job in self.jobs}
+            for job in jobs:
+                old = previous.get(job.name)
+                if old is not None and old.same_schedule(job):
+                    job.next_run = old.next_run
+                    job.pending = old.pending
+                    job.runs = old.runs
+                    job.skipped = old.skipped
+                    if hasattr(old, 'base'):
+                        job.base = old.base
+            self.jobs = list(jobs)
+        self.wakeup.set()
+    
+    def get_job(self, name: str) -> Optional[Job]:
+        for job in self.jobs:
+            if job.name == name:
+                return job
+        return None
+    
+    def trigger(self, name: str) -> bool:
+        """Zleca uruchomienie zadania poza harmonogramem (raz, po bieżącym zadaniu)"""
+        job = self.get_job(name)
+        if job is None:
+            return False
+        job.pending = True
+        self.wakeup.set()
+        return True
+    
+    def clear(self):
+        """Usuwa wszystkie zadania (bieżące zadanie dobiega końca)"""
+        with self.lock:
+            self.jobs = []
+        self.wakeup.set()
+    
+    def is_running(self) -> bool:
+        return self.worker is not None and self.worker.is_alive()
+    
+    def _run_job(self, job: Job):
+        try:
+            job.func()
+        except Exception as e:
+            logger.error(f"Błąd zadania {job.name}: {e}")
+        finally:
+            job.runs += 1
+            self.wakeup.set()
+    
+    def _run_background(self, job: Job):
+        """Wątek roboczy: tylko on zwalnia current - zadanie inline nie może go wyczyścić w trakcie"""
+        try:
+            self._run_job(job)
+        finally:
+            self.current = None
+            self.wakeup.set()
+    
+    def _start(self, job: Job):
+        job.pending = False
+        if job.inline:
+            self._run_job(job)
+            return
+        self.current = job
+        self.worker = threading.Thread(target=self._run_background, args=(job,), name=f"job-{job.name}", daemon=True)
+        self.worker.start()
+    
+    def _dispatch(self, now: float) -> Optional[float]:
+        """Uruchamia zadania, których termin minął; zwraca czas do następnego terminu"""
+        with self.lock:
+            return self._dispatch_locked(now)
+    
+    def _dispatch_locked(self, now: float) -> Optional[float]:
+        for job in list(self.jobs):
+            if job.next_run <= now:
+                job.advance(now)
+                if job.inline or not self.is_running():
+                    self._start(job)
+                elif self.overlap_policy == 'coalesce':
+                    job.pending = True
+                else:
+                    job.skipped += 1
+                    current = self.current
+                    logger.warning(f"Pominięto {job.name}: poprzednie zadanie "
+                                   f"({current.name if current else '?'}) nadal trwa")
+        
+        for job in list(self.jobs):
+            if job.pending and (job.inline or not self.is_running()):
+                self._start(job)
+        
+        deadlines = [job.next_run for job in self.jobs if job.next_run != float('inf')]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+    
+    def run(self):
+        """Pętla harmonogramu - działa do wywołania stop()"""
+        while not self.stopping:
+            self.wakeup.clear()
+            timeout = self._dispatch(time.monotonic())
+            if self.idle_callback is not None and not self.is_running():
+                self.idle_callback()
+            if self.idle_interval is not None:
+                timeout = self.idle_interval if timeout is None else min(timeout, self.idle_interval)
+            self.wakeup.wait(timeout)
+    
+    def stop(self):
+        """Przerywa pętlę run() (bezpieczne w handlerze sygnału)"""
+        self.stopping = True
+        self.wakeup.set()
+    
+    def join(self, timeout: Optional[float] = None):
+        """Czeka na zakończenie bieżącego zadania"""
+        if self.worker is not None:
+            self.worker.join(timeout)
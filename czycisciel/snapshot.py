@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Snapshot - Kolumnowa migawka skanu i symulator reguł "co jeśli"
+Rozmiar, bloki, mtime, katalog i rozszerzenie każdego pliku w tablicach NumPy - zmiana days_old/large_file_mb bez ponownego skanowania
+oraz zapis skanu na dysku (kolumny o stałej szerokości + blob ścieżek) otwierany przez np.memmap bez parsowania
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Rozszerzenia dłuższe niż tyle znaków są liczone jako brak (jak w UsageTop)
+MAX_EXTENSION = 8
+
+# Zapisany skan: katalog z header.json i plikami kolumn
+SCAN_FORMAT = 'czysciciel-scan'
+SCAN_VERSION = 1
+HEADER = 'header.json'
+COLUMNS = {'size': 'q', 'blocks': 'q', 'mtime': 'd', 'extension': 'i'}
+PATHS = 'paths.bin'
+OFFSETS = 'offsets.bin'
+
+# Wiersze buforowane w array przed dopisaniem do plików kolumn
+WRITE_CHUNK = 65536
+
+def _extension(name: str) -> str:
+    dot = name.rfind('.')
+    return name[dot:].lower() if 0 < dot and len(name) - dot <= MAX_EXTENSION + 1 else ''
+
+def _dtype(typecode: str) -> str:
+    """Typ NumPy odpowiadający kodowi array w natywnym porządku bajtów (zapisywany w nagłówku)"""
+    return ('<' if sys.byteorder == 'little' else '>') + {'q': 'i8', 'd': 'f8', 'i': 'i4'}[typecode]
+
+class SnapshotSegment:
+    """Wiersze jednego katalogu - wypełniane przez jeden wątek skanowania"""
+    
+    __slots__ = ('builder', 'root_id', 'size', 'blocks', 'mtime', 'extension')
+    
+    def __init__(self, builder: 'SnapshotBuilder', root_id: int):
+        self.builder = builder
+        self.root_id = root_id
+        self.size = array('q')
+        self.blocks = array('q')
+        self.mtime = array('d')
+        self.extension = array('i')
+    
+    def add(self, name: str, st):
+        self.size.append(st.st_size)
+        self.blocks.append(st.st_blocks)
+        self.mtime.append(st.st_mtime)
+        self.extension.append(self.builder.extension_id(_extension(name)))
+
+class SnapshotBuilder:
+    """Zbiera kolumny w trakcie przejścia (array ze stdlib); NumPy dopiero w build()
+    
+    Każdy katalog dostaje własny segment, więc wątki puli skanowania nie
+    dzielą tablic; wspólny jest tylko słownik rozszerzeń.
+    """
+    
+    def __init__(self):
+        self.roots: List[str] = []
+        self.large: List[bool] = []
+        self.segments: List[SnapshotSegment] = []
+        self.extensions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.taken_at = time.time()
+    
+    def segment(self, root: str, large: bool) -> SnapshotSegment:
+        """Nowy segment katalogu; large - czy obowiązuje w nim próg large_file_mb"""
+        self.roots.append(root)
+        self.large.append(large)
+        segment = SnapshotSegment(self, len(self.roots) - 1)
+        self.segments.append(segment)
+        return segment
+    
+    def extension_id(self, extension: str) -> int:
+        extension_id = self.extensions.get(extension)
+        if extension_id is None:
+            with self.lock:
+                extension_id = self.extensions.setdefault(extension, len(self.extensions))
+        return extension_id
+    
+    def build(self) -> 'ScanSnapshot':
+        def column(name, dtype):
+            parts = [np.frombuffer(getattr(segment, name), dtype=dtype) for segment in self.segments]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        
+        lengths = [len(segment.size) for segment in self.segments]
+        extensions = sorted(self.extensions, key=self.extensions.get)
+        return ScanSnapshot(
+            size=column('size', np.int64),
+            blocks=column('blocks', np.int64),
+            mtime=column('mtime', np.float64),
+            root=np.repeat(np.array([s.root_id for s in self.segments], dtype=np.int32), lengths),
+            extension=column('extension', np.int32),
+            roots=list(self.roots),
+            large=np.array(self.large, dtype=bool),
+            extensions=extensions,
+            taken_at=self.taken_at
+        )
+
+class ScanSnapshot:
+    """Kolumnowa migawka plików objętych regułami domyślnymi (days_old, large_file_mb)
+    
+    Decyzja jest ta sama co w DiskCleaner: plik jest stary, gdy mtime <
+    teraz - days_old, a duży, gdy katalog podlega large_file_mb i rozmiar go
+    przekracza. Pliki z preserve_files nie trafiają do migawki.
+    """
+    
+    def __init__(self, size, blocks, mtime, root, extension, roots: List[str], large, extensions: List[str],
+                 taken_at: float):
+        self.size = size
+        self.blocks = blocks
+        self.mtime = mtime
+        self.root = root
+        self.extension = extension
+        self.roots = roots
+        self.large = large
+        self.extensions = extensions
+        self.taken_at = taken_at
+    
+    def __len__(self) -> int:
+        return len(self.size)
+    
+    def _masks(self, days_old: float, large_file_mb: float, now: Optional[float] = None):
+        now = self.taken_at if now is None else now
+        old = self.mtime < now - days_old * 86400
+        large = ~old & self.large[self.root] & (self.size > large_file_mb * 1024 * 1024)
+        return old, large
+    
+    def simulate(self, days_old: float, large_file_mb: float, now: Optional[float] = None) -> Dict[str, Dict]:
+        """Ile zwolniłyby days_old i large_file_mb - per katalog (bytes - rozmiar, allocated - zajęte bloki)"""
+        old, large = self._masks(days_old, large_file_mb, now)
+        selected = old | large
+        count = len(self.roots)
+        
+        def per_root(mask, weights=None):
+            return np.bincount(self.root[mask], weights=None if weights is None else weights[mask], minlength=count)
+        
+        files = per_root(selected)
+        sizes = per_root(selected, self.size)
+        allocated = per_root(selected, self.blocks * 512)
+        old_bytes = per_root(old, self.size)
+        large_bytes = per_root(large, self.size)
+        return {
+            root: {'files': int(files[i]), 'bytes': int(sizes[i]), 'allocated': int(allocated[i]),
+                   'old': int(old_bytes[i]), 'large': int(large_bytes[i])}
+            for i, root in enumerate(self.roots)
+        }
+    
+    def age_curve(self, days_values: Iterable[float], large_file_mb: float, now: Optional[float] = None) -> np.ndarray:
+        """Bajty do zwolnienia dla kolejnych days_old przy stałym large_file_mb
+        
+        Pliki duże liczą się zawsze; pozostałe są sortowane po mtime raz, a
+        każdy próg to jedno wyszukiwanie binarne w sumach skumulowanych.
+        """
+        now = self.taken_at if now is None else now
+        always = self.large[self.root] & (self.size > large_file_mb * 1024 * 1024)
+        order = np.argsort(self.mtime[~always])
+        mtimes = self.mtime[~always][order]
+        cumulative = np.concatenate(([0], np.cumsum(self.size[~always][order])))
+        cutoffs = now - np.asarray(list(days_values), dtype=np.float64) * 86400
+        return int(self.size[always].sum()) + cumulative[np.searchsorted(mtimes, cutoffs, side='left')]
+    
+    def size_curve(self, large_values: Iterable[float], days_old: float, now: Optional[float] = None) -> np.ndarray:
+        """Bajty do zwolnienia dla kolejnych large_file_mb przy stałym days_old"""
+        now = self.taken_at if now is None else now
+        old = self.mtime < now - days_old * 86400
+        candidates = np.sort(self.size[~old & self.large[self.root]])
+        suffix = np.concatenate((np.cumsum(candidates[::-1])[::-1], [0]))
+        thresholds = np.asarray(list(large_values), dtype=np.float64) * 1024 * 1024
+        return int(self.size[old].sum()) + suffix[np.searchsorted(candidates, thresholds, side='right')]
+
+class ScanWriter:
+    """Strumieniowy zapis skanu DiskAnalyzer do katalogu migawki
+    
+    Kolumny o stałej szerokości (size, blocks, mtime, extension), blob ścieżek
+    względnych wobec katalogu skanu i tablica offsetów (liczba plików + 1).
+    Wiersze są buforowane w array i dopisywane co WRITE_CHUNK, więc pamięć nie
+    rośnie z rozmiarem skanu. Pliki powstają w katalogu tymczasowym, a header.json
+    i zmiana nazwy w close() publikują migawkę atomowo. Do nagłówka trafiają
+    tylko katalogi zakończone end_root - przerwany skan zostawia wiersze poza
+    zakresami, które czytelnik pomija.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.created = time.time()
+        self.name = datetime.fromtimestamp(self.created).strftime('%Y%m%d-%H%M%S')
+        self.tmp_path = os.path.join(directory, f".{self.name}.tmp")
+        os.makedirs(self.tmp_path, mode=0o700)
+        self.files = {name: open(os.path.join(self.tmp_path, f"{name}.bin"), 'wb') for name in COLUMNS}
+        self.buffers = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.paths_file = open(os.path.join(self.tmp_path, PATHS), 'wb')
+        self.offsets_file = open(os.path.join(self.tmp_path, OFFSETS), 'wb')
+        self.paths = bytearray()
+        self.offsets = array('q', [0])
+        self.path_bytes = 0
+        self.count = 0
+        self.roots: List[Dict] = []
+        self.extensions: Dict[str, int] = {}
+        self.root = None
+        self.prefix = 0
+        self.start = 0
+    
+    def begin_root(self, root: str):
+        self.root = root.rstrip('/') or '/'
+        self.prefix = len(self.root) + (self.root != '/')
+        self.start = self.count
+    
+    def add(self, path: str, st):
+        relative = os.fsencode(path[self.prefix:])
+        self.paths += relative
+        self.path_bytes += len(relative)
+        self.offsets.append(self.path_bytes)
+        buffers = self.buffers
+        buffers['size'].append(st.st_size)
+        buffers['blocks'].append(st.st_blocks)
+        buffers['mtime'].append(st.st_mtime)
+        extension = _extension(path[path.rfind('/') + 1:])
+        extension_id = self.extensions.get(extension)
+        if extension_id is None:
+            extension_id = self.extensions[extension] = len(self.extensions)
+        buffers['extension'].append(extension_id)
+        self.count += 1
+        if len(self.offsets) >= WRITE_CHUNK:
+            self.flush()
+    
+    def end_root(self, size: int):
+        self.roots.append({'path': self.root, 'start': self.start, 'end': self.count, 'size': size})
+        self.root = None
+    
+    def flush(self):
+        for name, buffer in self.buffers.items():
+            buffer.tofile(self.files[name])
+            del buffer[:]
+        self.paths_file.write(self.paths)
+        self.paths = bytearray()
+        self.offsets.tofile(self.offsets_file)
+        del self.offsets[:]
+    
+    def _close_files(self):
+        for f in (*self.files.values(), self.paths_file, self.offsets_file):
+            f.close()
+    
+    def close(self) -> str:
+        """Dopisuje bufory i nagłówek, publikuje migawkę; zwraca jej ścieżkę"""
+        self.flush()
+        self._close_files()
+        header = {
+            'format': SCAN_FORMAT,
+            'version': SCAN_VERSION,
+            'created': self.created,
+            'count': self.count,
+            'path_bytes': self.path_bytes,
+            'columns': {name: _dtype(typecode) for name, typecode in COLUMNS.items()},
+            'offsets': _dtype('q'),
+            'roots': self.roots,
+            'extensions': sorted(self.extensions, key=self.extensions.get)
+        }
+        with open(os.path.join(self.tmp_path, HEADER), 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        path = os.path.join(self.directory, self.name)
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(self.directory, f"{self.name}-{suffix}")
+        os.rename(self.tmp_path, path)
+        return path
+    
+    def abort(self):
+        self._close_files()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+class StoredScan:
+    """Migawka zapisana przez ScanWriter, otwarta przez np.memmap - bez wczytywania i parsowania
+    
+    Wiersze katalogu skanu (roots[i]['start']:roots[i]['end']) są posortowane
+    po ścieżce; path(i) składa ścieżkę z blobu dopiero na żądanie.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, HEADER), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('format') != SCAN_FORMAT or header.get('version') != SCAN_VERSION:
+            raise ValueError(f"{path}: nieobsługiwany format migawki")
+        self.header = header
+        self.created = header['created']
+        self.count = header['count']
+        self.roots = header['roots']
+        self.extensions = header['extensions']
+        for name, dtype in header['columns'].items():
+            setattr(self, name, self._map(f"{name}.bin", dtype, self.count))
+        self.offsets = self._map(OFFSETS, header['offsets'], self.count + 1)
+        self.paths = self._map(PATHS, 'u1', header['path_bytes'])
+    
+    def _map(self, name: str, dtype: str, count: int):
+        if not count:
+            return np.zeros(count, dtype=dtype)  # memmap nie obsługuje pustych plików
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(count,))
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def relative_path(self, index: int) -> bytes:
+        return self.paths[self.offsets[index]:self.offsets[index + 1]].tobytes()
+    
+    def path_of(self, root: Dict, index: int) -> str:
+        relative = os.fsdecode(self.relative_path(index))
+        return root['path'] + relative if root['path'] == '/' else f"{root['path']}/{relative}"
+    
+    def to_scan_snapshot(self, roots: Dict[str, bool], preserve=None) -> ScanSnapshot:
+        """ScanSnapshot dla symulatora z wybranych katalogów skanu (roots: katalog -> czy obowiązuje large_file_mb)
+        
+        preserve (dopasowanie nazwy pliku, np. RuleSet.preserve_regex.match)
+        pomija pliki chronione - jedyny krok wymagający odczytu ścieżek.
+        """
+        selected = [root for root in self.roots if root['path'] in roots]
+        ranges = [np.arange(root['start'], root['end']) for root in selected]
+        rows = np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+        root_ids = np.repeat(np.arange(len(selected), dtype=np.int32), [len(r) for r in ranges])
+        if preserve is not None and len(rows):
+            names = (os.fsdecode(self.relative_path(i)).rpartition('/')[2] for i in rows)
+            keep = np.fromiter((not preserve(name) for name in names), dtype=bool, count=len(rows))
+            rows, root_ids = rows[keep], root_ids[keep]
+        return ScanSnapshot(
+            size=np.asarray(self.size[rows]), blocks=np.asarray(self.blocks[rows]),
+            mtime=np.asarray(self.mtime[rows]), root=root_ids, extension=np.asarray(self.extension[rows]),
+            roots=[root['path'] for root in selected], large=np.array([roots[root['path']] for root in selected],
+                                                                    dtype=bool),
+            extensions=list(self.extensions), taken_at=self.created
+        )
+
+def list_scans(directory: str) -> List[str]:
+    """Zapisane migawki w katalogu, od najstarszej"""
+    try:
+        names = sorted(name for name in os.listdir(directory)
+                       if not name.startswith('.') and os.path.isfile(os.path.join(directory, name, HEADER)))
+    except OSError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+def prune_scans(directory: str, keep: int, now: Optional[float] = None) -> List[str]:
+    """Usuwa migawki poza keep najnowszymi i porzucone katalogi tymczasowe; zwraca usunięte
+    
+    Katalog tymczasowy jest porzucony, gdy nie zmienił się od doby (przerwany
+    proces) - młodszy może właśnie zapisywać inny skan.
+    """
+    now = time.time() if now is None else now
+    scans = list_scans(directory)
+    removed = scans[:max(len(scans) - keep, 0)]
+    try:
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith('.') and name.endswith('.tmp') and os.stat(path).st_mtime < now - 86400:
+                removed.append(path)
+    except OSError:
+        pass
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+# Pierwszy blok wspólnych ścieżek porównywany naraz w złączeniu (potem podwajany)
+MERGE_RUN = 64
+
+# Co ile kroków złączenia i zmienionych plików porównanie migawek woła heartbeat
+HEARTBEAT_STEPS = 65536
+
+def _root_paths(scan: StoredScan, root: Dict):
+    """Blob ścieżek względnych katalogu skanu (bytes) i offsety od jego początku (array i NumPy)"""
+    offsets = np.asarray(scan.offsets[root['start']:root['end'] + 1])
+    offsets = offsets - offsets[0]
+    base = int(scan.offsets[root['start']])
+    scalar = array('q')
+    scalar.frombytes(offsets.tobytes())
+    return scan.paths[base:base + int(offsets[-1])].tobytes(), scalar, offsets
+
+def _merge_join(old_blob: bytes, old_offsets: array, old_array, new_blob: bytes, new_offsets: array, new_array,
+                heartbeat: Optional[Callable[[], None]] = None):
+    """Złączenie dwóch posortowanych list ścieżek w czasie liniowym
+    
+    Zwraca dwie tablice indeksów w porządku złączenia: para (i, j) to ten sam
+    plik, (i, -1) - usunięty, (-1, j) - nowy. Większość plików między skanami
+    się nie zmienia, więc po zgodnej parze porównywany jest od razu cały blok
+    ścieżek (jedno porównanie bajtów i granic offsetów), a blok rośnie, dopóki
+    się zgadza.
+    """
+    old_rows, new_rows = array('q'), array('q')
+    n, m = len(old_offsets) - 1, len(new_offsets) - 1
+    i = j = 0
+    run = MERGE_RUN
+    in_step = False
+    steps = 0
+    while i < n and j < m:
+        steps += 1
+        if heartbeat and not steps % HEARTBEAT_STEPS:
+            heartbeat()
+        if in_step:
+            k = min(run, n - i, m - j)
+            if (k > 1 and old_blob[old_offsets[i]:old_offsets[i + k]] == new_blob[new_offsets[j]:new_offsets[j + k]]
+                    and np.array_equal(old_array[i:i + k + 1] - old_offsets[i],
+                                       new_array[j:j + k + 1] - new_offsets[j])):
+                old_rows.extend(range(i, i + k))
+                new_rows.extend(range(j, j + k))
+                i += k
+                j += k
+                run *= 2
+                continue
+            run = MERGE_RUN
+        a = old_blob[old_offsets[i]:old_offsets[i + 1]]
+        b = new_blob[new_offsets[j]:new_offsets[j + 1]]
+        in_step = a == b
+        if in_step:
+            old_rows.append(i)
+            new_rows.append(j)
+            i += 1
+            j += 1
+        elif a < b:
+            old_rows.append(i)
+            new_rows.append(-1)
+            i += 1
+        else:
+            old_rows.append(-1)
+            new_rows.append(j)
+            j += 1
+    old_rows.extend(range(i, n))
+    new_rows.extend([-1] * (n - i))
+    old_rows.extend([-1] * (m - j))
+    new_rows.extend(range(j, m))
+    return np.frombuffer(old_rows, dtype=np.int64), np.frombuffer(new_rows, dtype=np.int64)
+
+class _GrowthChain:
+    """Łańcuch katalogów od korzenia do bieżącego (jak UsageTop) sumujący zmiany plików
+    
+    Złączenie jest w porządku ścieżek, więc poddrzewo jest ciągłe i jego suma
+    jest gotowa, gdy złączenie je opuszcza. Węzeł: [ścieżka, bajty, pliki,
+    bajty własnych plików, własne pliki].
+    """
+    
+    def __init__(self, root: str, on_close):
+        self.on_close = on_close
+        self.chain = [[root, 0, 0, 0, 0]]
+    
+    def _close(self):
+        node = self.chain.pop()
+        self.on_close(node)
+        if self.chain:
+            self.chain[-1][1] += node[1]
+            self.chain[-1][2] += node[2]
+    
+    def add(self, directory: str, delta_bytes: int, delta_files: int):
+        chain = self.chain
+        while len(chain) > 1 and directory != chain[-1][0] and not directory.startswith(chain[-1][0] + '/'):
+            self._close()
+        if directory != chain[-1][0]:
+            path = chain[-1][0].rstrip('/')
+            for part in directory[len(path) + 1:].split('/'):
+                path = f"{path}/{part}"
+                chain.append([path, 0, 0, 0, 0])
+        node = chain[-1]
+        node[1] += delta_bytes
+        node[2] += delta_files
+        node[3] += delta_bytes
+        node[4] += delta_files
+    
+    def end(self):
+        while self.chain:
+            self._close()
+
+def diff_scans(old: StoredScan, new: StoredScan, top: int = 20, min_size: int = 100 * 1024 * 1024,
+               heartbeat: Optional[Callable[[], None]] = None) -> Dict:
+    """Co się zmieniło między dwoma skanami: katalogi, nowe i usunięte duże pliki, najszybciej rosnące poddrzewa
+    
+    Dla każdego katalogu skanu obecnego w obu migawkach ścieżki są złączane
+    w czasie liniowym (obie listy są posortowane), różnice rozmiarów liczone
+    wektorowo, a do łańcucha katalogów trafiają tylko zmienione pliki.
+    bytes_per_hour poddrzewa to jego przyrost przez czas między skanami.
+    heartbeat jest wołany co HEARTBEAT_STEPS kroków (keepalive watchdoga demona).
+    """
+    from core import TopK
+    
+    elapsed = max(new.created - old.created, 1.0)
+    old_roots = {root['path']: root for root in old.roots}
+    new_roots = {root['path']: root for root in new.roots}
+    subtrees, growing, shrinking = TopK(top), TopK(top), TopK(top)
+    added_large, removed_large = TopK(top), TopK(top)
+    sequence = iter(range(1 << 62))  # Rozstrzyga remisy w kopcach (katalogi skanu mogą się zawierać)
+    totals = {'added_files': 0, 'removed_files': 0, 'changed_files': 0,
+              'added_bytes': 0, 'removed_bytes': 0, 'delta_bytes': 0}
+    roots = []
+    
+    def on_close(node):
+        path, delta_bytes, delta_files, own_bytes, own_files = node
+        subtrees.push(delta_bytes, (next(sequence), {
+            'path': path, 'delta_bytes': delta_bytes, 'delta_files': delta_files,
+            'bytes_per_hour': delta_bytes * 3600 / elapsed
+        }))
+        if own_bytes or own_files:
+            own = {'path': path, 'delta_bytes': own_bytes, 'delta_files': own_files}
+            growing.push(own_bytes, (next(sequence), own))
+            shrinking.push(-own_bytes, (next(sequence), own))
+    
+    for path in sorted(set(old_roots) | set(new_roots)):
+        before, after = old_roots.get(path), new_roots.get(path)
+        old_size = before['size'] if before else 0
+        new_size = after['size'] if after else 0
+        roots.append({'path': path, 'status': 'changed' if before and after else 'added' if after else 'removed',
+                      'old_size': old_size, 'new_size': new_size, 'delta_bytes': new_size - old_size,
+                      'old_files': before['end'] - before['start'] if before else 0,
+                      'new_files': after['end'] - after['start'] if after else 0})
+        if not (before and after):
+            continue
+        
+        old_rows, new_rows = _merge_join(*_root_paths(old, before), *_root_paths(new, after), heartbeat)
+        added, removed = old_rows < 0, new_rows < 0
+        old_index = np.where(added, 0, old_rows + before['start'])
+        new_index = np.where(removed, 0, new_rows + after['start'])
+        old_sizes = np.where(added, 0, old.size[old_index]) if len(old) else np.zeros(len(old_rows), np.int64)
+        new_sizes = np.where(removed, 0, new.size[new_index]) if len(new) else np.zeros(len(new_rows), np.int64)
+        deltas = new_sizes - old_sizes
+        changed = added | removed | (deltas != 0)
+        
+        totals['added_files'] += int(added.sum())
+        totals['removed_files'] += int(removed.sum())
+        totals['changed_files'] += int((changed & ~added & ~removed).sum())
+        totals['added_bytes'] += int(new_sizes[added].sum())
+        totals['removed_bytes'] += int(old_sizes[removed].sum())
+        totals['delta_bytes'] += int(deltas.sum())
+        
+        chain = _GrowthChain(path, on_close)
+        for step, k in enumerate(np.flatnonzero(changed).tolist(), 1):
+            if heartbeat and not step % HEARTBEAT_STEPS:
+                heartbeat()
+            if removed[k]:
+                full_path = old.path_of(before, int(old_index[k]))
+            else:
+                full_path = new.path_of(after, int(new_index[k]))
+            chain.add(full_path.rpartition('/')[0] or '/', int(deltas[k]), int(added[k]) - int(removed[k]))
+            if added[k] and new_sizes[k] >= min_size:
+                added_large.push(int(new_sizes[k]), full_path)
+            elif removed[k] and old_sizes[k] >= min_size:
+                removed_large.push(int(old_sizes[k]), full_path)
+        chain.end()
+    
+    return {
+        'old': {'path': old.path, 'created': old.created},
+        'new': {'path': new.path, 'created': new.created},
+        'elapsed_seconds': elapsed,
+        'totals': totals,
+        'roots': roots,
+        'subtrees': [entry for size, (_, entry) in subtrees.largest() if size > 0],
+        'growing_directories': [entry for size, (_, entry) in growing.largest() if size > 0],
+        'shrinking_directories': [entry for size, (_, entry) in shrinking.largest() if size > 0],
+        'new_large_files': [{'path': path, 'size': size} for size, path in added_large.largest()],
+        'removed_large_files': [{'path': path, 'size': size} for size, path in removed_large.largest()]
+    }
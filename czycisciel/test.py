@@ -6,10 +6,24 @@ Test i przykłady użycia Czysciciela Dysku
 
 import os
 import sys
+import time
+import logging
 import tempfile
 import shutil
+import threading
+import subprocess
 from datetime import datetime, timedelta
 
+# Budżet czasu importu (ms) dla ścieżek uruchamianych bez GUI
+IMPORT_BUDGETS_MS = {
+    'core': 60,
+    'daemon': 100,
+    'cli': 80,
+}
+
+# Moduły, których ścieżki bez GUI nie mogą importować
+GUI_MODULES = ('tkinter', 'matplotlib', 'numpy')
+
 def create_test_environment():
     """Tworzy środowisko testowe z plikami do czyszczenia"""
     test_dir = "/tmp/czysciciel_test"
@@ -62,7 +76,7 @@ def test_disk_analyzer():
     # Import tylko jeśli potrzebny
     sys.path.append('/opt/czysciciel')
     try:
-        from main import DiskAnalyzer
+        from core import DiskAnalyzer
     except ImportError:
         print("Nie można zaimportować DiskAnalyzer - upewnij się, że aplikacja jest zainstalowana")
         return
@@ -88,7 +102,7 @@ def test_disk_cleaner():
     
     sys.path.append('/opt/czysciciel')
     try:
-        from main import DiskCleaner
+        from core import DiskCleaner
     except ImportError:
         print("Nie można zaimportować DiskCleaner")
         return
@@ -118,43 +132,1066 @@ def test_disk_cleaner():
     print("Test zakończony")
 
 def benchmark_scan():
-    """Benchmark skanowania dysku"""
+    """Benchmark skanowania na syntetycznym drzewie (pełne opcje: benchmark.py --help)"""
     print("=== Benchmark Skanowania ===")
     
-    import time
+    import benchmark
+    output = os.path.join(tempfile.gettempdir(), "czysciciel-benchmark.json")
+    benchmark.main(['--preset', 'small', '--output', output])
+
+def measure_import_time(module: str):
+    """Mierzy skumulowany czas importu modułu przez `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    
+    total_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative_us = int(fields[1])
+        except (IndexError, ValueError):
+            continue  # Nagłówek tabeli
+        name = fields[2].strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            total_us = cumulative_us
+    
+    if result.returncode != 0 or total_us is None:
+        raise RuntimeError(f"Import {module} nie powiódł się: {result.stderr.strip()[-200:]}")
     
-    # Skanuj różne katalogi i zmierz czas
-    test_dirs = ['/tmp', '/var/log', '/etc']
+    return total_us / 1000, imported
+
+def test_import_time():
+    """Sprawdza budżet czasu importu ścieżek bez GUI"""
+    print("=== Test Czasu Importu ===")
     
-    for directory in test_dirs:
-        if not os.path.exists(directory):
+    failures = 0
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        try:
+            # Pierwszy import kompiluje .pyc - mierzymy drugi
+            measure_import_time(module)
+            duration_ms, imported = measure_import_time(module)
+        except RuntimeError as e:
+            print(f"✗ {e}")
+            failures += 1
             continue
-            
-        start_time = time.time()
-        total_size = 0
-        file_count = 0
         
+        gui_imports = sorted(imported.intersection(GUI_MODULES))
+        status = "✓" if duration_ms <= budget_ms and not gui_imports else "✗"
+        if status == "✗":
+            failures += 1
+        print(f"{status} {module}: {duration_ms:.1f} ms (budżet {budget_ms} ms)")
+        if gui_imports:
+            print(f"  Niedozwolone importy GUI: {', '.join(gui_imports)}")
+    
+    if failures:
+        sys.exit(1)
+
+def check(description: str, condition: bool) -> int:
+    """Wypisuje wynik jednego sprawdzenia; zwraca liczbę błędów (0 lub 1)"""
+    print(f"{'✓' if condition else '✗'} {description}")
+    return 0 if condition else 1
+
+def run_scheduler(scheduler, seconds: float):
+    """Uruchamia pętlę harmonogramu w wątku na podany czas; zwraca wyjątek pętli (lub None)"""
+    errors = []
+    
+    def loop():
         try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    try:
-                        file_path = os.path.join(root, file)
-                        if os.path.exists(file_path):
-                            total_size += os.path.getsize(file_path)
-                            file_count += 1
-                    except (OSError, IOError):
-                        continue
-        except (OSError, IOError):
-            continue
+            scheduler.run()
+        except Exception as e:
+            errors.append(e)
+    
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    time.sleep(seconds)
+    scheduler.stop()
+    thread.join(5)
+    scheduler.join(5)
+    return errors[0] if errors else None
+
+def test_cron_expression() -> int:
+    """Parsowanie pól crona, następne terminy i semantyka OR dnia miesiąca i dnia tygodnia"""
+    from scheduler import CronExpression
+    
+    failures = 0
+    cron = CronExpression('1-10/3,30 */6 * * *')
+    failures += check("zakres z krokiem i lista", cron.values['minute'] == {1, 4, 7, 10, 30})
+    failures += check("krok od gwiazdki", cron.values['hour'] == {0, 6, 12, 18})
+    failures += check("niedziela jako 7 i 0", 0 in CronExpression('0 0 * * 7').values['weekday'])
+    for expression in ('60 * * * *', '* * *', '5-1 * * * *', '*/0 * * * *', '0 0 32 * *'):
+        try:
+            CronExpression(expression)
+            failures += check(f"odrzucone {expression!r}", False)
+        except ValueError:
+            failures += check(f"odrzucone {expression!r}", True)
+    
+    cases = [
+        ('0 3 * * *', datetime(2024, 1, 1, 2, 59), datetime(2024, 1, 1, 3, 0)),
+        ('0 3 * * *', datetime(2024, 1, 1, 3, 0), datetime(2024, 1, 2, 3, 0)),
+        ('*/15 * * * *', datetime(2024, 1, 1, 10, 7, 30), datetime(2024, 1, 1, 10, 15)),
+        ('0 0 1 1 *', datetime(2024, 6, 1), datetime(2025, 1, 1)),
+        ('0 0 31 * *', datetime(2024, 4, 1), datetime(2024, 5, 31)),
+        ('0 0 * * 0', datetime(2024, 8, 31, 12, 0), datetime(2024, 9, 1)),
+        # Oba pola dni ograniczone: 13. dnia miesiąca LUB w piątek (2024-09-06 to piątek)
+        ('0 0 13 * 5', datetime(2024, 9, 1), datetime(2024, 9, 6)),
+        ('0 0 13 * 5', datetime(2024, 9, 6), datetime(2024, 9, 13)),
+        ('0 0 13 * 5', datetime(2024, 9, 13), datetime(2024, 9, 20)),
+        # Tylko dzień miesiąca ograniczony: dzień tygodnia "*" nie rozszerza dopasowania
+        ('0 0 1 * *', datetime(2024, 9, 2), datetime(2024, 10, 1)),
+    ]
+    for expression, moment, expected in cases:
+        result = CronExpression(expression).next_after(moment)
+        failures += check(f"{expression!r} po {moment:%Y-%m-%d %H:%M}: {result:%Y-%m-%d %H:%M}", result == expected)
+    return failures
+
+def test_job_advance() -> int:
+    """Następny termin zadania interwałowego: bez dryfu, pominięte interwały przeskakiwane"""
+    from scheduler import Job
+    
+    job = Job('tick', lambda: None, interval=10)
+    job.base = 100.0
+    job.advance(100.5)
+    failures = check("kolejna wielokrotność interwału mimo spóźnienia", job.next_run == 110.0)
+    job.advance(135.0)
+    failures += check("pominięte interwały przeskoczone (135 -> 140)", job.next_run == 140.0)
+    job.advance(140.0)
+    failures += check("termin w chwili terminu -> następny", job.next_run == 150.0)
+    
+    on_demand = Job('reload', lambda: None)
+    on_demand.advance(1000.0)
+    failures += check("zadanie na żądanie bez terminu", on_demand.next_run == float('inf'))
+    try:
+        Job('both', lambda: None, interval=10, cron=object())
+        failures += check("interval i cron naraz odrzucone", False)
+    except ValueError:
+        failures += check("interval i cron naraz odrzucone", True)
+    return failures
+
+def test_overlap_policies() -> int:
+    """skip pomija termin w trakcie zadania w tle, coalesce wykonuje go raz zaraz po nim"""
+    from scheduler import Scheduler
+    
+    failures = 0
+    for policy in ('skip', 'coalesce'):
+        scheduler = Scheduler(policy)
+        finished = []
+        started = []
+        scheduler.add_job('slow', lambda: (time.sleep(0.5), finished.append(time.monotonic())), interval=3600)
+        tick = scheduler.add_job('tick', lambda: started.append(time.monotonic()), interval=0.1, first_delay=0.1)
+        error = run_scheduler(scheduler, 0.65)
+        failures += check(f"{policy}: pętla bez wyjątku ({error!r})", error is None)
+        if policy == 'skip':
+            failures += check("skip: terminy w trakcie zadania w tle pominięte", tick.skipped >= 3)
+        else:
+            failures += check("coalesce: nic nie pominięto", tick.skipped == 0)
+            failures += check("coalesce: zaległe uruchomienie zaraz po zadaniu w tle",
+                              bool(started and finished) and 0 <= started[0] - finished[0] < 0.05)
+    return failures
+
+def test_replace_jobs() -> int:
+    """Przeładowanie: zadania o niezmienionym harmonogramie zachowują termin i zaległe uruchomienie"""
+    from scheduler import Job, Scheduler
+    
+    scheduler = Scheduler()
+    scheduler.replace_jobs([Job('incremental', lambda: None, interval=3600, first_delay=300),
+                            Job('quick', lambda: None, interval=60, inline=True)])
+    kept_deadline = scheduler.get_job('incremental').next_run
+    scheduler.trigger('quick')
+    time.sleep(0.01)
+    scheduler.replace_jobs([Job('incremental', lambda: None, interval=3600, first_delay=300),
+                            Job('quick', lambda: None, interval=30, inline=True)])
+    failures = check("ten sam harmonogram - termin zachowany",
+                     scheduler.get_job('incremental').next_run == kept_deadline)
+    failures += check("zmieniony harmonogram - nowy termin", scheduler.get_job('quick').interval == 30
+                      and not scheduler.get_job('quick').pending)
+    scheduler.trigger('incremental')
+    scheduler.replace_jobs([Job('incremental', lambda: None, interval=3600, first_delay=300)])
+    failures += check("zaległe uruchomienie zachowane", scheduler.get_job('incremental').pending)
+    failures += check("usunięte zadanie znika", scheduler.get_job('quick') is None)
+    return failures
+
+def test_scheduler_inline_during_background() -> int:
+    """Zadanie inline i pominięte zadanie w trakcie zadania w tle (regresja: current zerowany przez inline)"""
+    from scheduler import Scheduler
+    
+    scheduler = Scheduler('skip')
+    seen = []
+    slow = scheduler.add_job('slow', lambda: time.sleep(1.0), interval=3600)
+    scheduler.add_job('quick', lambda: seen.append(scheduler.current.name if scheduler.current else None),
+                      interval=0.1, first_delay=0.1, inline=True)
+    tick = scheduler.add_job('tick', lambda: None, interval=0.15, first_delay=0.15)
+    error = run_scheduler(scheduler, 0.8)
+    
+    failures = check(f"pętla bez wyjątku ({error!r})", error is None)
+    failures += check("inline nie zeruje bieżącego zadania w tle", bool(seen) and set(seen) == {'slow'})
+    failures += check("zadanie interwałowe pominięte w trakcie zadania w tle", tick.skipped > 0 and tick.runs == 0)
+    failures += check("zadanie w tle wykonane raz", slow.runs == 1)
+    return failures
+
+def test_scheduler():
+    """Testy harmonogramu demona (bez uprawnień root, ok. 2 s)"""
+    print("=== Test Harmonogramu ===")
+    
+    logging.getLogger('scheduler').setLevel(logging.ERROR)  # Oczekiwane ostrzeżenia o pominięciu
+    failures = 0
+    for test in (test_cron_expression, test_job_advance, test_overlap_policies, test_replace_jobs,
+                 test_scheduler_inline_during_background):
+        failures += test()
+    if failures:
+        sys.exit(1)
+
+def hold_lock(path: str, seconds: float, result: dict):
+    """Trzyma blokadę czyszczenia w wątku przez podany czas; zwraca wątek"""
+    from core import CleanupLock
+    
+    def cleanup():
+        time.sleep(seconds)
+        return dict(result)
+    
+    thread = threading.Thread(target=CleanupLock(path, 'holder').run, args=(cleanup,), daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    return thread
+
+def test_lock_policies(test_dir: str) -> int:
+    """skip zgłasza LockBusy z właścicielem, piggyback przejmuje wynik, wait czyści po zwolnieniu"""
+    from core import CleanupLock, LockBusy
+    
+    path = os.path.join(test_dir, 'cleanup.lock')
+    calls = []
+    
+    def own_cleanup():
+        calls.append(time.monotonic())
+        return {'freed_space': 2, 'start_time': datetime.now()}
+    
+    holder = hold_lock(path, 0.6, {'freed_space': 1, 'start_time': datetime.now(), 'cleaned_files': ['x']})
+    try:
+        CleanupLock(path).run(own_cleanup, 'skip')
+        failures = check("skip: zajęta blokada zgłasza LockBusy", False)
+    except LockBusy as e:
+        failures = check("skip: LockBusy z metadanymi właściciela",
+                         bool(e.owner) and e.owner['pid'] == os.getpid() and e.owner['program'] == 'holder')
+    
+    result = CleanupLock(path).run(own_cleanup, 'piggyback')
+    holder.join(5)
+    failures += check("piggyback: wynik trwającego czyszczenia", result.get('piggyback') and result['freed_space'] == 1)
+    failures += check("piggyback: bez własnego czyszczenia i listy plików", not calls and 'cleaned_files' not in result)
+    failures += check("piggyback: daty odtworzone", isinstance(result.get('start_time'), datetime))
+    
+    holder = hold_lock(path, 0.4, {'freed_space': 1})
+    released_before = time.monotonic() + 0.2
+    result = CleanupLock(path).run(own_cleanup, 'wait')
+    holder.join(5)
+    failures += check("wait: własne czyszczenie po zwolnieniu blokady",
+                      result['freed_space'] == 2 and len(calls) == 1 and calls[0] >= released_before)
+    failures += check("zwolniona blokada bez metadanych", CleanupLock(path).owner() is None)
+    
+    try:
+        CleanupLock(path).run(own_cleanup, 'never')
+        failures += check("nieznana polityka odrzucona", False)
+    except ValueError:
+        failures += check("nieznana polityka odrzucona", True)
+    return failures
+
+def test_lock_fallback(test_dir: str) -> int:
+    """Niedostępny katalog wspólnej blokady - blokada per użytkownik w XDG_RUNTIME_DIR"""
+    from core import CleanupLock
+    
+    runtime = os.path.join(test_dir, 'runtime')
+    os.makedirs(runtime)
+    saved = os.environ.get('XDG_RUNTIME_DIR')
+    os.environ['XDG_RUNTIME_DIR'] = runtime
+    try:
+        lock = CleanupLock('/proc/czysciciel-test/cleanup.lock')
+        result = lock.run(lambda: {'freed_space': 3})
+    finally:
+        if saved is None:
+            del os.environ['XDG_RUNTIME_DIR']
+        else:
+            os.environ['XDG_RUNTIME_DIR'] = saved
+    
+    fallback = os.path.join(runtime, 'czysciciel-cleanup.lock')
+    failures = check("czyszczenie wykonane mimo braku wspólnej blokady", result['freed_space'] == 3)
+    failures += check("blokada przeniesiona do XDG_RUNTIME_DIR", lock.path == fallback and os.path.exists(fallback))
+    failures += check("wynik zapisany obok blokady zastępczej", os.path.exists(fallback + '.result'))
+    return failures
+
+def test_lock():
+    """Testy blokady czyszczenia (bez uprawnień root, ok. 1 s)"""
+    print("=== Test Blokady Czyszczenia ===")
+    
+    logging.getLogger('core').setLevel(logging.ERROR)  # Oczekiwane ostrzeżenie o blokadzie zastępczej
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-lock-')
+    try:
+        failures = test_lock_policies(test_dir) + test_lock_fallback(test_dir)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def write_file(path: str, size: int = 0, age_seconds: float = 0) -> str:
+    """Tworzy plik (rzadki) o danym rozmiarze i wieku mtime/atime; zwraca ścieżkę"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    if age_seconds:
+        moment = time.time() - age_seconds
+        os.utime(path, (moment, moment))
+    return path
+
+def test_policy_decisions(test_dir: str) -> int:
+    """Tablica decyzji: wiek, rozmiar, include, preserve, limity liczby i rozmiaru, katalogi zagnieżdżone"""
+    from core import DiskCleaner
+    
+    day = 86400
+    d = lambda *parts: os.path.join(test_dir, *parts)
+    expected = {
+        write_file(d('default', 'old.log'), 10, 10 * day): 'old',
+        write_file(d('default', 'new.log'), 10): None,
+        write_file(d('default', 'old.conf'), 10, 10 * day): None,        # preserve_files
+        # Katalog z własną polityką: decyduje max_count, nie wiek z katalogu nadrzędnego
+        write_file(d('default', 'nested', 'old.log'), 10, 10 * day): 'count',
+        write_file(d('large', 'big.bin'), 1024 * 1024): 'large',
+        write_file(d('large', 'small.bin'), 1024): None,
+        write_file(d('include', 'old.log'), 10, 2 * day): 'old',
+        write_file(d('include', 'old.txt'), 10, 2 * day): None,          # poza include
+        write_file(d('include', 'new.log'), 10): None,
+        write_file(d('total', 'c.dat'), 1000, 3): 'total_size',
+        write_file(d('total', 'b.dat'), 1000, 2): None,
+        write_file(d('total', 'a.dat'), 1000, 1): None,
+    }
+    for index in range(5):
+        expected[write_file(d('default', 'nested', f'{index}.log'), 10, (index + 1) * 60)] = \
+            None if index < 2 else 'count'
+    # keep_newest chroni najnowszy plik nawet wtedy, gdy jest starszy niż max_age_days
+    expected[write_file(d('keep', 'newest.log'), 10, 5 * day)] = None
+    expected[write_file(d('keep', 'older.log'), 10, 6 * day)] = 'old'
+    
+    config = {
+        'directories_to_clean': [d('default'), d('large'), d('include')],
+        'days_old': 7,
+        'large_file_mb': 0.5,
+        'large_file_directories': [d('large')],
+        'preserve_files': ['*.conf'],
+        'policies': [
+            {'path': d('include'), 'max_age_days': 1, 'include': ['*.log']},
+            {'path': d('default', 'nested'), 'max_count': 2},
+            {'path': d('total'), 'max_total_mb': 2500 / (1024 * 1024)},
+            {'path': d('keep'), 'max_age_days': 1, 'keep_newest': 1},
+        ]
+    }
+    cleaner = DiskCleaner(log_file=os.path.join(test_dir, 'cleaner.log'), config=config)
+    decided = {item['path']: item['reason'] for item in cleaner.plan_cleanup()}
+    
+    failures = 0
+    for path, reason in expected.items():
+        actual = decided.get(path)
+        failures += check(f"{os.path.relpath(path, test_dir)}: {actual or 'zostaje'}", actual == reason)
+    failures += check("polityka zastępuje reguły domyślne tego katalogu",
+                      len([p for p in cleaner.rules.policies if p.root == d('include')]) == 1)
+    return failures
+
+def test_policy_validation(test_dir: str) -> int:
+    """Błędne wpisy policies odrzucane z nazwą pola"""
+    from core import ConfigError, compile_rules
+    
+    failures = 0
+    cases = [
+        ({'path': 'relative', 'max_age_days': 1}, 'path'),
+        ({'path': test_dir}, 'wymaga'),
+        ({'path': test_dir, 'max_age_days': -1}, 'max_age_days'),
+        ({'path': test_dir, 'max_count': 1.5}, 'max_count'),
+        ({'path': test_dir, 'max_count': 1, 'age': 'birth'}, 'age'),
+        ({'path': test_dir, 'max_count': 1, 'colour': 'red'}, 'colour'),
+    ]
+    for entry, field in cases:
+        try:
+            compile_rules({'policies': [entry]})
+            failures += check(f"odrzucone {entry}", False)
+        except ConfigError as e:
+            failures += check(f"odrzucone {entry}: {e}", field in str(e))
+    return failures
+
+def test_policies():
+    """Testy polityk czyszczenia na drzewie tymczasowym (bez usuwania plików)"""
+    print("=== Test Polityk Czyszczenia ===")
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-policies-')
+    try:
+        failures = test_policy_decisions(test_dir) + test_policy_validation(test_dir)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_root_expander():
+    """Testy rozwijania wzorców katalogów i pamięci listingów (drzewo tymczasowe)"""
+    print("=== Test Rozwijania Katalogów ===")
+    
+    from core import RootExpander
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-expander-')
+    home = os.path.join(test_dir, 'home')
+    try:
+        for name in ('alice', 'bob', '.hidden'):
+            os.makedirs(os.path.join(home, name, '.cache', 'thumbnails'))
+        write_file(os.path.join(home, 'notes.txt'))
+        os.makedirs(os.path.join(home, 'alice', 'projects', 'web', 'build'))
+        
+        expander = RootExpander()
+        pattern = os.path.join(home, '*', '.cache', 'thumbnails')
+        expected = [os.path.join(home, name, '.cache', 'thumbnails') for name in ('alice', 'bob')]
+        failures = check("* pomija ukryte wpisy i pliki", expander.expand(pattern) == expected)
+        failures += check("wzorzec bez symboli bez zmian", expander.expand(home) == [home])
+        failures += check("wzorzec od kropki obejmuje ukryte",
+                          expander.expand(os.path.join(home, '.h*')) == [os.path.join(home, '.hidden')])
+        failures += check("kilka symboli w ścieżce", expander.expand(os.path.join(home, '*', 'projects', '*', 'build'))
+                          == [os.path.join(home, 'alice', 'projects', 'web', 'build')])
+        failures += check("expand_all bez duplikatów", expander.expand_all([pattern, pattern, home]) == expected + [home])
+        
+        listings = expander.listings
+        expander.expand(pattern)
+        failures += check("niezmieniony rodzic - listing z pamięci", expander.listings == listings)
+        os.makedirs(os.path.join(home, 'carol'))
+        result = expander.expand(pattern)
+        failures += check("nowy katalog po zmianie mtime rodzica",
+                          expander.listings == listings + 1 and os.path.join(home, 'carol', '.cache', 'thumbnails') in result)
+        
+        from core import DiskCleaner
+        plans = []
+        for threads in (1, 4):
+            for name in ('alice', 'bob', 'carol'):
+                write_file(os.path.join(home, name, '.cache', 'thumbnails', 'old.png'), 10, 30 * 86400)
+            config = {'directories_to_clean': [pattern], 'large_file_directories': [],
+                      'advanced_settings': {'max_threads': threads}}
+            cleaner = DiskCleaner(log_file=os.path.join(test_dir, 'cleaner.log'), config=config)
+            plans.append(sorted(item['path'] for item in cleaner.plan_cleanup()))
+        failures += check("czyszczenie obejmuje każdy rozwinięty katalog", len(plans[0]) == 3)
+        failures += check("skan równoległy - ten sam plan", plans[0] == plans[1])
+        
+        shutil.rmtree(home)
+        failures += check("usunięty rodzic - brak katalogów i wpisu w pamięci",
+                          expander.expand(pattern) == [] and (home, '*') not in expander.cache)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_notification_coalescing() -> int:
+    """Seria zdarzeń daje jedno powiadomienie z sumą czyszczeń, kolejne czeka min_interval"""
+    from notify import NotificationDispatcher
+    
+    sent = []
+    dispatcher = NotificationDispatcher(lambda title, message: sent.append((time.monotonic(), title, message)),
+                                        lambda mb, files: ("Czyszczenie", f"{mb:.0f} MB, {files} plików"),
+                                        min_cleaned_bytes=1024 * 1024, min_interval=0.5, coalesce_seconds=0.1)
+    dispatcher.notify("Dysk", "a")
+    dispatcher.notify("Dysk", "b")
+    dispatcher.notify("Dysk", "a")
+    dispatcher.notify_cleanup(2 * 1024 * 1024, 3)
+    dispatcher.notify_cleanup(1024 * 1024, 1)
+    time.sleep(0.3)
+    messages = [(title, message) for _, title, message in sent]
+    failures = check("seria połączona w dwa powiadomienia",
+                     messages == [("Czyszczenie", "3 MB, 4 plików"), ("Dysk", "a\nb")])
+    
+    dispatcher.notify("Dysk", "c")
+    time.sleep(0.15)
+    failures += check("przed upływem min_interval nic nie wysłano", len(sent) == 2)
+    time.sleep(0.45)
+    failures += check("po min_interval wysłane",
+                      len(sent) == 3 and sent[2][2] == "c" and sent[2][0] - sent[1][0] >= 0.5)
+    
+    dispatcher.notify_cleanup(1024, 1)
+    for index in range(5):
+        dispatcher.notify("Dysk", f"linia {index}")
+    started = time.monotonic()
+    dispatcher.close()
+    failures += check("close wysyła zaległe bez czekania na okno", time.monotonic() - started < 0.4)
+    failures += check("nadmiar linii skrócony",
+                      sent[-1][2] == "linia 0\nlinia 1\nlinia 2\n(+2 więcej)")
+    failures += check("czyszczenie poniżej min_cleaned_bytes pominięte",
+                      dispatcher.suppressed == 1 and dispatcher.sent == 4)
+    dispatcher.notify("Dysk", "po zamknięciu")
+    failures += check("po zamknięciu zdarzenia ignorowane", not dispatcher.messages)
+    return failures
+
+def test_systemd_notifier(test_dir: str) -> int:
+    """sd_notify datagramem na NOTIFY_SOCKET i ograniczenie częstotliwości WATCHDOG=1"""
+    import socket
+    from notify import SystemdNotifier
+    
+    address = os.path.join(test_dir, 'notify.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    server.bind(address)
+    server.settimeout(1)
+    try:
+        notifier = SystemdNotifier(address, watchdog_timeout=0.4)
+        failures = check("komunikat wysłany", notifier.notify("READY=1", "STATUS=test"))
+        failures += check("komunikat odebrany", server.recv(4096) == b"READY=1\nSTATUS=test")
+        failures += check("pierwszy WATCHDOG=1 wysłany", notifier.watchdog() and server.recv(4096) == b"WATCHDOG=1")
+        failures += check("kolejny przed ćwiercią limitu pominięty", not notifier.watchdog())
+        time.sleep(0.15)
+        failures += check("po ćwierci limitu wysłany", notifier.watchdog())
+        notifier.close()
+        failures += check("bez NOTIFY_SOCKET nic nie robi", not SystemdNotifier('').notify("READY=1"))
+    finally:
+        server.close()
+    return failures
+
+def test_notifications():
+    """Testy dyspozytora powiadomień i sd_notify (ok. 1,5 s)"""
+    print("=== Test Powiadomień ===")
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-notify-')
+    try:
+        failures = test_notification_coalescing() + test_systemd_notifier(test_dir)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_duplicates():
+    """Testy wyszukiwania i deduplikacji na drzewie tymczasowym"""
+    print("=== Test Duplikatów ===")
+    
+    from duplicates import DuplicateFinder, dedupe
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-dedupe-')
+    
+    def put(name: str, data: bytes, age_seconds: float = 7200) -> str:
+        path = os.path.join(test_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        moment = time.time() - age_seconds
+        os.utime(path, (moment, moment))
+        return path
+    
+    try:
+        content = os.urandom(300 * 1024)
+        # Różnica w środku: zgodny skrót wstępny, dopiero pełny skrót je rozróżnia
+        middle = content[:150 * 1024] + bytes(1) + content[150 * 1024 + 1:]
+        copies = [put(f'{name}/data.bin', content) for name in ('a', 'b', 'c', 'd')]
+        os.link(copies[0], os.path.join(test_dir, 'a', 'link.bin'))
+        put('e/middle.bin', middle)
+        put('f/recent.bin', content, age_seconds=0)
+        small = [put(f'{name}/small.txt', b'duplikat\n') for name in ('a', 'b')]
+        
+        finder = DuplicateFinder(threads=2)
+        groups = finder.find([test_dir, os.path.join(test_dir, 'a')])
+        counters = finder.instrumentation.counters
+        paths = [[f.path for f in group.files] for group in groups]
+        failures = check("grupy: kopie i małe pliki", paths == [copies, small])
+        failures += check("dowiązanie twarde liczone raz", counters['same_inode'] == 1)
+        failures += check("plik zmieniony niedawno pominięty", counters['recently_modified'] == 1)
+        failures += check("różnica w środku wykryta pełnym skrótem", counters['full_hashes'] == 5)
+        failures += check("bajty do odzyskania", groups[0].reclaimable == 3 * len(content))
+        
+        result = dedupe(groups, 'hardlink', dry_run=True)
+        failures += check("próba: nic nie podmieniono",
+                          result['replaced'] == 4 and os.stat(copies[1]).st_ino != os.stat(copies[0]).st_ino)
+        
+        # Po skanowaniu: zmieniony mtime i inne uprawnienia (dowiązanie odebrałoby je właścicielowi)
+        os.utime(copies[2], (time.time() - 60, time.time() - 60))
+        os.chmod(copies[3], 0o600)
+        result = dedupe(groups[:1], 'hardlink')
+        failures += check("zmieniony i inne uprawnienia pominięte", result['skipped'] == 2 and result['errors'] == 0)
+        failures += check("duplikat zastąpiony dowiązaniem", result['replaced'] == 1
+                          and os.stat(copies[1]).st_ino == os.stat(copies[0]).st_ino)
+        failures += check("zwolnione bajty", result['freed_bytes'] == len(content))
+        with open(copies[1], 'rb') as f:
+            failures += check("zawartość bez zmian", f.read() == content)
+        failures += check("pominięte pliki nietknięte", all(os.stat(path).st_nlink == 1 for path in copies[2:]))
+        leftovers = [name for _, _, names in os.walk(test_dir) for name in names if 'czysciciel' in name]
+        failures += check("bez plików tymczasowych", not leftovers)
+        try:
+            dedupe(groups, 'symlink')
+            failures += check("nieznany tryb odrzucony", False)
+        except ValueError:
+            failures += check("nieznany tryb odrzucony", True)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_compress():
+    """Testy kompresji w miejscu (gzip, xz) na drzewie tymczasowym"""
+    print("=== Test Kompresji ===")
+    
+    import gzip
+    import lzma
+    from compress import compress_file
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-compress-')
+    content = b''.join(f"2024-01-01 12:00:{i % 60:02d} INFO żądanie {i} obsłużone\n".encode('utf-8')
+                       for i in range(50000))
+    failures = 0
+    try:
+        for method, opener in (('gzip', gzip.open), ('xz', lzma.open)):
+            path = os.path.join(test_dir, f'{method}.log')
+            with open(path, 'wb') as f:
+                f.write(content)
+            os.chmod(path, 0o640)
+            os.utime(path, (1700000000, 1700000000))
+            result = compress_file(path, method)
+            target = result['target']
+            failures += check(f"{method}: skompresowany, oryginał usunięty",
+                              result['status'] == 'compressed' and not os.path.exists(path))
+            with opener(target, 'rb') as f:
+                failures += check(f"{method}: zawartość po rozpakowaniu bez zmian", f.read() == content)
+            st = os.stat(target)
+            failures += check(f"{method}: rozmiar zgodny z wynikiem",
+                              st.st_size == result['compressed'] < result['original'] == len(content))
+            failures += check(f"{method}: uprawnienia i mtime oryginału",
+                              st.st_mode & 0o7777 == 0o640 and st.st_mtime == 1700000000)
+            failures += check(f"{method}: już skompresowany pominięty", compress_file(target, method)['status'] == 'skipped')
+        
+        noise = os.path.join(test_dir, 'noise.bin')
+        with open(noise, 'wb') as f:
+            f.write(os.urandom(64 * 1024))
+        failures += check("niedający się zmniejszyć pominięty",
+                          compress_file(noise)['status'] == 'skipped' and os.path.exists(noise))
+        existing = write_file(os.path.join(test_dir, 'existing.log'), 4096)
+        write_file(existing + '.gz')
+        failures += check("istniejący cel nie jest nadpisywany", compress_file(existing)['status'] == 'skipped'
+                          and os.path.getsize(existing + '.gz') == 0 and os.path.exists(existing))
+        link = os.path.join(test_dir, 'link.log')
+        os.symlink(existing, link)
+        try:
+            compress_file(link)
+            failures += check("dowiązanie symboliczne odrzucone", False)
+        except OSError:
+            failures += check("dowiązanie symboliczne odrzucone", not os.path.exists(link + '.gz'))
+        leftovers = [name for name in os.listdir(test_dir) if name.endswith('.tmp')]
+        failures += check("bez plików tymczasowych", not leftovers)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_quarantine():
+    """Testy kwarantanny: przeniesienie, lista, przywrócenie, odrzucone ścieżki i wygasanie"""
+    print("=== Test Kwarantanny ===")
+    
+    from quarantine import Quarantine, list_entries, purge, restore
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-quarantine-')
+    root = os.path.join(test_dir, 'quarantine')
+    data = os.path.join(test_dir, 'data')
+    moved = os.path.join(test_dir, 'moved')
+    elsewhere = os.path.join(test_dir, 'elsewhere')
+    try:
+        paths = [write_file(os.path.join(data, name), 100) for name in ('a.log', 'b.log')]
+        paths.append(write_file(os.path.join(moved, 'c.log'), 100))
+        os.makedirs(elsewhere)
+        with open(paths[0], 'wb') as f:
+            f.write(b'zawartosc a')
+        
+        quarantine = Quarantine()
+        # Kwarantanna w drzewie testowym zamiast w punkcie montowania
+        quarantine.directories.update({data: root, moved: root})
+        ids = [quarantine.move(path, os.path.getsize(path), 'old') for path in paths]
+        quarantine.close()
+        entries = list_entries([root])
+        failures = check("pliki przeniesione", not any(os.path.exists(path) for path in paths))
+        failures += check("lista z manifestu", [entry['id'] for entry in entries] == ids
+                          and [entry['path'] for entry in entries] == paths)
+        
+        result = restore(entries[:1])
+        with open(paths[0], 'rb') as f:
+            restored = f.read()
+        failures += check("przywrócony pod pierwotną ścieżkę", result[0]['status'] == 'restored' and restored == b'zawartosc a')
+        failures += check("przywrócony znika z listy", [entry['id'] for entry in list_entries([root])] == ids[1:])
+        
+        write_file(paths[1], 5)
+        result = restore(entries[1:2])
+        failures += check("istniejący plik nie jest nadpisywany",
+                          result[0]['status'] == 'error' and os.path.getsize(paths[1]) == 5)
+        failures += check("nadpisanie na żądanie", restore(entries[1:2], overwrite=True)[0]['status'] == 'restored'
+                          and os.path.getsize(paths[1]) == 100)
+        
+        # Katalog zastąpiony dowiązaniem - plik trafiłby do innego katalogu
+        os.rmdir(moved)
+        os.symlink(elsewhere, moved)
+        result = restore(entries[2:])
+        failures += check(f"dowiązanie na ścieżce odrzucone ({result[0].get('error')})",
+                          result[0]['status'] == 'error' and not os.listdir(elsewhere))
+        if os.geteuid() == 0:
+            os.unlink(moved)
+            os.makedirs(moved)
+            os.chown(moved, 54321, 54321)
+            result = restore(entries[2:])
+            failures += check(f"katalog innego użytkownika odrzucony ({result[0].get('error')})",
+                              result[0]['status'] == 'error' and not os.listdir(moved))
+        
+        failures += check("przed upływem TTL nic nie usunięto", purge(3600, roots=[root])['buckets'] == 0)
+        result = purge(3600, now=time.time() + 3 * 3600, roots=[root])
+        failures += check("po TTL kubełek usunięty z raportem",
+                          result == {'buckets': 1, 'files': 1, 'bytes': 100, 'errors': 0} and not list_entries([root]))
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_open_files():
+    """Testy plików otwartych przez proces: pominięcie, przycięcie, usunięcie i podmiana ścieżki"""
+    print("=== Test Plików Otwartych ===")
+    
+    import errno
+    from core import DiskCleaner
+    from openfiles import OpenFileIndex, truncate_held
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-openfiles-')
+    handles = []
+    failures = 0
+    try:
+        def held(path: str):
+            write_file(path, 4096, 2 * 86400)
+            handles.append(open(path, 'ab'))
+            return path
         
-        end_time = time.time()
-        duration = end_time - start_time
+        policies = []
+        for action in ('skip', 'truncate', 'delete', 'compress'):
+            directory = os.path.join(test_dir, action)
+            held(os.path.join(directory, 'held.log'))
+            write_file(os.path.join(directory, 'free.log'), 4096, 2 * 86400)
+            policy = {'path': directory, 'max_age_days': 1}
+            policy.update({'action': 'compress'} if action == 'compress' else {'open_files': action})
+            policies.append(policy)
+        config = {'directories_to_clean': [], 'large_file_directories': [], 'policies': policies}
+        cleaner = DiskCleaner(log_file=os.path.join(test_dir, 'cleaner.log'), config=config)
+        cleaner.perform_cleanup()
+        counters = cleaner.instrumentation.counters
         
-        print(f"Katalog: {directory}")
-        print(f"  Rozmiar: {total_size / (1024*1024):.2f} MB")
-        print(f"  Pliki: {file_count}")
-        print(f"  Czas: {duration:.2f}s")
-        print(f"  Szybkość: {file_count/duration:.0f} plików/s")
+        path = lambda action, name: os.path.join(test_dir, action, name)
+        failures += check("pliki nieotwarte usunięte", not any(os.path.exists(path(action, 'free.log'))
+                                                               for action in ('skip', 'truncate', 'delete')))
+        failures += check("skip: otwarty plik zostaje nietknięty", os.path.getsize(path('skip', 'held.log')) == 4096)
+        failures += check("truncate: otwarty plik przycięty do zera", os.path.exists(path('truncate', 'held.log'))
+                          and os.path.getsize(path('truncate', 'held.log')) == 0)
+        failures += check("delete: otwarty plik usunięty", not os.path.exists(path('delete', 'held.log')))
+        failures += check("compress: otwarty plik nieskompresowany", os.path.exists(path('compress', 'held.log'))
+                          and not os.path.exists(path('compress', 'held.log.gz')))
+        failures += check("liczniki", counters['open_skipped'] == 2 and counters['truncations'] == 1)
+        
+        victim = held(os.path.join(test_dir, 'swap', 'held.log'))
+        key, holders = OpenFileIndex.build().lookup(victim)
+        failures += check("indeks zna proces trzymający plik", holders is not None and os.getpid() in holders)
+        # Między sprawdzeniem a przycięciem ścieżka wskazuje już inny plik
+        other = write_file(os.path.join(test_dir, 'swap', 'other.log'), 4096)
+        os.replace(other, victim)
+        try:
+            truncate_held(victim, key)
+            failures += check("podmieniony plik nie jest przycinany", False)
+        except OSError as e:
+            failures += check("podmieniony plik nie jest przycinany",
+                              e.errno == errno.ESTALE and os.path.getsize(victim) == 4096)
+        os.unlink(victim)
+        os.symlink(other, victim)
+        try:
+            truncate_held(victim, key)
+            failures += check("dowiązanie symboliczne odrzucone", False)
+        except OSError as e:
+            failures += check("dowiązanie symboliczne odrzucone", e.errno == errno.ELOOP)
+    finally:
+        for handle in handles:
+            handle.close()
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_hidden_usage():
+    """Testy ukrytego zajęcia: usunięty, otwarty plik tego procesu, przycięcie i zmieniony deskryptor"""
+    print("=== Test Ukrytego Zajęcia ===")
+    
+    from openfiles import deleted_open_files, truncate_deleted
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-hidden-')
+    path = os.path.join(test_dir, 'rotated.log')
+    handle = open(path, 'wb')
+    try:
+        handle.write(os.urandom(1024 * 1024))
+        handle.flush()
+        os.unlink(path)
+        
+        report = deleted_open_files()
+        entries = [entry for entry in report['files'] if entry['path'] == path]
+        failures = check("usunięty, otwarty plik znaleziony", len(entries) == 1)
+        if entries:
+            entry = entries[0]
+            failures += check("proces i rozmiar", os.getpid() in entry['pids'] and entry['size'] >= 1024 * 1024)
+            failures += check("wliczony do sum", report['total_bytes'] >= entry['size']
+                              and report['filesystems'].get(entry['mount_point'], 0) >= entry['size'])
+            
+            failures += check("ścieżka spoza wzorców pominięta", truncate_deleted([entry], ['/var/log/*']) == [])
+            # Deskryptor wskazuje już inny i-węzeł (proces zamknął plik, numer użyto ponownie)
+            stale = dict(entry, inode=entry['inode'] + 1)
+            result = truncate_deleted([stale], [os.path.join(test_dir, '*')])
+            failures += check("zmieniony deskryptor nie jest przycinany",
+                              result[0]['status'] == 'gone' and os.fstat(handle.fileno()).st_size == 1024 * 1024)
+            result = truncate_deleted([entry], [os.path.join(test_dir, '*')])
+            failures += check("przycięty przez deskryptor procesu",
+                              result[0]['status'] == 'truncated' and os.fstat(handle.fileno()).st_size == 0)
+    finally:
+        handle.close()
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_usage_top():
+    """Testy sum katalogów, największych plików i rozszerzeń względem sum liczonych wprost"""
+    print("=== Test Największych Katalogów ===")
+    
+    import random
+    from collections import defaultdict
+    from core import DiskAnalyzer, UsageTop
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-top-')
+    generator = random.Random(46)
+    # Nazwy z tym samym przedrostkiem (a, a-b, ab) i katalogi pośrednie bez plików
+    directories = ['a', 'a-b', 'ab', 'a/x/y/z', 'a/x/w', 'ab/deep/er/est', 'c', 'c/a']
+    names = ['f.log', 'g.BIN', 'README', 'archive.tar.gz', '.hidden']
+    try:
+        roots = [os.path.join(test_dir, 'one'), os.path.join(test_dir, 'two')]
+        for root in roots:
+            for directory in directories:
+                for name in generator.sample(names, 3):
+                    write_file(os.path.join(root, directory, name), generator.randint(1, 1 << 20))
+        
+        expected_dirs = defaultdict(int)
+        expected_files = {}
+        expected_extensions = defaultdict(int)
+        for root in roots:
+            for directory, _, files in os.walk(root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    size = os.path.getsize(path)
+                    expected_files[path] = size
+                    expected_extensions[os.path.splitext(name)[1].lower()] += size
+                    parent = path
+                    while parent != root:
+                        parent = os.path.dirname(parent)
+                        expected_dirs[parent] += size
+        
+        top = UsageTop(1000)
+        DiskAnalyzer().analyze_disk_usage(directories=roots, top=top)
+        result = top.as_dict()
+        failures = check("sumy wszystkich katalogów", {d['path']: d['size'] for d in result['directories']}
+                         == dict(expected_dirs))
+        failures += check("wszystkie pliki", {f['path']: f['size'] for f in result['files']} == expected_files)
+        failures += check("rozszerzenia", {e['extension']: e['size'] for e in result['extensions']}
+                          == dict(expected_extensions))
+        
+        top = UsageTop(3)
+        DiskAnalyzer().analyze_disk_usage(directories=roots, top=top)
+        result = top.as_dict()
+        largest = sorted(expected_dirs.items(), key=lambda item: item[1], reverse=True)[:3]
+        failures += check("K największych katalogów", [(d['path'], d['size']) for d in result['directories']] == largest)
+        largest = sorted(expected_files.values(), reverse=True)[:3]
+        failures += check("K największych plików", [f['size'] for f in result['files']] == largest)
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def write_scan(directory: str, roots) -> str:
+    """Skan DiskAnalyzer katalogów roots zapisany przez ScanWriter; zwraca ścieżkę migawki"""
+    from core import DiskAnalyzer
+    from snapshot import ScanWriter
+    
+    writer = ScanWriter(directory)
+    try:
+        DiskAnalyzer().analyze_disk_usage(directories=roots, snapshot=writer)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+def test_stored_scan():
+    """Testy migawki binarnej: zapis skanu i odczyt przez StoredScan"""
+    print("=== Test Migawki Skanu ===")
+    
+    import snapshot
+    from snapshot import ScanWriter, StoredScan, list_scans, prune_scans
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-scan-')
+    scans = os.path.join(test_dir, 'scans')
+    roots = [os.path.join(test_dir, name) for name in ('logs', 'cache', 'empty')]
+    chunk = snapshot.WRITE_CHUNK
+    try:
+        for index in range(20):
+            write_file(os.path.join(roots[index % 2], f'd{index % 3}', f'plik-{index}.{"log" if index % 2 else "bin"}'),
+                       index * 1000, index * 3600)
+        write_file(os.path.join(roots[0], 'zażółć.txt'), 7)
+        os.makedirs(roots[2])
+        os.makedirs(scans)
+        
+        snapshot.WRITE_CHUNK = 4  # Kilka porcji zapisu zamiast jednej
+        path = write_scan(scans, roots)
+        snapshot.WRITE_CHUNK = chunk
+        scan = StoredScan(path)
+        
+        failures = check("liczba plików", len(scan) == 21)
+        failures += check("katalogi skanu", [root['path'] for root in scan.roots] == roots)
+        for root in scan.roots:
+            name = os.path.basename(root['path'])
+            rows = range(root['start'], root['end'])
+            expected = sorted(os.fsencode(os.path.relpath(os.path.join(directory, file_name), root['path']))
+                              for directory, _, names in os.walk(root['path']) for file_name in names)
+            failures += check(f"{name}: ścieżki posortowane", [scan.relative_path(i) for i in rows] == expected)
+            stats = [os.stat(scan.path_of(root, i)) for i in rows]
+            columns = [(scan.size[i].item(), scan.blocks[i].item(), scan.mtime[i].item()) for i in rows]
+            failures += check(f"{name}: rozmiary, bloki i mtime",
+                              columns == [(st.st_size, st.st_blocks, st.st_mtime) for st in stats])
+            failures += check(f"{name}: suma katalogu", root['size'] == sum(st.st_size for st in stats))
+        rows = range(scan.roots[0]['start'], scan.roots[0]['end'])
+        names = [scan.path_of(scan.roots[0], i).rpartition('/')[2] for i in rows]
+        failures += check("rozszerzenia", [scan.extensions[scan.extension[i]] for i in rows]
+                          == [os.path.splitext(name)[1].lower() for name in names])
+        
+        simulated = scan.to_scan_snapshot({roots[0]: False, roots[1]: True}, preserve=lambda name: name.endswith('.txt'))
+        failures += check("migawka symulatora bez plików chronionych", len(simulated) == 20)
+        
+        writer = ScanWriter(scans)
+        writer.abort()
+        second = write_scan(scans, roots[:1])
+        failures += check("przerwany zapis nie zostawia migawki", list_scans(scans) == [path, second])
+        stale = os.path.join(scans, '.20000101-000000.tmp')
+        os.makedirs(stale)
+        os.utime(stale, (0, 0))
+        removed = prune_scans(scans, keep=1)
+        failures += check("prune: starsza migawka i porzucony katalog tymczasowy",
+                          sorted(removed) == sorted([path, stale]) and list_scans(scans) == [second])
+    finally:
+        snapshot.WRITE_CHUNK = chunk
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_scan_diff():
+    """Testy porównania dwóch migawek: dodany, usunięty i powiększony plik, katalogi skanu"""
+    print("=== Test Porównania Migawek ===")
+    
+    import snapshot
+    from snapshot import StoredScan, diff_scans
+    
+    test_dir = tempfile.mkdtemp(prefix='czysciciel-diff-')
+    scans = os.path.join(test_dir, 'scans')
+    data, removed_root, added_root = (os.path.join(test_dir, name) for name in ('data', 'gone', 'new'))
+    d = lambda *parts: os.path.join(data, *parts)
+    steps = snapshot.HEARTBEAT_STEPS
+    try:
+        os.makedirs(scans)
+        # Wiele niezmienionych ścieżek - złączenie porównuje je blokami
+        for index in range(300):
+            write_file(d('keep', f'{index:03d}.bin'), 1000)
+        write_file(d('grow', 'app.log'), 1000)
+        write_file(d('grow2', 'app.log'), 1000)
+        write_file(d('old', 'gone.bin'), 3000)
+        write_file(os.path.join(removed_root, 'x.bin'), 10)
+        old = StoredScan(write_scan(scans, [data, removed_root]))
+        
+        write_file(d('grow', 'app.log'), 5000)
+        os.unlink(d('old', 'gone.bin'))
+        write_file(d('new', 'deep', 'added.bin'), 8000)
+        write_file(os.path.join(added_root, 'y.bin'), 20)
+        new = StoredScan(write_scan(scans, [data, added_root]))
+        
+        beats = []
+        snapshot.HEARTBEAT_STEPS = 1
+        result = diff_scans(old, new, min_size=2000, heartbeat=lambda: beats.append(1))
+        snapshot.HEARTBEAT_STEPS = steps
+        
+        failures = check("sumy zmian", result['totals'] == {
+            'added_files': 1, 'removed_files': 1, 'changed_files': 1,
+            'added_bytes': 8000, 'removed_bytes': 3000, 'delta_bytes': 9000})
+        failures += check("katalogi skanu: zmieniony, usunięty, dodany",
+                          [(root['path'], root['status'], root['delta_bytes']) for root in result['roots']]
+                          == [(data, 'changed', 9000), (removed_root, 'removed', -10), (added_root, 'added', 20)])
+        elapsed = result['elapsed_seconds']
+        failures += check("rosnące poddrzewa z tempem",
+                          [(entry['path'], entry['delta_bytes']) for entry in result['subtrees']]
+                          == [(data, 9000), (d('new'), 8000), (d('new', 'deep'), 8000), (d('grow'), 4000)]
+                          and result['subtrees'][0]['bytes_per_hour'] == 9000 * 3600 / elapsed)
+        failures += check("katalogi rosnące własnymi plikami",
+                          [entry['path'] for entry in result['growing_directories']] == [d('new', 'deep'), d('grow')])
+        failures += check("katalogi malejące", [(entry['path'], entry['delta_bytes'])
+                                                for entry in result['shrinking_directories']] == [(d('old'), -3000)])
+        failures += check("nowe i usunięte duże pliki",
+                          result['new_large_files'] == [{'path': d('new', 'deep', 'added.bin'), 'size': 8000}]
+                          and result['removed_large_files'] == [{'path': d('old', 'gone.bin'), 'size': 3000}])
+        failures += check("heartbeat w trakcie złączenia", len(beats) > 0)
+        
+        same = diff_scans(new, new)
+        failures += check("migawka porównana ze sobą - bez zmian",
+                          not any(same['totals'].values()) and not same['subtrees'])
+    finally:
+        snapshot.HEARTBEAT_STEPS = steps
+        shutil.rmtree(test_dir, ignore_errors=True)
+    if failures:
+        sys.exit(1)
+
+def test_forecast():
+    """Testy odpornego trendu (Theil-Sen) i czasu do zapełnienia na seriach syntetycznych"""
+    print("=== Test Prognozy ===")
+    
+    import random
+    from forecast import TrendWindow, robust_trend, time_to_full
+    
+    generator = random.Random(50)
+    mb, hour = 1024 * 1024, 3600.0
+    rate = 10 * mb / hour
+    times = [index * hour for index in range(48)]
+    values = [50_000 * mb + rate * t + generator.uniform(-2, 2) * mb for t in times]
+    for index in (5, 17, 30):
+        values[index] += 500 * mb  # Pojedyncze odstające próbki (np. chwilowy plik tymczasowy)
+    
+    base = robust_trend(times, values)
+    failures = check(f"nachylenie mimo odstających próbek ({base['slope'] * hour / mb:.2f} MB/h)",
+                     abs(base['slope'] - rate) < 0.05 * rate)
+    failures += check("przedział wąski i istotny",
+                      0 < base['slope_low'] <= base['slope'] <= base['slope_high'] < base['slope_low'] * 1.1)
+    
+    # Czyszczenie w połowie okna - spadek zaczyna nowy odcinek zamiast zaniżać trend
+    cleaned = [value - (5000 * mb if index >= 24 else 0) for index, value in enumerate(values)]
+    trend = robust_trend(times, cleaned)
+    failures += check(f"spadek po czyszczeniu pominięty ({trend['slope'] * hour / mb:.2f} MB/h)",
+                      trend['segments'] == base['segments'] + 1 and abs(trend['slope'] - rate) < 0.05 * rate)
+    
+    flat = [50_000 * mb + generator.uniform(-2, 2) * mb for _ in times]
+    failures += check("szum bez wzrostu nieistotny", robust_trend(times, flat)['slope_low'] <= 0)
+    
+    # Załamanie: po 36 godzinach tempo rośnie stukrotnie
+    fast = [50_000 * mb + 0.1 * mb * min(index, 36) + 10 * mb * max(index - 36, 0)
+            + generator.uniform(-0.5, 0.5) * mb for index in range(48)]
+    trend = robust_trend(times, fast)
+    failures += check(f"załamanie trendu wykryte ({trend['break_seconds']})",
+                      trend['break_seconds'] is not None and abs(trend['break_seconds'] - 36 * hour) <= 2 * hour
+                      and abs(trend['slope'] - rate) < 0.05 * rate)
+    failures += check("za mało próbek - brak trendu", robust_trend(times[:5], values[:5]) is None)
+    
+    forecast = time_to_full(base, 1024 * mb)
+    failures += check(f"czas do zapełnienia ({forecast['hours_to_full']:.1f} h)",
+                      abs(forecast['hours_to_full'] - 102.4) < 5
+                      and forecast['hours_to_full_earliest'] <= forecast['hours_to_full'] <= forecast['hours_to_full_latest']
+                      and forecast['significant'] and 0 < forecast['confidence'] <= 1)
+    
+    window = TrendWindow(window_seconds=10 * hour, min_spacing=hour / 2)
+    accepted = [window.add('/', t, value) for t, value in zip(times, values)]
+    failures += check("okno: próbki co godzinę przyjęte", all(accepted))
+    failures += check("okno: próbka za blisko poprzedniej pominięta", not window.add('/', times[-1] + 60, 0))
+    failures += check("okno: stare próbki wypchnięte", len(window.series['/']) == 11)
+    if failures:
+        sys.exit(1)
 
 def show_system_info():
     """Pokazuje informacje systemowe"""
@@ -211,7 +1248,7 @@ def run_gui_test():
         
         root.after(3000, close_test)  # Auto-close po 3 sekundach
         root.mainloop()
-        
+    
     except ImportError:
         print("✗ tkinter nie jest dostępny")
     except Exception as e:
@@ -235,6 +1272,36 @@ def main():
             show_system_info()
         elif test_type == 'gui':
             run_gui_test()
+        elif test_type == 'importtime':
+            test_import_time()
+        elif test_type == 'scheduler':
+            test_scheduler()
+        elif test_type == 'lock':
+            test_lock()
+        elif test_type == 'policies':
+            test_policies()
+        elif test_type == 'expander':
+            test_root_expander()
+        elif test_type == 'notify':
+            test_notifications()
+        elif test_type == 'duplicates':
+            test_duplicates()
+        elif test_type == 'compress':
+            test_compress()
+        elif test_type == 'quarantine':
+            test_quarantine()
+        elif test_type == 'openfiles':
+            test_open_files()
+        elif test_type == 'hidden':
+            test_hidden_usage()
+        elif test_type == 'top':
+            test_usage_top()
+        elif test_type == 'scan':
+            test_stored_scan()
+        elif test_type == 'diff':
+            test_scan_diff()
+        elif test_type == 'forecast':
+            test_forecast()
         else:
             print(f"Nieznany test: {test_type}")
     else:
@@ -244,6 +1311,21 @@ def main():
         print("  python3 test.py cleaner   - test czyszczenia")
         print("  python3 test.py benchmark - benchmark skanowania")
         print("  python3 test.py gui       - test GUI")
+        print("  python3 test.py importtime - budżet czasu importu")
+        print("  python3 test.py scheduler - harmonogram demona")
+        print("  python3 test.py lock      - blokada czyszczenia")
+        print("  python3 test.py policies  - polityki czyszczenia")
+        print("  python3 test.py expander  - rozwijanie wzorców katalogów")
+        print("  python3 test.py notify    - powiadomienia i sd_notify")
+        print("  python3 test.py duplicates - wyszukiwanie i deduplikacja")
+        print("  python3 test.py compress  - kompresja gzip i xz")
+        print("  python3 test.py quarantine - kwarantanna i przywracanie")
+        print("  python3 test.py openfiles - pliki otwarte przez procesy")
+        print("  python3 test.py hidden    - usunięte, otwarte pliki")
+        print("  python3 test.py top       - największe katalogi i pliki")
+        print("  python3 test.py scan      - zapis i odczyt migawki skanu")
+        print("  python3 test.py diff      - porównanie migawek")
+        print("  python3 test.py forecast  - prognoza zapełnienia")
         
         # Uruchom podstawowe testy
         show_system_info()
@@ -48,6 +48,7 @@ fi
 echo_info "Usuwanie plików..."
 rm -rf /opt/czysciciel
 rm -f /usr/local/bin/czysciciel-gui
+rm -f /usr/local/bin/czysciciel
 rm -f /usr/share/applications/czysciciel.desktop
 rm -f /etc/logrotate.d/czysciciel
 
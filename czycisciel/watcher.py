@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Czysciciel Watcher - Obserwacja pliku konfiguracji przez inotify
+Wywołuje callback po zapisaniu lub podmianie pliku (bez zależności zewnętrznych, ctypes)
+"""
+
+import os
+import select
+import struct
+import logging
+import threading
+from typing import Callable, Optional
+
+# Stałe z <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+
+logger = logging.getLogger(__name__)
+
+def _inotify_watch(directory: str, mask: int) -> int:
+    """Tworzy deskryptor inotify obserwujący katalog (OSError, gdy inotify niedostępne)"""
+    import ctypes
+    
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        raise OSError("inotify niedostępne na tej platformie")
+    
+    fd = init(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    if add_watch(fd, os.fsencode(directory), mask) < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, os.strerror(err), directory)
+    return fd
+
+class ConfigWatcher:
+    """Obserwuje plik przez inotify na katalogu nadrzędnym
+    
+    Edytory i narzędzia (Ansible, sed -i) podmieniają plik przez rename, więc
+    obserwowany jest katalog, a zdarzenia filtrowane po nazwie. Seria zdarzeń
+    w odstępie krótszym niż debounce daje jedno wywołanie callbacku.
+    """
+    
+    def __init__(self, path: str, callback: Callable[[], None], debounce: float = 0.5):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.debounce = debounce
+        self.fd: Optional[int] = None
+        self.stop_pipe = None
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Uruchamia obserwację w wątku w tle (OSError, gdy inotify niedostępne)"""
+        self.fd = _inotify_watch(os.path.dirname(self.path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        self.stop_pipe = os.pipe()
+        self.thread = threading.Thread(target=self._run, name='config-watch', daemon=True)
+        self.thread.start()
+    
+    def _matches(self, data: bytes) -> bool:
+        """Czy bufor zdarzeń zawiera zdarzenie dotyczące obserwowanego pliku"""
+        name = os.fsencode(os.path.basename(self.path))
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            if data[offset:offset + length].rstrip(b'\0') == name:
+                return True
+            offset += length
+        return False
+    
+    def _read(self, timeout: Optional[float]) -> Optional[bytes]:
+        """Czeka na zdarzenia; None przy zatrzymaniu, b'' po upływie timeout"""
+        ready, _, _ = select.select([self.fd, self.stop_pipe[0]], [], [], timeout)
+        if self.stop_pipe[0] in ready:
+            return None
+        if not ready:
+            return b''
+        try:
+            return os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return b''
+    
+    def _run(self):
+        while True:
+            data = self._read(None)
+            if data is None:
+                return
+            if not self._matches(data):
+                continue
+            
+            # Poczekaj, aż zapisy ucichną (np. zapis pliku tymczasowego i rename)
+            while True:
+                data = self._read(self.debounce)
+                if data is None:
+                    return
+                if not data:
+                    break
+            
+            try:
+                self.callback()
+            except Exception as e:
+                logger.error(f"Błąd obsługi zmiany {self.path}: {e}")
+    
+    def stop(self):
+        """Zatrzymuje obserwację i zamyka deskryptory"""
+        if self.thread is None:
+            return
+        os.write(self.stop_pipe[1], b'x')
+        self.thread.join(2.0)
+        for fd in (self.fd, *self.stop_pipe):
+            os.close(fd)
+        self.thread = None
+        self.fd = None
+        self.stop_pipe = None